@@ -0,0 +1,907 @@
+#!/usr/bin/env python3
+"""
+Benchmarks and replay harness for dclone-discord. These run against local stand-ins for the upstream APIs and a fake
+Discord channel sink, they never connect to the real APIs or Discord.
+
+Usage:
+    python3 benchmark.py lag [--delay SECONDS] [--requests N]
+    python3 benchmark.py startup [--timeout SECONDS]
+    python3 benchmark.py split [--notifiers N] [--channels N] [--seconds N] [--seed N]
+    python3 benchmark.py history [--days N] [--seed N]
+    python3 benchmark.py replay [--hours N] [--channels N] [--seed N] [--timeline FILE] [--record FILE] [--sources LIST] [--policy POLICY]
+                                [--d2rw-lag SECONDS]
+                                [--max-tick-ms MS] [--max-false-alerts N]
+
+lag: a local diablo2.io stand-in responds slowly while a ticker measures how late the event loop wakes up.
+The async HTTPClient should keep lag flat (a few milliseconds) while the blocking baseline stalls for the full delay.
+
+startup: starts the bot with webhook delivery (DCLONE_DELIVERY=webhook) in a new process and reports the time until it
+posts its first message and its resident memory, next to the time until the gateway client (discord.py) has been
+constructed and has done its first poll and its resident memory.
+
+split: runs a poller (DCLONE_ROLE=poller) and several webhook notifier processes (DCLONE_ROLE=notifier) in real time
+against a fast synthetic timeline and reports upstream requests, messages sent and per-process CPU and memory. Compare
+with --notifiers 0 (one standalone bot) to check that upstream load stays the same and alerts match.
+
+history: writes a synthetic timeline to a progress HistoryStore, reopens it after cutting off its last record and
+compacts it. Exits with status 1 if queries don't match the reports that were written, before or after compaction, or
+if the reporter references of the reopened segment don't round-trip.
+
+replay: replays a synthetic (or recorded) progress timeline with troll reports and rollbacks through the bot's
+background task, using simulated time. Reports time-to-alert, messages sent, false alert messages sent, troll reports
+alerted on and suppressed, spawn estimate errors, 304 Not Modified responses, modes skipped because their report was
+unchanged, and CPU/memory per poll.
+Exits with status 1 if --max-tick-ms or --max-false-alerts are exceeded, so it can run in CI.
+"""
+from argparse import ArgumentParser
+from asyncio import create_task, gather, get_running_loop, new_event_loop, run, run_coroutine_threadsafe, sleep
+from bisect import bisect_right
+from io import StringIO
+from json import dumps, loads
+from os import environ, sysconf
+from os.path import getsize
+from random import Random
+from re import compile as re_compile
+from resource import RUSAGE_SELF, getrusage
+from signal import SIGTERM
+from subprocess import PIPE, Popen  # nosec B404
+from sys import executable
+from sys import exit as sys_exit
+from tempfile import TemporaryDirectory
+from threading import Thread
+from time import perf_counter, process_time
+from time import sleep as sleep_sync
+from urllib.request import urlopen
+from zlib import crc32
+
+from aiohttp import web
+
+# the bot requires Discord configuration at import time, the benchmarks never use it
+environ.setdefault('DCLONE_DISCORD_TOKEN', 'benchmark')
+environ.setdefault('DCLONE_DISCORD_CHANNEL_ID', '1')
+environ.setdefault('DCLONE_D2RW_TOKEN', 'benchmark')
+environ.setdefault('DCLONE_D2RW_CONTACT', 'benchmark@example.com')
+environ.setdefault('DCLONE_STATE_FILE', '')
+environ.setdefault('DCLONE_HISTORY_DIR', '')
+environ.setdefault('DCLONE_CHANNEL_RATE', '1000000')
+
+import dclone_discord  # noqa: E402  pylint: disable=wrong-import-position
+
+EPOCH = 1700000000  # simulated time starts here
+ALERT = re_compile(r'\[(\d)/6\].*?\*\*(.+?)\*\* DClone (progressed|may have spawned)')
+SPAWN_ETA = re_compile(r'spawn <t:(\d+):R>')
+LABELS = {f'{dclone_discord.REGION[r]} {dclone_discord.LADDER[l]} {dclone_discord.HC[h]}': (r, l, h) for r, l, h in dclone_discord.MODES}
+
+
+def synthetic_status(progress=1):
+    """
+    Returns a diablo2.io style status payload for all 12 modes.
+
+    :param progress: progress level to report for every mode
+    :return: list of status entries
+    """
+    return [
+        {'region': region, 'ladder': ladder, 'hc': hardcore, 'progress': str(progress), 'timestamped': str(EPOCH), 'reporter_id': '1'}
+        for region, ladder, hardcore in dclone_discord.MODES
+    ]
+
+
+class Timeline:
+    """
+    Progress timeline for all 12 modes: true progress changes (including spawns and rollbacks) and short troll reports.
+
+    Events are dicts with `t` (seconds from the start), `region`, `ladder`, `hc`, `progress` and `troll`. Troll events
+    also have `until`, the time the troll report is replaced by the true progress again. Events can have a `reporter`,
+    otherwise one is derived from the time of the event.
+    """
+
+    def __init__(self, events, duration):
+        self.events = sorted(events, key=lambda event: event['t'])
+        self.duration = duration
+        self.truth = {mode: ([0.0], [1]) for mode in dclone_discord.MODES}
+        self.trolls = {mode: [] for mode in dclone_discord.MODES}
+        self.reporters = {}  # (mode, time of a true progress change) -> reporter id
+        for event in self.events:
+            mode = (event['region'], event['ladder'], event['hc'])
+            if event.get('troll'):
+                self.trolls[mode].append(event)
+            else:
+                self.truth[mode][0].append(event['t'])
+                self.truth[mode][1].append(event['progress'])
+                self.reporters[(mode, event['t'])] = event.get('reporter', f'reporter-{int(event["t"]) % 97}')
+
+    @staticmethod
+    def synthetic(hours, seed, level_minutes=25, troll_rate=1.0, rollback_rate=0.1, sleepers=4):
+        """
+        Generates a synthetic timeline.
+
+        Sleepers are trolls that first report true progress changes, until their reputation makes them trusted, and
+        then send troll reports.
+
+        :param hours: length of the timeline in hours
+        :param seed: random seed
+        :param level_minutes: average minutes between progress levels
+        :param troll_rate: average troll reports per mode per hour
+        :param rollback_rate: chance that a progress increase is rolled back a few minutes later
+        :param sleepers: number of sleeper trolls
+        :return: Timeline
+        """
+        rng = Random(seed)
+        duration = hours * 3600
+        events = []
+        for region, ladder, hardcore in dclone_discord.MODES:
+            mode = {'region': region, 'ladder': ladder, 'hc': hardcore}
+            t, progress = 0.0, 1
+            while True:
+                t += rng.expovariate(1 / (level_minutes * 60))
+                if t >= duration:
+                    break
+                progress = 1 if progress == 6 else progress + 1
+                events.append({'t': t, 'progress': progress, 'troll': False, **mode})
+
+                # a rollback to the previous level a few minutes later
+                if 2 < progress < 6 and rng.random() < rollback_rate:
+                    t += rng.uniform(180, 600)
+                    progress -= 1
+                    events.append({'t': t, 'progress': progress, 'troll': False, **mode})
+
+            t = 0.0
+            while True:
+                t += rng.expovariate(troll_rate / 3600)
+                if t >= duration:
+                    break
+                events.append({'t': t, 'until': t + rng.uniform(20, 90), 'progress': rng.randint(2, 6), 'troll': True, **mode})
+
+        # each sleeper reports a few true progress changes early on, then trolls a few times later
+        changes = sorted((event for event in events if not event['troll'] and event['progress'] > 1), key=lambda event: event['t'])
+        changes = changes[:len(changes) // 4]
+        for sleeper in range(min(sleepers, len(changes) // 5)):
+            reporter = f'sleeper-{sleeper}'
+            honest = rng.sample(changes, 5)
+            for event in honest:
+                changes.remove(event)
+                event['reporter'] = reporter
+
+            start = max(event['t'] for event in honest) + 3600
+            for _ in range(3 if start < duration else 0):
+                t = rng.uniform(start, duration)
+                region, ladder, hardcore = rng.choice(dclone_discord.MODES)
+                troll = {'t': t, 'until': t + rng.uniform(20, 90), 'progress': rng.randint(2, 6), 'troll': True, 'reporter': reporter}
+                events.append({**troll, 'region': region, 'ladder': ladder, 'hc': hardcore})
+
+        return Timeline(events, duration)
+
+    @staticmethod
+    def load(path):
+        """
+        Loads a recorded timeline from a JSON lines file.
+
+        :param path: path to the file
+        :return: Timeline
+        """
+        with open(path, encoding='utf-8') as timeline_file:
+            events = [loads(line) for line in timeline_file if line.strip()]
+        return Timeline(events, max((event.get('until', event['t']) for event in events), default=0) + 600)
+
+    def save(self, path):
+        """
+        Records the timeline to a JSON lines file.
+
+        :param path: path to the file
+        """
+        with open(path, 'w', encoding='utf-8') as timeline_file:
+            for event in self.events:
+                timeline_file.write(dumps(event) + '\n')
+
+    def progress_at(self, mode, t):
+        """
+        Returns the true progress and the time it was reached for a mode at time `t`.
+        """
+        times, levels = self.truth[mode]
+        index = bisect_right(times, t) - 1
+        return levels[index], times[index]
+
+    def next_spawn(self, mode, t):
+        """
+        Returns the time of the first spawn (6/6 to 1/6) for a mode after time `t`, None if there is none.
+        """
+        times, levels = self.truth[mode]
+        for index in range(bisect_right(times, t), len(times)):
+            if levels[index] == 1 and levels[index - 1] == 6:
+                return times[index]
+        return None
+
+    def status_at(self, t):
+        """
+        Returns the diablo2.io status payload at time `t`, troll reports included.
+        """
+        status = []
+        for mode in dclone_discord.MODES:
+            progress, since = self.progress_at(mode, t)
+            reporter = self.reporters.get((mode, since), f'reporter-{int(since) % 97}')
+            for troll in self.trolls[mode]:
+                if troll['t'] <= t < troll['until'] and troll['t'] > since:
+                    progress, since, reporter = troll['progress'], troll['t'], troll.get('reporter', f'troll-{int(troll["t"]) % 13}')
+            region, ladder, hardcore = mode
+            status.append(
+                {
+                    'region': region,
+                    'ladder': ladder,
+                    'hc': hardcore,
+                    'progress': str(progress),
+                    'timestamped': str(int(EPOCH + since)),
+                    'reporter_id': reporter,
+                }
+            )
+        return status
+
+    def servers_at(self, t, lag):
+        """
+        Returns the d2runewizard.com progress payload at time `t`. This independent tracker sees true progress changes
+        `lag` seconds late and doesn't share the diablo2.io troll reports.
+        """
+        servers = []
+        for mode in dclone_discord.MODES:
+            progress, since = self.progress_at(mode, max(t - lag, 0))
+            servers.append(d2rw_server(mode, progress, since + lag))
+        return servers
+
+
+def d2rw_server(mode, progress, since):
+    """
+    Returns a d2runewizard.com style progress entry for a mode.
+    """
+    region, ladder, hardcore = mode
+    name = f'{"ladder" if ladder == "1" else "nonLadder"}{dclone_discord.HC[hardcore]}{dclone_discord.REGION[region]}'
+    return {'server': name, 'progress': progress, 'lastUpdate': {'seconds': int(EPOCH + since)}, 'lastReportedBy': {'uid': f'rw-{int(since) % 89}'}}
+
+
+class MockUpstream:
+    """
+    Local stand-in for the diablo2.io dclone API and the d2runewizard.com planned walks and progress APIs. It runs its
+    own event loop in a background thread so it keeps responding even while the benchmarked event loop is blocked.
+
+    :param delay: seconds to wait before responding to each request
+    :param timeline: Timeline to serve, a static status is served if not set
+    :param d2rw_lag: seconds the d2runewizard.com progress lags behind the true progress
+    """
+
+    def __init__(self, delay=0.0, timeline=None, d2rw_lag=45.0):
+        self.delay = delay
+        self.timeline = timeline
+        self.d2rw_lag = d2rw_lag
+        self.now = 0.0  # simulated seconds from the start of the timeline
+        self.requests = 0
+        self.not_modified = 0  # requests answered with 304 Not Modified
+        self.webhooks = []  # (perf_counter time, method, json payload) of webhook requests
+        self.loop = new_event_loop()
+        self.runner = None
+        self.url = None
+        self.thread = Thread(target=self.loop.run_forever, daemon=True)
+
+    def respond(self, request, data):
+        """
+        Returns a json response with an ETag, or 304 Not Modified if the client already has this payload.
+        """
+        body = dumps(data)
+        etag = f'"{crc32(body.encode()):08x}"'
+        if request.headers.get('If-None-Match') == etag:
+            self.not_modified += 1
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(text=body, content_type='application/json', headers={'ETag': etag})
+
+    async def dclone_api(self, request):
+        self.requests += 1
+        await sleep(self.delay)
+        if self.timeline is None:
+            return self.respond(request, synthetic_status())
+        return self.respond(request, self.timeline.status_at(self.now))
+
+    async def planned_walks(self, _request):
+        self.requests += 1
+        await sleep(self.delay)
+        return web.json_response({'walks': []})
+
+    async def d2rw_progress(self, request):
+        self.requests += 1
+        await sleep(self.delay)
+        if self.timeline is None:
+            return self.respond(request, {'servers': [d2rw_server(mode, 1, 0) for mode in dclone_discord.MODES]})
+        return self.respond(request, {'servers': self.timeline.servers_at(self.now, self.d2rw_lag)})
+
+    async def webhook(self, request):
+        self.webhooks.append((perf_counter(), request.method, await request.json()))
+        if request.query.get('wait') == 'true':
+            return web.json_response({'id': str(len(self.webhooks))})
+        return web.Response(status=204)
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_post('/api/webhooks/{webhook_id}/{token}', self.webhook)
+        app.router.add_patch('/api/webhooks/{webhook_id}/{token}/messages/{message_id}', self.webhook)
+        app.router.add_get('/dclone_api.php', self.dclone_api)
+        app.router.add_get('/api/diablo-clone-progress/planned-walks', self.planned_walks)
+        app.router.add_get('/api/diablo-clone-progress/all', self.d2rw_progress)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.url = f'http://127.0.0.1:{port}'
+
+    def __enter__(self):
+        self.thread.start()
+        run_coroutine_threadsafe(self._start(), self.loop).result()
+        dclone_discord.Diablo2IOClient.API_URL = f'{self.url}/dclone_api.php'
+        dclone_discord.D2RuneWizardClient.WALKS_URL = f'{self.url}/api/diablo-clone-progress/planned-walks'
+        dclone_discord.D2RuneWizardClient.PROGRESS_URL = f'{self.url}/api/diablo-clone-progress/all'
+        return self
+
+    def __exit__(self, *exc):
+        run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+class ReplayTransport:
+    """
+    DCloneMonitor transport that records sent messages in a sink instead of sending them to Discord.
+    """
+
+    def __init__(self):
+        self.sink = []
+
+    async def wait_until_ready(self):
+        pass
+
+    async def deliver(self, channel_id, message):
+        self.sink.append((channel_id, message))
+
+    async def post_board(self, channel_id, content):
+        self.sink.append((channel_id, content))
+        return len(self.sink)
+
+    async def edit_board(self, channel_id, message_id, content):
+        pass
+
+
+def synthetic_subscriptions(channels, seed):
+    """
+    Returns `channels` subscriptions with random mode filters.
+    """
+    rng = Random(seed)
+    return [
+        dclone_discord.Subscription(
+            channel_id,
+            region=rng.choice(['', '1', '2', '3']),
+            ladder=rng.choice(['', '1', '2']),
+            hardcore=rng.choice(['', '1', '2']),
+        )
+        for channel_id in range(1, channels + 1)
+    ]
+
+
+def percentile(values, fraction):
+    """
+    Returns the value at `fraction` (0 to 1) of the sorted values, 0 if there are none.
+    """
+    values = sorted(values)
+    return values[int((len(values) - 1) * fraction)] if values else 0
+
+
+async def replay(timeline, upstream, subscriptions, sources=dclone_discord.DCLONE_SOURCES, policy=dclone_discord.DCLONE_CONSENSUS_POLICY, verbose=False):
+    """
+    Replays a timeline through the bot's background task in simulated time.
+
+    :param timeline: Timeline to replay
+    :param upstream: MockUpstream serving the timeline
+    :param subscriptions: list of subscriptions
+    :param sources: comma separated progress sources, as in DCLONE_SOURCES
+    :param policy: consensus policy, as in DCLONE_CONSENSUS_POLICY
+    :param verbose: print the bot's output
+    :return: dict of results
+    """
+    clock = {'now': EPOCH}
+    dclone_discord.time = lambda: clock['now']  # the bot reads the time through this name
+
+    # logs go through the bot's logging pipeline either way, so its cost is included in the tick times
+    listener = dclone_discord.setup_logging(fmt='text', stream=None if verbose else StringIO())
+    try:
+        transport = ReplayTransport()
+        client = dclone_discord.DCloneMonitor(transport, subscriptions=subscriptions)
+        client.dclone.sources = dclone_discord.ProgressAggregator(dclone_discord.ProgressSource.from_config(client.api, client.dclone, sources))
+        client.dclone.policy = policy
+        client.dispatcher.start()
+
+        tick_cpu, tick_wall, alerts = [], [], []
+        t = 0.0
+        while t < timeline.duration:
+            upstream.now = t
+            clock['now'] = EPOCH + t
+
+            sent = len(transport.sink)
+            cpu, wall = process_time(), perf_counter()
+            await client.check_dclone_status()
+            await client.dispatcher.queue.join()
+            tick_cpu.append(process_time() - cpu)
+            tick_wall.append(perf_counter() - wall)
+            alerts.extend((t, channel_id, content) for channel_id, content in transport.sink[sent:])
+
+            # follow the adaptive polling interval
+            t += client.interval
+
+        await client.dispatcher.stop()
+        await client.api.close()
+    finally:
+        listener.stop()
+
+    return score(timeline, client, alerts, tick_cpu, tick_wall, upstream)
+
+
+def score(timeline, client, alerts, tick_cpu, tick_wall, upstream):
+    """
+    Compares the alerts that were sent with the timeline.
+
+    :return: dict of results
+    """
+    # first alert for each (mode, progress) after it became true, and alerts that never matched the truth
+    first_alert = {}
+    false_alerts = 0
+    false_levels = {}  # mode -> [(alert time, progress)] of alerts that never matched the truth
+    eta_errors = {}  # (mode, alert time) -> minutes between the estimated and the true spawn
+    for t, _, content in alerts:
+        for line in content.splitlines():
+            found = ALERT.search(line)
+            if not found:
+                continue
+            progress, mode = int(found.group(1)), LABELS[found.group(2)]
+
+            estimate, spawn = SPAWN_ETA.search(line), timeline.next_spawn(mode, t)
+            if estimate and spawn is not None:
+                eta_errors[(mode, t)] = abs(int(estimate.group(1)) - EPOCH - spawn) / 60
+            true_progress, since = timeline.progress_at(mode, t)
+            if true_progress != progress:
+                false_alerts += 1
+                false_levels.setdefault(mode, []).append((t, progress))
+            else:
+                first_alert.setdefault((mode, since), t - since)
+
+    # changes we expect an alert for: increases to the default threshold or above, and spawns
+    expected = 0
+    for mode, (times, levels) in timeline.truth.items():
+        if not client.subscriptions.matching(dclone_discord.ModeState.INDEX[mode]):
+            continue
+        for index in range(1, len(levels)):
+            increase = levels[index] > levels[index - 1] and levels[index] >= dclone_discord.DCLONE_THRESHOLD
+            if increase or (levels[index] == 1 and levels[index - 1] > 1):
+                expected += 1
+
+    # troll reports that got an alert for their level while they were reported (or by the poll right after)
+    trolls, trolls_alerted = 0, 0
+    for mode, events in timeline.trolls.items():
+        for troll in events:
+            trolls += 1
+            until = troll['until'] + dclone_discord.DCLONE_POLL_MAX
+            if any(troll['t'] <= t <= until and progress == troll['progress'] for t, progress in false_levels.get(mode, ())):
+                trolls_alerted += 1
+    latencies = list(first_alert.values())
+    return {
+        'subscriptions': len(client.subscriptions),
+        'polls': len(tick_cpu),
+        'upstream_requests': upstream.requests,
+        'upstream_not_modified': upstream.not_modified,
+        'modes_skipped': dclone_discord.METRICS.counters.get(('dclone_poll_modes_total', (('result', 'skipped'),)), 0),
+        'modes_processed': dclone_discord.METRICS.counters.get(('dclone_poll_modes_total', (('result', 'processed'),)), 0),
+        'messages_sent': len(alerts),
+        'changes_expected': expected,
+        'changes_alerted': len(first_alert),
+        'time_to_alert_p50_s': round(percentile(latencies, 0.5), 1),
+        'time_to_alert_p95_s': round(percentile(latencies, 0.95), 1),
+        'time_to_alert_max_s': round(max(latencies, default=0), 1),
+        'spawn_eta_alerts': len(eta_errors),
+        'spawn_eta_error_p50_min': round(percentile(list(eta_errors.values()), 0.5), 1),
+        'troll_reports': trolls,
+        'false_alerts_sent': false_alerts,
+        'trolls_alerted': trolls_alerted,
+        'false_alerts_suppressed': trolls - trolls_alerted,
+        'tick_cpu_p50_ms': round(percentile(tick_cpu, 0.5) * 1000, 2),
+        'tick_cpu_max_ms': round(max(tick_cpu, default=0) * 1000, 2),
+        'tick_wall_p50_ms': round(percentile(tick_wall, 0.5) * 1000, 2),
+        'max_rss_mb': round(getrusage(RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'dispatcher': client.dispatcher.stats(),
+    }
+
+
+async def measure_lag(duration, interval=0.01):
+    """
+    Measures event loop lag by sleeping for `interval` seconds repeatedly and recording how late each wake up is.
+
+    :param duration: how long to measure for, in seconds
+    :param interval: ticker interval in seconds
+    :return: list of lag samples in seconds
+    """
+    loop = get_running_loop()
+    samples = []
+    end = loop.time() + duration
+    while loop.time() < end:
+        start = loop.time()
+        await sleep(interval)
+        samples.append(loop.time() - start - interval)
+    return samples
+
+
+def summarize(name, samples, elapsed):
+    """
+    Prints a summary line for a set of lag samples.
+    """
+    samples = sorted(samples) or [0.0]
+    p50 = samples[len(samples) // 2] * 1000
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+    print(f'{name:<10} elapsed {elapsed:6.2f}s  lag p50 {p50:8.2f}ms  p99 {p99:8.2f}ms  max {samples[-1] * 1000:8.2f}ms')
+
+
+async def bench_event_loop_lag(delay, requests):
+    """
+    Compares event loop lag while polling a slow upstream with the async HTTPClient and with a blocking baseline.
+    """
+    http = dclone_discord.HTTPClient(timeouts={'127.0.0.1': delay + 5})
+    client = dclone_discord.Diablo2IOClient(http)
+
+    try:
+        # async: all requests share the pooled session and the ticker keeps running
+        start = perf_counter()
+        ticker = create_task(measure_lag(delay * 2))
+        await gather(*(client.status() for _ in range(requests)))
+        summarize('async', await ticker, perf_counter() - start)
+
+        # blocking baseline: the previous implementation called a synchronous HTTP client from the event loop
+        start = perf_counter()
+        ticker = create_task(measure_lag(delay * 2))
+        await sleep(0)  # let the ticker start before we block
+        for _ in range(requests):
+            with urlopen(dclone_discord.Diablo2IOClient.API_URL, timeout=delay + 5) as response:  # nosec B310
+                response.read()
+            await sleep(0)
+        summarize('blocking', await ticker, perf_counter() - start)
+    finally:
+        await http.close()
+
+
+def upstream_overrides():
+    """
+    Returns the statements that point a new process at the running MockUpstream.
+    """
+    return [
+        'import dclone_discord',
+        f'dclone_discord.Diablo2IOClient.API_URL = {dclone_discord.Diablo2IOClient.API_URL!r}',
+        f'dclone_discord.D2RuneWizardClient.WALKS_URL = {dclone_discord.D2RuneWizardClient.WALKS_URL!r}',
+        f'dclone_discord.D2RuneWizardClient.PROGRESS_URL = {dclone_discord.D2RuneWizardClient.PROGRESS_URL!r}',
+    ]
+
+
+def spawn_bot(service, environment):
+    """
+    Starts the bot in a new process, pointed at the running MockUpstream.
+
+    :param service: headless service to run, WebhookClient or Poller
+    :param environment: extra environment variables
+    :return: Popen
+    """
+    code = '; '.join([*upstream_overrides(), 'listener = dclone_discord.setup_logging()', f'dclone_discord.{service}().run()', 'listener.stop()'])
+    return Popen([executable, '-c', code], env={**environ, 'DCLONE_LOG_LEVEL': 'WARNING', **environment})
+
+
+def spawn_gateway(environment):
+    """
+    Starts a new process that imports discord.py, constructs the gateway DiscordClient and runs its first poll against the
+    running MockUpstream, without logging into Discord. It prints a line once the first poll is done and then waits to be
+    terminated.
+
+    :param environment: extra environment variables
+    :return: Popen, with the output on a pipe
+    """
+    code = '\n'.join(
+        [
+            *upstream_overrides(),
+            'import discord',
+            'from asyncio import run, sleep',
+            'async def main():',
+            '    async with dclone_discord.DiscordClient(intents=discord.Intents.default()) as client:',
+            '        await client.monitor.check_dclone_status()',
+            '        print("ready", flush=True)',
+            '        await sleep(3600)',
+            'run(main())',
+        ]
+    )
+    return Popen([executable, '-c', code], env={**environ, 'DCLONE_LOG_LEVEL': 'WARNING', **environment}, stdout=PIPE)
+
+
+def process_usage(process):
+    """
+    Returns the resident memory (MB) and CPU time (seconds) of a running process.
+    """
+    with open(f'/proc/{process.pid}/status', encoding='utf-8') as status:
+        rss = next((int(line.split()[1]) for line in status if line.startswith('VmRSS:')), 0)
+    with open(f'/proc/{process.pid}/stat', encoding='utf-8') as stat:
+        utime, stime = stat.read().rsplit(')', 1)[1].split()[11:13]
+    return round(rss / 1024, 1), round((int(utime) + int(stime)) / sysconf('SC_CLK_TCK'), 2)
+
+
+def bench_startup(timeout):
+    """
+    Measures startup time and memory use in a new process, with webhook delivery and with the gateway client.
+
+    With webhook delivery this is the time until the bot posts its first message (the status board). The gateway client
+    can't log into the fake Discord, so for it this is the time until discord.py is imported, the client is constructed
+    and the first poll is done, which is when it would be ready to send. Memory use is measured at that point in both.
+    """
+    with MockUpstream() as upstream:
+        environment = {'DCLONE_DELIVERY': 'webhook', 'DCLONE_DISCORD_WEBHOOK': f'{upstream.url}/api/webhooks/1/token', 'DCLONE_STATUS_BOARD': '1'}
+        started = perf_counter()
+        process = spawn_bot('WebhookClient', environment)
+        try:
+            while not upstream.webhooks and perf_counter() - started < timeout:
+                sleep_sync(0.01)
+            first_message = upstream.webhooks[0][0] - started if upstream.webhooks else None
+            rss, _ = process_usage(process)
+        finally:
+            process.send_signal(SIGTERM)
+            exit_code = process.wait(timeout)
+        webhook = {'first_message_s': round(first_message, 3) if first_message is not None else None, 'rss_mb': rss, 'exit_code': exit_code}
+
+        started = perf_counter()
+        process = spawn_gateway({'DCLONE_DELIVERY': 'gateway'})
+        try:
+            ready = process.stdout.readline().strip() == b'ready'
+            first_poll = perf_counter() - started
+            rss, _ = process_usage(process)
+        finally:
+            process.kill()
+            process.wait(timeout)
+        gateway = {'first_poll_s': round(first_poll, 3) if ready else None, 'rss_mb': rss}
+
+    return {'webhook': webhook, 'gateway': gateway}
+
+
+def bench_split(notifiers, channels, seconds, seed):
+    """
+    Runs a poller and `notifiers` webhook notifier processes (or one standalone webhook bot with 0 notifiers) in real time
+    against a fast synthetic timeline, with the channels split evenly between the notifiers. Upstream requests should
+    not depend on the number of notifiers, and every channel should get the same alerts as with the standalone bot.
+    """
+    timeline = Timeline.synthetic(seconds / 3600, seed, level_minutes=0.25, troll_rate=120)
+    with MockUpstream(timeline=timeline, d2rw_lag=1.0) as upstream, TemporaryDirectory() as directory:
+        webhooks = [f'{upstream.url}/api/webhooks/{channel_id}/token' for channel_id in range(1, channels + 1)]
+        environment = {
+            'DCLONE_POLL_MIN': '1',
+            'DCLONE_POLL_MAX': '1',
+            'DCLONE_CONSENSUS_WINDOW': '2',
+            'DCLONE_EVENTS_SOCKET': f'{directory}/events.sock',
+        }
+
+        def subscriptions(part, parts):
+            return dumps([{'webhook': webhook} for webhook in webhooks[part::parts]])
+
+        processes = []
+        if notifiers:
+            processes.append(('poller', spawn_bot('Poller', {**environment, 'DCLONE_ROLE': 'poller'})))
+            for part in range(notifiers):
+                notifier = {**environment, 'DCLONE_ROLE': 'notifier', 'DCLONE_DELIVERY': 'webhook', 'DCLONE_SUBSCRIPTIONS': subscriptions(part, notifiers)}
+                processes.append((f'notifier-{part}', spawn_bot('WebhookClient', notifier)))
+        else:
+            standalone = {**environment, 'DCLONE_DELIVERY': 'webhook', 'DCLONE_SUBSCRIPTIONS': subscriptions(0, 1)}
+            processes.append(('standalone', spawn_bot('WebhookClient', standalone)))
+
+        # the timeline runs in real time, once every process had time to start and connect
+        started = perf_counter() + 3
+        try:
+            while perf_counter() - started < seconds:
+                upstream.now = max(perf_counter() - started, 0)
+                sleep_sync(0.05)
+            usage = {name: process_usage(process) for name, process in processes}
+        finally:
+            for _, process in processes:
+                process.send_signal(SIGTERM)
+            exit_codes = [process.wait(10) for _, process in processes]
+
+    alerts = [payload['content'] for _, method, payload in upstream.webhooks if method == 'POST' and ALERT.search(payload['content'])]
+    return {
+        'notifiers': notifiers,
+        'channels': channels,
+        'seconds': seconds,
+        'upstream_requests': upstream.requests,
+        'messages_sent': len(upstream.webhooks),
+        'alert_messages': len(alerts),
+        'processes': {name: {'rss_mb': rss, 'cpu_s': cpu} for name, (rss, cpu) in usage.items()},
+        'exit_codes': exit_codes,
+    }
+
+
+def reference_query(samples, since, until, buckets):
+    """
+    Returns what HistoryStore.query should return for a list of (timestamp, progress, reporter id) reports in the order
+    they were appended.
+    """
+    width = max(until - since, 1) / buckets
+    levels = [None] * buckets
+    before = [sample for sample in samples if sample[0] < since]
+    level = max(before, key=lambda sample: sample[0])[1] if before else None
+    for timestamp, progress, _ in samples:
+        if since <= timestamp < until:
+            levels[int((timestamp - since) / width)] = progress
+    for bucket, progress in enumerate(levels):
+        level = levels[bucket] = level if progress is None else progress
+    return levels
+
+
+def bench_history(days, seed):
+    """
+    Writes `days` of a synthetic timeline to a HistoryStore one poll per minute, reopens it (after cutting off the last
+    record, as a crash mid-write would) and keeps writing, then compacts it. Checks that queries match the reports that
+    were written before and after compaction, and that the reporter references survive the reopen.
+    """
+    clock = {'now': EPOCH}
+    dclone_discord.time = lambda: clock['now']  # the history store reads the time through this name
+    segment = dclone_discord.HistoryStore.SEGMENT
+    timeline = Timeline.synthetic(days * 24, seed)
+    written = {index: [] for index in range(len(dclone_discord.MODES))}  # mode index -> reports in the order they were appended
+    segments = {}  # (mode index, segment start) -> reports appended while the segment was open
+    errors = []
+
+    with TemporaryDirectory() as directory:
+        options = {'retention': (days - 2) * 86400, 'downsample': 3 * 86400, 'resolution': 900}
+        store = dclone_discord.HistoryStore(directory, **options)
+        reopen = timeline.duration - 43200
+        reopened = None
+        fresh = set()  # modes whose latest report the reopened store doesn't know yet, so it writes it again
+        reported = {}  # mode index -> (latest report, as written)
+        write_time = 0.0
+        t = 0.0
+        while t < timeline.duration:
+            clock['now'] = EPOCH + t
+            if reopened is None and t >= reopen:
+                # a truncated record at the end of the open segment is dropped when the segment is reopened
+                index = 0
+                with open(store.segment_path(index, store.writers[index][0]), 'ab') as segment_file:
+                    segment_file.write(b'\x85')
+                store = dclone_discord.HistoryStore(directory, **options)
+                reopened = int(clock['now'] // segment * segment)
+                fresh = set(written)
+
+            started = perf_counter()
+            for status in timeline.status_at(t):
+                index = dclone_discord.ModeState.INDEX[(status['region'], status['ladder'], status['hc'])]
+                report = sample = (int(status['timestamped']), int(status['progress']), status['reporter_id'])
+                if index in reported and reported[index][0] == report:
+                    sample = reported[index][1]
+                elif written[index] and report[0] < written[index][-1][0]:
+                    # diablo2.io stamps a report replacing a troll report with the time it was made, the timeline keeps
+                    # the time the level was first reached
+                    sample = (int(clock['now']), report[1], report[2])
+                reported[index] = (report, sample)
+
+                if not written[index] or sample != written[index][-1] or index in fresh:
+                    fresh.discard(index)
+                    written[index].append(sample)
+                    segments.setdefault((index, int(clock['now'] // segment * segment)), []).append(sample)
+                store.append(index, sample[1], sample[0], sample[2])
+            store.flush()
+            write_time += perf_counter() - started
+            t += 60
+
+        raw_bytes = sum(getsize(path) for index in written for _, path in store.segments(index))
+
+        # every report written to the segment that was reopened, with its reporter
+        for index in written:
+            with open(store.segment_path(index, reopened), 'rb') as segment_file:
+                data = segment_file.read()
+            decoded = [(timestamp, progress, reporter_id) for _, timestamp, progress, reporter_id in dclone_discord.HistoryStore.decode(data, reopened)]
+            # the segment starts with the mode's latest report when nothing new was reported in its first poll
+            expected = segments.get((index, reopened), [])
+            if decoded != expected and decoded[1:] != expected:
+                errors.append(f'mode {index}: segment {reopened} does not round-trip')
+
+        # day by day, hour by hour queries of every mode before and after compaction
+        ranges = [(start, start + segment) for start in range(int(EPOCH // segment + 1) * segment, int(clock['now']) - segment, segment)]
+        started = perf_counter()
+        before = {(index, since): store.query(index, since, until) for index in written for since, until in ranges}
+        query_time = (perf_counter() - started) / max(len(before), 1)
+
+        for (index, since), levels in before.items():
+            if levels != reference_query(written[index], since, since + segment, 24):
+                errors.append(f'mode {index}: query from {since} does not match the written reports')
+
+        store.compact(clock['now'])
+        compacted_bytes = sum(getsize(path) for index in written for _, path in store.segments(index))
+        for index in written:
+            for start, path in store.segments(index):
+                if start + segment <= clock['now'] - options['retention']:
+                    errors.append(f'{path} is older than the retention')
+                elif path.endswith('.raw') and start + segment <= clock['now'] - options['downsample']:
+                    errors.append(f'{path} was not downsampled')
+
+        for (index, since), levels in before.items():
+            if since + segment > clock['now'] - options['retention'] and store.query(index, since, since + segment) != levels:
+                errors.append(f'mode {index}: query from {since} changed after compaction')
+
+    return {
+        'days': days,
+        'reports_written': sum(len(samples) for samples in written.values()),
+        'write_ms_per_poll': round(write_time / (timeline.duration / 60) * 1000, 3),
+        'query_ms': round(query_time * 1000, 3),
+        'raw_kb': round(raw_bytes / 1024, 1),
+        'compacted_kb': round(compacted_bytes / 1024, 1),
+        'errors': errors,
+    }
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    lag = commands.add_parser('lag', help='event loop lag while an upstream is slow')
+    lag.add_argument('--delay', type=float, default=1.0, help='upstream response delay in seconds')
+    lag.add_argument('--requests', type=int, default=3, help='number of upstream requests per run')
+
+    startup = commands.add_parser('startup', help='startup time and memory use with webhook delivery and with the gateway client')
+    startup.add_argument('--timeout', type=float, default=10.0, help='seconds to wait for the first message')
+
+    split = commands.add_parser('split', help='upstream requests and delivery with a poller and several notifier processes')
+    split.add_argument('--notifiers', type=int, default=4, help='number of notifier processes, 0 for one standalone bot')
+    split.add_argument('--channels', type=int, default=200, help='number of subscribed channels (webhooks)')
+    split.add_argument('--seconds', type=float, default=30, help='seconds to run for')
+    split.add_argument('--seed', type=int, default=1, help='random seed for the synthetic timeline')
+
+    history = commands.add_parser('history', help='progress history write, reopen, compact and query round-trip')
+    history.add_argument('--days', type=int, default=10, help='days of synthetic history to write, at least 3')
+    history.add_argument('--seed', type=int, default=1, help='random seed for the synthetic timeline')
+
+    replay_parser = commands.add_parser('replay', help='replay a progress timeline through the background task')
+    replay_parser.add_argument('--hours', type=float, default=24, help='length of the synthetic timeline in hours')
+    replay_parser.add_argument('--channels', type=int, default=1000, help='number of subscribed channels')
+    replay_parser.add_argument('--seed', type=int, default=1, help='random seed for the synthetic timeline and subscriptions')
+    replay_parser.add_argument('--timeline', help='replay a recorded JSON lines timeline instead of a synthetic one')
+    replay_parser.add_argument('--record', help='record the replayed timeline to a JSON lines file')
+    replay_parser.add_argument('--max-tick-ms', type=float, help='fail if the median CPU time per poll exceeds this')
+    replay_parser.add_argument('--max-false-alerts', type=int, help='fail if more false alerts than this are sent')
+    replay_parser.add_argument('--sources', default=dclone_discord.DCLONE_SOURCES, help='comma separated progress sources, as in DCLONE_SOURCES')
+    replay_parser.add_argument('--policy', default=dclone_discord.DCLONE_CONSENSUS_POLICY, help='consensus policy, as in DCLONE_CONSENSUS_POLICY')
+    replay_parser.add_argument('--d2rw-lag', type=float, default=45.0, help='seconds the d2runewizard.com progress lags behind the true progress')
+    replay_parser.add_argument('--verbose', action='store_true', help="print the bot's output")
+    args = parser.parse_args()
+
+    if args.command == 'lag':
+        print(dumps({'benchmark': 'event_loop_lag', 'delay': args.delay, 'requests': args.requests}))
+        with MockUpstream(delay=args.delay):
+            run(bench_event_loop_lag(args.delay, args.requests))
+        return
+
+    if args.command == 'startup':
+        print(dumps({'benchmark': 'startup', **bench_startup(args.timeout)}, indent=2))
+        return
+
+    if args.command == 'split':
+        print(dumps({'benchmark': 'split', **bench_split(args.notifiers, args.channels, args.seconds, args.seed)}, indent=2))
+        return
+
+    if args.command == 'history':
+        results = bench_history(args.days, args.seed)
+        print(dumps({'benchmark': 'history', **results}, indent=2))
+        sys_exit(1 if results['errors'] else 0)
+
+    timeline = Timeline.load(args.timeline) if args.timeline else Timeline.synthetic(args.hours, args.seed)
+    if args.record:
+        timeline.save(args.record)
+
+    with MockUpstream(timeline=timeline, d2rw_lag=args.d2rw_lag) as upstream:
+        subscriptions = synthetic_subscriptions(args.channels, args.seed)
+        results = run(replay(timeline, upstream, subscriptions, sources=args.sources, policy=args.policy, verbose=args.verbose))
+    print(dumps({'benchmark': 'replay', **results}, indent=2))
+
+    failed = args.max_tick_ms is not None and results['tick_cpu_p50_ms'] > args.max_tick_ms
+    failed |= args.max_false_alerts is not None and results['false_alerts_sent'] > args.max_false_alerts
+    sys_exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
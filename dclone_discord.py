@@ -16,14 +16,40 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
-from datetime import datetime
-from os import environ
+from asyncio import TimeoutError as AsyncTimeoutError
+from asyncio import Event, PriorityQueue, QueueFull, create_task, current_task, gather, get_running_loop, open_unix_connection, shield, sleep
+from asyncio import start_unix_server, wait_for
+from asyncio import run as asyncio_run
+from bisect import bisect_left
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import cache, partial
+from hashlib import blake2b
+from heapq import heappop, heappush
+from itertools import count
+from json import JSONDecodeError, dumps, load, loads
+from logging.handlers import QueueHandler, QueueListener
+from math import inf
+from os import chmod, environ, listdir, makedirs, remove
+from os import replace as replace_file
+from os.path import isdir, join
+from queue import SimpleQueue
+from random import uniform
 from re import match
-from time import time
+from signal import SIGINT, SIGTERM
+from socket import AF_UNIX, SOCK_STREAM, socket
+from sqlite3 import connect
+from sys import stdout
+from time import monotonic, time
+from urllib.parse import urlsplit
 
-import discord
-from discord.ext import tasks
-from requests import get
+import logging
+
+import aiohttp
+from aiohttp import web
+
+np = None  # numpy, imported by SpawnEstimator when spawn estimates are enabled (DCLONE_ETA_TRANSITIONS)
 
 #####################
 # Bot Configuration #
@@ -40,8 +66,29 @@ from requests import get
 DCLONE_DISCORD_TOKEN = environ.get('DCLONE_DISCORD_TOKEN')
 DCLONE_DISCORD_CHANNEL_ID = int(environ.get('DCLONE_DISCORD_CHANNEL_ID', 0))
 
+# Webhook delivery (Optional)
+# Posts alerts through Discord webhooks without logging in as a bot: starts faster and uses less memory, but there is no chatop
+DCLONE_DELIVERY = environ.get('DCLONE_DELIVERY', 'gateway')  # gateway for the full bot, webhook to only post through webhook urls
+DCLONE_DISCORD_WEBHOOK = environ.get('DCLONE_DISCORD_WEBHOOK', '')  # webhook url to send alerts to, replaces DCLONE_DISCORD_TOKEN and DCLONE_DISCORD_CHANNEL_ID
+
+# Poller/notifier split (Optional)
+# One poller process queries the upstream APIs and publishes progress and walk events on a Unix socket, any number of notifier
+# processes (gateway, sharded gateway or webhook) subscribe to it and send alerts, so upstream load doesn't grow with delivery
+DCLONE_ROLE = environ.get('DCLONE_ROLE', 'standalone')  # standalone to poll and send alerts, poller to only poll, notifier to only send alerts
+DCLONE_EVENTS_SOCKET = environ.get('DCLONE_EVENTS_SOCKET', 'dclone_events.sock')  # path of the Unix socket the poller publishes events on
+DCLONE_SHARDS = environ.get('DCLONE_SHARDS', '')  # blank for one gateway connection, auto for Discord's recommended shard count, or the number of shards
+DCLONE_SHARD_IDS = environ.get('DCLONE_SHARD_IDS', '')  # comma separated shards to run in this process (needs a DCLONE_SHARDS count), blank for all
+
+# Subscriptions (Optional)
+# A JSON list (or the path to a JSON file containing a list) of channels to send alerts to, each with its own filters.
+# Replaces DCLONE_DISCORD_CHANNEL_ID, DCLONE_REGION, DCLONE_LADDER, DCLONE_HC, DCLONE_THRESHOLD and DCLONE_REPORTS when set.
+# The configuration variables below are used as defaults for any keys missing from a subscription.
+# [{"channel_id": 123456123456123456, "region": "2", "ladder": "1", "hc": "2", "threshold": 4, "reports": 2, "board": false}, ...]
+# With webhook delivery, set "webhook" to the channel's webhook url ("channel_id" is optional)
+DCLONE_SUBSCRIPTIONS = environ.get('DCLONE_SUBSCRIPTIONS', '')
+
 # D2RuneWizard API (Optional but recommended)
-# Token and contact (email address) are necessary for planned walk notifications
+# Token and contact (email address) are necessary for planned walk notifications and the d2runewizard.com progress source
 DCLONE_D2RW_TOKEN = environ.get('DCLONE_D2RW_TOKEN')
 DCLONE_D2RW_CONTACT = environ.get('DCLONE_D2RW_CONTACT')
 
@@ -51,10 +98,75 @@ DCLONE_REGION = environ.get('DCLONE_REGION', '')  # 1 for Americas, 2 for Europe
 DCLONE_LADDER = environ.get('DCLONE_LADDER', '')  # 1 for Ladder, 2 for Non-Ladder, blank for all
 DCLONE_HC = environ.get('DCLONE_HC', '2')  # 1 for Hardcore, 2 for Softcore, blank for all
 
+# Progress sources (Optional)
+# Defaults to diablo2.io and d2runewizard.com (when DCLONE_D2RW_TOKEN and DCLONE_D2RW_CONTACT are set), alerting right away when both agree
+DCLONE_SOURCES = environ.get('DCLONE_SOURCES', 'diablo2.io,d2runewizard.com')  # comma separated diablo2.io, d2runewizard.com or paths/urls of JSON files
+DCLONE_SOURCE_QUORUM = int(environ.get('DCLONE_SOURCE_QUORUM', 2))  # number of sources that must agree to alert without waiting out DCLONE_CONSENSUS_WINDOW
+
 # Bot specific (Optional)
 # Defaults to alerting at level 3 if the last 3 progress reports match
 DCLONE_THRESHOLD = int(environ.get('DCLONE_THRESHOLD', 3))  # progress level to alert at (and above)
 DCLONE_REPORTS = int(environ.get('DCLONE_REPORTS', 3))  # number of matching reports required before alerting (reduces trolling)
+# seconds a progress level must be reported for before alerting, defaults to the time DCLONE_REPORTS polls take at 60 seconds per poll
+DCLONE_CONSENSUS_WINDOW = float(environ.get('DCLONE_CONSENSUS_WINDOW', max(DCLONE_REPORTS - 1, 0) * 60))
+
+# Consensus policy (Optional)
+# Defaults to weighting reports by how often each reporter's past reports were confirmed (reporter reputation)
+DCLONE_CONSENSUS_POLICY = environ.get('DCLONE_CONSENSUS_POLICY', 'reputation')  # reputation, or window to require DCLONE_CONSENSUS_WINDOW for every report
+DCLONE_TRUST_SCORE = float(environ.get('DCLONE_TRUST_SCORE', 0.8))  # reputation (0 to 1) at or above which a reporter's reports need a shorter window
+DCLONE_DISTRUST_SCORE = float(environ.get('DCLONE_DISTRUST_SCORE', 0.25))  # reputation at or below which a reporter's reports can't reset the window
+DCLONE_REPUTATION_SIZE = int(environ.get('DCLONE_REPUTATION_SIZE', 10000))  # maximum number of reporters to remember
+
+# Polling (Optional)
+# Defaults to polling every 30 seconds when a mode is at 4/6 or above and every 120 seconds when all modes are at 1/6 or 2/6
+DCLONE_POLL_MIN = float(environ.get('DCLONE_POLL_MIN', 30))  # fastest polling interval in seconds
+DCLONE_POLL_MAX = float(environ.get('DCLONE_POLL_MAX', 120))  # slowest polling interval in seconds
+
+# HTTP client (Optional)
+# Defaults to a 10 second timeout per upstream and 2 retries with exponential backoff
+DCLONE_D2IO_TIMEOUT = float(environ.get('DCLONE_D2IO_TIMEOUT', 10))  # seconds before a diablo2.io request times out
+DCLONE_D2RW_TIMEOUT = float(environ.get('DCLONE_D2RW_TIMEOUT', 10))  # seconds before a d2runewizard.com request times out
+DCLONE_HTTP_RETRIES = int(environ.get('DCLONE_HTTP_RETRIES', 2))  # number of retries for failed or rate limited requests
+DCLONE_HTTP_BACKOFF = float(environ.get('DCLONE_HTTP_BACKOFF', 1))  # base delay in seconds between retries (doubles each retry)
+DCLONE_CACHE_TTL = float(environ.get('DCLONE_CACHE_TTL', DCLONE_POLL_MAX))  # seconds the chatop can reuse the last fetched status before refreshing
+
+# State (Optional)
+# Progress, recent reports, alerted walks and status boards are saved here after every poll and restored on startup
+DCLONE_STATE_FILE = environ.get('DCLONE_STATE_FILE', 'dclone_state.sqlite3')  # path to the SQLite state file, blank to disable
+
+# History (Optional)
+# Every observed progress report is appended to compact per-mode segment files, queried by the `.dclone history` chatop
+DCLONE_HISTORY_DIR = environ.get('DCLONE_HISTORY_DIR', 'dclone_history')  # directory to store progress history in, blank to disable
+DCLONE_HISTORY_RETENTION = float(environ.get('DCLONE_HISTORY_RETENTION', 180))  # days of progress history to keep
+DCLONE_HISTORY_DOWNSAMPLE = float(environ.get('DCLONE_HISTORY_DOWNSAMPLE', 7))  # days after which progress history is downsampled
+DCLONE_HISTORY_RESOLUTION = float(environ.get('DCLONE_HISTORY_RESOLUTION', 900))  # seconds per sample in downsampled progress history
+
+# Spawn estimates (Optional)
+# Time to the next level and to the spawn, estimated from how long recent levels took (seeded from DCLONE_HISTORY_DIR on startup)
+DCLONE_ETA_TRANSITIONS = int(environ.get('DCLONE_ETA_TRANSITIONS', 48))  # recent progress changes per mode to estimate from, 0 to disable
+
+# Discord delivery (Optional)
+# Defaults to 4 concurrent senders, at most 5 messages per 5 seconds to each channel and 3 retries per message
+DCLONE_QUEUE_SIZE = int(environ.get('DCLONE_QUEUE_SIZE', 1000))  # maximum number of queued outbound messages, new messages are dropped when full
+DCLONE_SEND_WORKERS = int(environ.get('DCLONE_SEND_WORKERS', 4))  # number of messages sent concurrently (to different channels)
+DCLONE_SEND_RETRIES = int(environ.get('DCLONE_SEND_RETRIES', 3))  # number of retries for failed or rate limited messages
+DCLONE_CHANNEL_RATE = int(environ.get('DCLONE_CHANNEL_RATE', 5))  # maximum number of messages sent to a channel per 5 seconds
+DCLONE_WALK_REMINDERS = environ.get('DCLONE_WALK_REMINDERS', '60')  # comma separated minutes before a planned walk to send reminders at
+DCLONE_STATUS_BOARD = bool(int(environ.get('DCLONE_STATUS_BOARD', 0)))  # 1 to keep a pinned progress message up to date instead of posting progress alerts
+DCLONE_BOARD_EDITS = int(environ.get('DCLONE_BOARD_EDITS', 6))  # maximum number of status board edits per channel per minute
+DCLONE_BUNDLE_WINDOW = float(environ.get('DCLONE_BUNDLE_WINDOW', 0))  # seconds to collect alerts into one message per channel, 0 for one message per poll
+
+# Metrics (Optional)
+# Prometheus metrics are served on http://DCLONE_METRICS_HOST:DCLONE_METRICS_PORT/metrics, disabled by default
+DCLONE_METRICS_PORT = int(environ.get('DCLONE_METRICS_PORT', 0))  # port to serve metrics on, 0 to disable
+DCLONE_METRICS_HOST = environ.get('DCLONE_METRICS_HOST', '127.0.0.1')  # address to serve metrics on
+
+# Logging (Optional)
+# Defaults to JSON logs on stdout, written by a background thread so logging never blocks the bot
+DCLONE_LOG_FORMAT = environ.get('DCLONE_LOG_FORMAT', 'json')  # json for one JSON object per line, text for plain messages
+DCLONE_LOG_LEVEL = environ.get('DCLONE_LOG_LEVEL', 'INFO')  # minimum level to log, DEBUG also logs every alert sent to each channel
+DCLONE_LOG_SAMPLE = float(environ.get('DCLONE_LOG_SAMPLE', 60))  # seconds between logged suspicious reports from the same reporter, 0 to log all
+DCLONE_LOG_QUEUE_SIZE = int(environ.get('DCLONE_LOG_QUEUE_SIZE', 10000))  # maximum number of queued log records, new records are dropped when full
 
 ########################
 # End of configuration #
@@ -65,449 +177,3950 @@ LADDER = {'1': 'Ladder', '2': 'Non-Ladder', '': 'Ladder and Non-Ladder'}
 LADDER_RW = {True: 'Ladder', False: 'Non-Ladder'}
 HC = {'1': 'Hardcore', '2': 'Softcore', '': 'Hardcore and Softcore'}
 HC_RW = {True: 'Hardcore', False: 'Softcore'}
+REGION_RW = {'Americas': '1', 'Europe': '2', 'Asia': '3'}
+REGION_EMOJI = {'1': ':flag_us:', '2': ':flag_eu:', '3': ':flag_kr:', 'TBD': ':grey_question:'}
+LADDER_EMOJI = {'1': ':ladder:', '2': ':crossed_swords:'}
+HC_EMOJI = {'1': ':skull_crossbones:', '2': ':mage:'}
+MESSAGE_LIMIT = 2000  # maximum length of a Discord message
+HTTP_TIMEOUTS = {'diablo2.io': DCLONE_D2IO_TIMEOUT, 'd2runewizard.com': DCLONE_D2RW_TIMEOUT}
+MODES = tuple((region, ladder, hardcore) for region in ('1', '2', '3') for ladder in ('1', '2') for hardcore in ('1', '2'))
+logger = logging.getLogger('dclone')
 
-# DCLONE_DISCORD_TOKEN and DCLONE_DISCORD_CHANNEL_ID are required
-if not DCLONE_DISCORD_TOKEN or DCLONE_DISCORD_CHANNEL_ID == 0:
-    print('Please set DCLONE_DISCORD_TOKEN and DCLONE_DISCORD_CHANNEL_ID in your environment.')
+# DCLONE_DISCORD_TOKEN and either DCLONE_DISCORD_CHANNEL_ID or DCLONE_SUBSCRIPTIONS are required, or a webhook for webhook delivery
+if DCLONE_ROLE not in ('standalone', 'poller', 'notifier'):
+    print('Error: DCLONE_ROLE must be standalone, poller or notifier.')
+    exit(1)
+elif DCLONE_ROLE == 'poller':
+    pass  # the poller doesn't send messages
+elif DCLONE_DELIVERY == 'webhook':
+    if not DCLONE_DISCORD_WEBHOOK and not DCLONE_SUBSCRIPTIONS:
+        print('Please set DCLONE_DISCORD_WEBHOOK (or DCLONE_SUBSCRIPTIONS with webhook urls) in your environment.')
+        exit(1)
+elif not DCLONE_DISCORD_TOKEN or (DCLONE_DISCORD_CHANNEL_ID == 0 and not DCLONE_SUBSCRIPTIONS):
+    print('Please set DCLONE_DISCORD_TOKEN and DCLONE_DISCORD_CHANNEL_ID (or DCLONE_SUBSCRIPTIONS) in your environment.')
     exit(1)
 
 # DCLONE_D2RW_CONTACT must be an email address
-if not match(r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$', DCLONE_D2RW_CONTACT):
+if DCLONE_D2RW_CONTACT and not match(r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$', DCLONE_D2RW_CONTACT):
     print('Error: DCLONE_D2RW_CONTACT must be an email address.')
     DCLONE_D2RW_CONTACT = None
 
 
-class D2RuneWizardClient:
+class JSONFormatter(logging.Formatter):
     """
-    Interacts with the d2runewizard.com API to get planned walks.
+    Formats log records as one JSON object per line, with the event name and any structured fields as top level keys.
     """
 
-    @staticmethod
-    def emoji(region='', ladder='', hardcore=''):
-        """
-        Returns a string of Discord emoji for a given mode.
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'event': getattr(record, 'event', record.name),
+            'message': record.getMessage(),
+            **getattr(record, 'fields', {}),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return dumps(entry, default=str)
 
-        :param region: region to get emoji for
-        :param ladder: ladder to get emoji for
-        :param hardcore: hardcore to get emoji for
-        :return: string of Discord emoji
-        """
-        if region == 'Americas':
-            region = ':flag_us:'
-        elif region == 'Europe':
-            region = ':flag_eu:'
-        elif region == 'Asia':
-            region = ':flag_kr:'
-        elif region == 'TBD':
-            region = ':grey_question:'
-
-        if ladder is True:
-            ladder = ':ladder:'
-        elif ladder is False:
-            ladder = ':crossed_swords:'
-
-        if hardcore is True:
-            hardcore = ':skull_crossbones:'
-        elif hardcore is False:
-            hardcore = ':mage:'
 
-        return f'{region} {ladder} {hardcore}'
+class DroppingQueueHandler(QueueHandler):
+    """
+    Queues log records for a background thread to write, dropping records when `size` records are already waiting.
 
-    @staticmethod
-    def filter_walks(walks):
+    :param queue: queue read by the QueueListener
+    :param size: maximum number of queued records
+    """
+
+    def __init__(self, queue, size=DCLONE_LOG_QUEUE_SIZE):
+        super().__init__(queue)
+        self.size = size
+        self.dropped = 0
+
+    def enqueue(self, record):
+        if self.queue.qsize() >= self.size:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+
+class LogSampler:
+    """
+    Limits repeated log events to one per key every `interval` seconds, counting how many were suppressed in between.
+
+    :param interval: seconds between logged events with the same key, 0 to log every event
+    :param size: maximum number of keys to remember
+    """
+
+    def __init__(self, interval=DCLONE_LOG_SAMPLE, size=10000):
+        self.interval = interval
+        self.size = size
+        self.keys = {}  # key -> [time last logged, events suppressed since]
+
+    def allow(self, key):
         """
-        Returns a filtered list of walks based on the configured mode (region, ladder, hardcore). Region TBD walks are always included.
+        Returns the number of suppressed events to report if an event with a given key should be logged, otherwise None.
 
-        :param walks: list of walks
-        :return: list of walks filtered to the configured mode
+        :param key: key to rate limit on, usually the reporter id
+        :return: number of events suppressed since the last one logged, None if this event should be suppressed
         """
-        # filter walks to configured region, includ any region TBD walks
-        if DCLONE_REGION == '1':
-            walks = [walk for walk in walks if walk.get('region') == 'Americas' or walk.get('region') == 'TBD']
-        elif DCLONE_REGION == '2':
-            walks = [walk for walk in walks if walk.get('region') == 'Europe' or walk.get('region') == 'TBD']
-        elif DCLONE_REGION == '3':
-            walks = [walk for walk in walks if walk.get('region') == 'Asia' or walk.get('region') == 'TBD']
+        now = time()
+        state = self.keys.get(key)
+        if state is not None and now - state[0] < self.interval:
+            state[1] += 1
+            return None
 
-        # filter walks to ladder/non-ladder
-        if DCLONE_LADDER == '1':
-            walks = [walk for walk in walks if walk.get('ladder')]
-        elif DCLONE_LADDER == '2':
-            walks = [walk for walk in walks if not walk.get('ladder')]
+        # forget keys that haven't been seen for a while so trolls rotating reporter ids can't grow this forever
+        if state is None and len(self.keys) >= self.size:
+            self.keys = {key: value for key, value in self.keys.items() if now - value[0] < self.interval}
+        self.keys[key] = [now, 0]
+        return state[1] if state else 0
 
-        # filter walks to hardcore/softcore
-        if DCLONE_HC == '1':
-            walks = [walk for walk in walks if walk.get('hardcore')]
-        elif DCLONE_HC == '2':
-            walks = [walk for walk in walks if not walk.get('hardcore')]
 
-        return walks
+def setup_logging(level=DCLONE_LOG_LEVEL, fmt=DCLONE_LOG_FORMAT, stream=None):
+    """
+    Sends bot logs through a bounded queue to a background thread, so writing logs never blocks the event loop.
+
+    :param level: minimum log level name
+    :param fmt: json for one JSON object per line, text for plain messages
+    :param stream: stream to write logs to, defaults to stdout
+    :return: started QueueListener writing the logs, stop it to write any queued records before exiting
+    """
+    handler = logging.StreamHandler(stream or stdout)
+    handler.setFormatter(JSONFormatter() if fmt == 'json' else logging.Formatter('%(message)s'))
 
+    listener = QueueListener(SimpleQueue(), handler)
+    logger.handlers = [DroppingQueueHandler(listener.queue)]
+    logger.setLevel(level.upper())
+    logger.propagate = False
+    listener.start()
+    return listener
 
-class Diablo2IOClient:
+
+def log_event(event, message, level=logging.INFO, **fields):
+    """
+    Logs a structured event.
+
+    :param event: event name, used to filter logs
+    :param message: human readable message
+    :param level: log level
+    :param fields: structured fields included in JSON logs
+    """
+    logger.log(level, message, extra={'event': event, 'fields': fields})
+
+
+class Metrics:
     """
-    Interacts with the diablo2.io dclone API. Tracks the current progress and recent reports for each mode.
+    In-process registry of Prometheus counters, gauges and histograms.
+
+    Recording a sample is a dictionary update so the hot paths stay cheap. Collectors are called when the registry is
+    scraped to set gauges that are cheaper to read on demand than to keep up to date.
     """
 
+    # histogram bucket upper bounds in seconds
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    # metric name -> (type, help)
+    METRICS = {
+        'dclone_upstream_latency_seconds': ('histogram', 'Upstream API request latency by host'),
+        'dclone_upstream_retries_total': ('counter', 'Upstream API requests retried by host'),
+        'dclone_upstream_errors_total': ('counter', 'Upstream API requests that failed after all retries by source'),
+        'dclone_upstream_responses_total': ('counter', 'Upstream API responses by host and whether the payload changed'),
+        'dclone_poll_modes_total': ('counter', 'Modes checked by the background task, by whether they were processed or skipped'),
+        'dclone_poll_duration_seconds': ('histogram', 'Time spent processing a poll after the upstream fetch'),
+        'dclone_discord_send_seconds': ('histogram', 'Discord message send latency'),
+        'dclone_event_loop_lag_seconds': ('histogram', 'Event loop scheduling lag'),
+        'dclone_messages_total': ('counter', 'Outbound Discord messages by result'),
+        'dclone_queue_depth': ('gauge', 'Outbound Discord messages waiting to be sent'),
+        'dclone_alerts_total': ('counter', 'Alerts queued by kind'),
+        'dclone_rollbacks_total': ('counter', 'Confirmed progress rollbacks by mode'),
+        'dclone_suspicious_reports_total': ('counter', 'Progress reports not (yet) confirmed by consensus by mode'),
+        'dclone_cache_requests_total': ('counter', 'Snapshot cache requests by result'),
+        'dclone_progress': ('gauge', 'Confirmed dclone progress by mode'),
+        'dclone_report_cache_depth': ('gauge', 'Recent progress reports kept for consensus by mode'),
+        'dclone_events_total': ('counter', 'Events published to notifier processes by type'),
+        'dclone_event_notifiers': ('gauge', 'Notifier processes subscribed to the poller'),
+    }
+
     def __init__(self):
-        # Current progress (last alerted) for each mode
-        self.current_progress = {
-            ('1', '1', '1'): 1,  # Americas, Ladder, Hardcore
-            ('1', '1', '2'): 1,  # Americas, Ladder, Softcore
-            ('1', '2', '1'): 1,  # Americas, Non-Ladder, Hardcore
-            ('1', '2', '2'): 1,  # Americas, Non-Ladder, Softcore
-            ('2', '1', '1'): 1,  # Europe, Ladder, Hardcore
-            ('2', '1', '2'): 1,  # Europe, Ladder, Softcore
-            ('2', '2', '1'): 1,  # Europe, Non-Ladder, Hardcore
-            ('2', '2', '2'): 1,  # Europe, Non-Ladder, Softcore
-            ('3', '1', '1'): 1,  # Asia, Ladder, Hardcore
-            ('3', '1', '2'): 1,  # Asia, Ladder, Softcore
-            ('3', '2', '1'): 1,  # Asia, Non-Ladder, Hardcore
-            ('3', '2', '2'): 1,  # Asia, Non-Ladder, Softcore
-        }
+        self.counters = {}  # (name, labels) -> value
+        self.gauges = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self.collectors = []
 
-        # Recent reports for each mode. These are truncated to DCLONE_REPORTS and alerts are sent if
-        # all recent reports for a mode agree on the progress level. This reduces trolling/false reports
-        # but also increases the delay between a report and an alert.
-        self.report_cache = {
-            ('1', '1', '1'): [1],  # Americas, Ladder, Hardcore
-            ('1', '1', '2'): [1],  # Americas, Ladder, Softcore
-            ('1', '2', '1'): [1],  # Americas, Non-Ladder, Hardcore
-            ('1', '2', '2'): [1],  # Americas, Non-Ladder, Softcore
-            ('2', '1', '1'): [1],  # Europe, Ladder, Hardcore
-            ('2', '1', '2'): [1],  # Europe, Ladder, Softcore
-            ('2', '2', '1'): [1],  # Europe, Non-Ladder, Hardcore
-            ('2', '2', '2'): [1],  # Europe, Non-Ladder, Softcore
-            ('3', '1', '1'): [1],  # Asia, Ladder, Hardcore
-            ('3', '1', '2'): [1],  # Asia, Ladder, Softcore
-            ('3', '2', '1'): [1],  # Asia, Non-Ladder, Hardcore
-            ('3', '2', '2'): [1],  # Asia, Non-Ladder, Softcore
-        }
+    def inc(self, name, value=1, **labels):
+        """
+        Increments a counter.
 
-        # tracks planned walks from D2RuneWizard that have already alerted
-        # TODO: move to D2RuneWizardClient
-        self.alerted_walks = []
+        :param name: metric name
+        :param value: amount to increment by
+        :param labels: metric labels
+        """
+        key = (name, tuple(labels.items()))
+        self.counters[key] = self.counters.get(key, 0) + value
 
-    @staticmethod
-    def emoji(region='', ladder='', hardcore=''):
+    def set(self, name, value, **labels):
         """
-        Returns a string of Discord emoji for a given game mode.
+        Sets a gauge.
 
-        :param region: 1 for Americas, 2 for Europe, 3 for Asia
-        :param ladder: 1 for Ladder, 2 for Non-Ladder
-        :param hardcore: 1 for Hardcore, 2 for Softcore
-        :return: Discord emoji string
+        :param name: metric name
+        :param value: gauge value
+        :param labels: metric labels
         """
-        if region == '1':
-            region = ':flag_us:'
-        elif region == '2':
-            region = ':flag_eu:'
-        elif region == '3':
-            region = ':flag_kr:'
+        self.gauges[(name, tuple(labels.items()))] = value
 
-        if ladder == '1':
-            ladder = ':ladder:'
-        elif ladder == '2':
-            ladder = ':crossed_swords:'
+    def observe(self, name, value, **labels):
+        """
+        Records a histogram sample.
 
-        if hardcore == '1':
-            hardcore = ':skull_crossbones:'
-        elif hardcore == '2':
-            hardcore = ':mage:'
+        :param name: metric name
+        :param value: sample in seconds
+        :param labels: metric labels
+        """
+        key = (name, tuple(labels.items()))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = [0] * (len(self.BUCKETS) + 2)
+        histogram[bisect_left(self.BUCKETS, value)] += 1
+        histogram[-1] += value
 
-        return f'{region} {ladder} {hardcore}'
+    def collect(self, collector):
+        """
+        Registers a function that is called before every scrape, usually to set gauges.
 
-    def status(self, region='', ladder='', hardcore=''):
+        :param collector: function taking no arguments
         """
-        Get the currently reported dclone status from the diablo2.io dclone API.
+        self.collectors.append(collector)
 
-        API documentation: https://diablo2.io/post2417121.html
+    @staticmethod
+    def labels(labels, extra=()):
+        """
+        Returns labels in the Prometheus text format.
 
-        :param region: region to get status for (1 for Americas, 2 for Europe, 3 for Asia, blank for all)
-        :param ladder: ladder or non-ladder (1 for Ladder, 2 for Non-Ladder, blank for all)
-        :param hardcore: hardcore or softcore (1 for Hardcore, 2 for Softcore, blank for all)
-        :return: current dclone status as json
+        :param labels: tuple of (name, value) pairs
+        :param extra: additional (name, value) pairs
+        :return: labels string including braces, empty if there are no labels
+        """
+        pairs = [*labels, *extra]
+        if not pairs:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+    def render(self):
+        """
+        Runs the collectors and returns every metric in the Prometheus text exposition format.
+
+        :return: metrics text
+        """
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as err:
+                log_event('metrics', f'[Metrics] Collector failed: {err!r}', level=logging.ERROR, error=repr(err))
+
+        samples = {}  # name -> list of sample lines
+        for (name, labels), value in (*self.counters.items(), *self.gauges.items()):
+            samples.setdefault(name, []).append(f'{name}{Metrics.labels(labels)} {value}')
+        for (name, labels), histogram in self.histograms.items():
+            lines = samples.setdefault(name, [])
+            cumulative = 0
+            for bound, bucket in zip((*self.BUCKETS, '+Inf'), histogram):
+                cumulative += bucket
+                lines.append(f'{name}_bucket{Metrics.labels(labels, (("le", bound),))} {cumulative}')
+            lines.append(f'{name}_sum{Metrics.labels(labels)} {histogram[-1]}')
+            lines.append(f'{name}_count{Metrics.labels(labels)} {cumulative}')
+
+        output = []
+        for name, lines in samples.items():
+            kind, text = self.METRICS.get(name, ('untyped', name))
+            output += [f'# HELP {name} {text}', f'# TYPE {name} {kind}', *lines]
+        return '\n'.join(output) + '\n'
+
+
+METRICS = Metrics()
+
+
+class MetricsServer:
+    """
+    Serves the metrics registry on a local HTTP endpoint for Prometheus and samples event loop lag while running.
+
+    :param metrics: Metrics registry to serve
+    :param host: address to listen on
+    :param port: port to listen on
+    :param interval: seconds between event loop lag samples
+    """
+
+    def __init__(self, metrics=METRICS, host=DCLONE_METRICS_HOST, port=DCLONE_METRICS_PORT, interval=1):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.runner = None
+        self.lag_task = None
+
+    async def start(self):
+        """
+        Starts the HTTP endpoint and the event loop lag sampler. This must be called from a running event loop. Errors are
+        logged, the bot keeps running without metrics.
         """
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
         try:
-            url = 'https://diablo2.io/dclone_api.php'
-            params = {'region': region, 'ladder': ladder, 'hc': hardcore}
-            headers = {'User-Agent': f'dclone-discord/{__version__}'}
-            response = get(url, params=params, headers=headers, timeout=10)
+            await web.TCPSite(self.runner, self.host, self.port).start()
+        except OSError as err:
+            log_event('metrics', f'[Metrics] Unable to serve metrics on {self.host}:{self.port}: {err}', level=logging.ERROR, error=repr(err))
+            return
+        self.lag_task = create_task(self.sample_lag())
+        log_event('metrics', f'[Metrics] Serving metrics on http://{self.host}:{self.port}/metrics', host=self.host, port=self.port)
 
-            response.raise_for_status()
-            return response.json()
-        except Exception as err:
-            print(f'[Diablo2IOClient.status] API Error: {err}')
-            return None
+    async def stop(self):
+        """
+        Stops the event loop lag sampler and the HTTP endpoint.
+        """
+        if self.lag_task:
+            self.lag_task.cancel()
+            await gather(self.lag_task, return_exceptions=True)
+            self.lag_task = None
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
 
-    def progress_message(self):
+    async def handle(self, _request):
         """
-        Returns a formatted message of the current dclone status by mode (region, ladder, hardcore).
+        Responds to a scrape with the current metrics.
         """
-        # get the currently reported dclone status
-        # TODO: return from current_progress instead of querying the API every time?
-        status = self.status(region=DCLONE_REGION, ladder=DCLONE_LADDER, hardcore=DCLONE_HC)
-        if not status:
-            return '[Diablo2IOClient.progress_message] API error, please try again later.'
+        return web.Response(text=self.metrics.render(), content_type='text/plain', charset='utf-8', headers={'X-Content-Type-Options': 'nosniff'})
 
-        # sort the status by mode (hardcore, ladder, region)
-        status = sorted(status, key=lambda x: (x['hc'], x['ladder'], x['region']))
+    async def sample_lag(self):
+        """
+        Measures how late the event loop wakes us up, this is the time other callbacks held the loop.
+        """
+        while True:
+            started = monotonic()
+            await sleep(self.interval)
+            self.metrics.observe('dclone_event_loop_lag_seconds', max(monotonic() - started - self.interval, 0))
 
-        # build the message
-        message = 'Current DClone Progress:\n'
-        for data in status:
-            region = data.get('region')
-            ladder = data.get('ladder')
-            hardcore = data.get('hc')
-            progress = int(data.get('progress'))
-            timestamped = int(data.get('timestamped'))
-            emoji = Diablo2IOClient.emoji(region=region, ladder=ladder, hardcore=hardcore)
 
-            message += f'- {emoji} **{REGION[region]} {LADDER[ladder]} {HC[hardcore]}** is `{progress}/6` <t:{timestamped}:R>\n'
-        message += '> Data courtesy of diablo2.io'
+class HTTPClient:
+    """
+    Asynchronous HTTP client shared by all upstream API clients.
 
-        # get planned walks from d2runewizard.com API
-        # TODO: move to D2RuneWizardClient
-        if DCLONE_D2RW_TOKEN and DCLONE_D2RW_CONTACT:
-            try:
-                url = 'https://d2runewizard.com/api/diablo-clone-progress/planned-walks'
-                params = {'token': DCLONE_D2RW_TOKEN}
-                headers = {'D2R-Contact': DCLONE_D2RW_CONTACT, 'D2R-Platform': 'Discord', 'D2R-Repo': 'https://github.com/Synse/dclone-discord'}
-                response = get(url, params=params, headers=headers, timeout=10)
-                response.raise_for_status()
-
-                # filter planned walks to configured mode and add relevant ones to the message
-                planned_walks = D2RuneWizardClient.filter_walks(response.json().get('walks'))
-                if len(planned_walks) > 0:
-                    message += '\n\nPlanned Walks:\n'
-                    for walk in planned_walks:
-                        region = walk.get('region')
-                        ladder = walk.get('ladder')
-                        hardcore = walk.get('hardcore')
-                        timestamp = int(walk.get('timestamp') / 1000)
-                        name = walk.get('displayName')
-                        emoji = D2RuneWizardClient.emoji(region=region, ladder=ladder, hardcore=hardcore)
-                        unconfirmed = ' **[UNCONFIRMED]**' if not walk.get('confirmed') else ''
-
-                        message += f'- {emoji} **{region} {LADDER_RW[ladder]} {HC_RW[hardcore]}** <t:{timestamp}:R> reported by `{name}`{unconfirmed}\n'
-                    message += '> Data courtesy of d2runewizard.com'
-            except Exception as err:
-                print(f'[ChatOp] D2RuneWizard API Error: {err}')
+    Requests go through a single pooled aiohttp session (keep-alive connections and cached DNS lookups) so a slow
+    upstream never blocks the Discord event loop. Failed, timed out and rate limited requests are retried with
+    exponential backoff and jitter, honoring Retry-After when the upstream sends one.
 
-        return message
+    Responses are fingerprinted and requests are made conditional (If-None-Match / If-Modified-Since) when the upstream
+    sends an ETag or Last-Modified header. A 304 Not Modified or a response identical to the previous one returns the
+    previously decoded object instead of decoding the body again, so callers can tell an unchanged payload by identity.
+    """
+
+    def __init__(self, timeouts=None, retries=DCLONE_HTTP_RETRIES, backoff=DCLONE_HTTP_BACKOFF):
+        self.timeouts = HTTP_TIMEOUTS if timeouts is None else timeouts
+        self.retries = retries
+        self.backoff = backoff
+        self.session = None
+        self.rate_limited_until = {}  # host -> monotonic time the upstream asked us to wait until
+        self.responses = {}  # (url, params) -> (etag, last modified, body fingerprint, decoded json) of the latest response
 
-    def should_update(self, mode):
+    async def start(self):
         """
-        For a given game mode, returns True/False if we should post an alert to Discord.
+        Creates the shared session and connection pool. This is called lazily so the session is bound to the running event loop.
+        """
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=20, limit_per_host=4, ttl_dns_cache=300, keepalive_timeout=60)
+            headers = {'User-Agent': f'dclone-discord/{__version__}'}
+            self.session = aiohttp.ClientSession(connector=connector, headers=headers)
+
+    async def close(self):
+        """
+        Closes the shared session and all pooled connections.
+        """
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
 
-        This checks for DCLONE_REPORTS number of matching progress reports which is intended to reduce trolling/false reports.
-        A larger number for DCLONE_REPORTS will alert sooner (less delay) but is more susceptible to trolling/false reports and
-        a smaller number of DCLONE_REPORTS will alert later (more delay) but is less susceptible to trolling/false reports.
+    def rate_limited_for(self, url):
+        """
+        Returns the number of seconds until the host of a given url stops rate limiting us.
 
-        Since we're checking every 60 seconds any mode with the same progress report for 60*DCLONE_REPORTS seconds
-        will also be reported as a change.
+        :param url: url being requested
+        :return: seconds remaining, 0 if the host is not rate limiting us
+        """
+        host = urlsplit(url).hostname or ''
+        return max(self.rate_limited_until.get(host, 0) - monotonic(), 0)
 
-        :param mode: game mode (region, ladder, hardcore)
-        :return: True/False if we should post an alert to Discord
+    def timeout(self, url):
         """
-        reports = self.report_cache[mode][-int(DCLONE_REPORTS):]
-        self.report_cache[mode] = reports  # truncate recent reports
+        Returns the request timeout for the host of a given url.
 
-        # if the last DCLONE_REPORTS reports agree on the progress level, we should update
-        if all(reports[0] == x for x in reports):
-            return True
+        :param url: url being requested
+        :return: aiohttp.ClientTimeout for the host
+        """
+        host = urlsplit(url).hostname or ''
+        seconds = next((value for name, value in self.timeouts.items() if host == name or host.endswith(f'.{name}')), 10)
+        return aiohttp.ClientTimeout(total=seconds)
 
-        return False
+    def retry_delay(self, attempt, retry_after=None):
+        """
+        Returns the number of seconds to wait before retrying a request.
+
+        :param attempt: number of the attempt that failed (starting at 0)
+        :param retry_after: value of the upstream Retry-After header, if any
+        :return: delay in seconds
+        """
+        try:
+            return max(float(retry_after), 0)
+        except (TypeError, ValueError):
+            delay = self.backoff * 2**attempt
+            return delay + uniform(0, delay / 2)
+
+    async def get_json(self, url, params=None, headers=None):
+        """
+        Sends a GET request and returns the decoded json response, retrying on errors.
+
+        :param url: url to request
+        :param params: query string parameters
+        :param headers: additional request headers
+        :return: decoded json response
+        :raises aiohttp.ClientError: if the request still fails after all retries
+        :raises asyncio.TimeoutError: if the request still times out after all retries
+        """
+        await self.start()
+        host = urlsplit(url).hostname or ''
+
+        # make the request conditional on the validators of the previous response, if the upstream sent any
+        key = (url, tuple(sorted((params or {}).items())))
+        etag, last_modified, fingerprint, data = self.responses.get(key, (None, None, None, None))
+        headers = dict(headers or {})
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            started = monotonic()
+            try:
+                async with self.session.get(url, params=params, headers=headers, timeout=self.timeout(url)) as response:
+                    retry_after = response.headers.get('Retry-After')
+                    if response.status == 304 and fingerprint is not None:
+                        METRICS.inc('dclone_upstream_responses_total', host=host, result='not_modified')
+                        return data
+                    response.raise_for_status()
+                    body = await response.read()
+
+                # skip decoding a body identical to the previous one
+                digest = blake2b(body, digest_size=16).digest()
+                if digest == fingerprint:
+                    METRICS.inc('dclone_upstream_responses_total', host=host, result='unchanged')
+                else:
+                    METRICS.inc('dclone_upstream_responses_total', host=host, result='changed')
+                    data = loads(body)
+                self.responses[key] = (response.headers.get('ETag'), response.headers.get('Last-Modified'), digest, data)
+                return data
+            except aiohttp.ClientResponseError as err:
+                delay = self.retry_delay(attempt, retry_after)
+                if err.status == 429:
+                    self.rate_limited_until[host] = monotonic() + delay
+
+                # client errors other than rate limiting will not succeed on a retry
+                if attempt >= self.retries or (err.status < 500 and err.status != 429):
+                    raise
+            except (aiohttp.ClientError, AsyncTimeoutError):
+                if attempt >= self.retries:
+                    raise
+                delay = self.retry_delay(attempt)
+            finally:
+                METRICS.observe('dclone_upstream_latency_seconds', monotonic() - started, host=host)
+
+            METRICS.inc('dclone_upstream_retries_total', host=host)
+            await sleep(delay)
+
+    async def send_json(self, method, url, payload, params=None):
+        """
+        Sends a json request without retrying, for callers that retry on their own (see Dispatcher).
 
+        :param method: HTTP method
+        :param url: url to request
+        :param payload: json payload
+        :param params: query string parameters
+        :return: decoded json response, None if there is no content
+        :raises aiohttp.ClientResponseError: if the response is an error
+        :raises aiohttp.ClientError: if the request failed
+        :raises asyncio.TimeoutError: if the request timed out
+        """
+        await self.start()
+        async with self.session.request(method, url, params=params, json=payload, timeout=self.timeout(url)) as response:
+            response.raise_for_status()
+            if response.status == 204:
+                return None
+            return await response.json(content_type=None)
 
-class DiscordClient(discord.Client):
+
+class Dispatcher:
     """
-    Connects to Discord and starts a background task that checks the diablo2.io dclone API every 60 seconds.
-    When a progress change occurs that is greater than or equal to DCLONE_THRESHOLD and for more than DCLONE_REPORTS
-    consecutive updates, the bot will send a message to the configured DCLONE_DISCORD_CHANNEL_ID.
+    Sends outbound messages from a bounded priority queue so a slow or rate limited send never stalls the background task.
+
+    Spawn alerts are sent before progress alerts, and progress alerts before planned walk reminders. Each channel has its
+    own rate limit and failed sends are retried with exponential backoff and jitter.
+
+    :param transport: coroutine function taking (channel_id, content) that sends a message and raises on failure
+    :param size: maximum number of queued messages
+    :param workers: number of messages sent concurrently
+    :param retries: number of retries for failed or rate limited messages
+    :param rate: maximum number of messages sent to a channel per 5 seconds
     """
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    # message priorities, lower is sent first
+    SPAWN = 0
+    PROGRESS = 1
+    WALK = 2
 
-        self.dclone = Diablo2IOClient()
-        print(f'Tracking DClone for {REGION[DCLONE_REGION]}, {LADDER[DCLONE_LADDER]}, {HC[DCLONE_HC]}')
+    def __init__(self, transport, size=DCLONE_QUEUE_SIZE, workers=DCLONE_SEND_WORKERS, retries=DCLONE_SEND_RETRIES, rate=DCLONE_CHANNEL_RATE):
+        self.transport = transport
+        self.queue = PriorityQueue(maxsize=size)
+        self.workers = workers
+        self.retries = retries
+        self.rate = max(rate, 1)
+        self.interval = 5.0 / self.rate
+        self.sequence = count()  # keeps messages with the same priority in order
+        self.tasks = []
+        self.allowed_at = {}  # channel id -> theoretical arrival time of the next message (GCRA)
+        self.latencies = deque(maxlen=1000)  # seconds between enqueueing and sending recent messages
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
 
-        # DCLONE_D2RW_TOKEN and DCLONE_D2RW_CONTACT are required for planned walk notifications
-        if not DCLONE_D2RW_TOKEN or not DCLONE_D2RW_CONTACT:
-            print('WARNING: DCLONE_D2RW_TOKEN or DCLONE_D2RW_CONTACT are not set (or are incorrect), you will not receive planned walk notifications.')
+    def start(self):
+        """
+        Starts the workers. This must be called from a running event loop.
+        """
+        if not self.tasks:
+            self.tasks = [create_task(self._worker()) for _ in range(self.workers)]
 
-    async def on_ready(self):
+    async def stop(self, timeout=5):
         """
-        Runs when the bot is connected to Discord and ready to receive messages. This starts our background task.
+        Waits up to `timeout` seconds for queued messages to be sent and stops the workers.
+
+        :param timeout: seconds to wait for the queue to drain
         """
-        # pylint: disable=no-member
-        print(f'Bot logged into Discord as "{self.user}"')
-        servers = sorted([g.name for g in self.guilds])
-        print(f'Connected to {len(servers)} servers: {", ".join(servers)}')
+        if self.tasks:
+            try:
+                await wait_for(self.queue.join(), timeout)
+            except AsyncTimeoutError:
+                dropped = self.queue.qsize()
+                log_event('dispatcher', f'[Dispatcher] Dropping {dropped} queued messages on shutdown', level=logging.WARNING, dropped=dropped)
 
-        # channel details
-        channel = self.get_channel(int(DCLONE_DISCORD_CHANNEL_ID))
-        if not channel:
-            print('ERROR: Unable to access channel, please check DCLONE_DISCORD_CHANNEL_ID')
-            await self.close()
-            return
-        print(f'Messages will be sent to #{channel.name} on the {channel.guild.name} server')
+        for task in self.tasks:
+            task.cancel()
+        await gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
 
-        # start the background task to monitor dclone status
+    def enqueue(self, channel_id, content, priority=PROGRESS):
+        """
+        Queues a message to be sent, this never blocks.
+
+        :param channel_id: Discord channel id
+        :param content: message to send
+        :param priority: Dispatcher.SPAWN, Dispatcher.PROGRESS or Dispatcher.WALK
+        :return: True/False if the message was queued
+        """
         try:
-            self.check_dclone_status.start()
-        except RuntimeError as err:
-            print(f'Background Task Error: {err}')
+            self.queue.put_nowait((priority, next(self.sequence), monotonic(), channel_id, content))
+            return True
+        except QueueFull:
+            self.dropped += 1
+            METRICS.inc('dclone_messages_total', result='dropped')
+            log_event('dispatcher', f'[Dispatcher] Queue full, dropping message to channel {channel_id}', level=logging.WARNING, channel_id=channel_id)
+            return False
 
-    async def on_message(self, message):
+    def stats(self):
         """
-        This is called any time the bot receives a message. It implements the dclone chatop.
+        Returns queue depth, message counters and send latency percentiles (in milliseconds) for recent messages.
         """
-        if message.content.startswith('.dclone') or message.content.startswith('!dclone'):
-            print(f'Responding to dclone chatop from {message.author}')
-            current_status = self.dclone.progress_message()
+        latencies = sorted(self.latencies) or [0.0]
+        return {
+            'depth': self.queue.qsize(),
+            'sent': self.sent,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'latency_p50': round(latencies[len(latencies) // 2] * 1000, 1),
+            'latency_p95': round(latencies[int((len(latencies) - 1) * 0.95)] * 1000, 1),
+            'latency_max': round(latencies[-1] * 1000, 1),
+        }
 
-            channel = self.get_channel(message.channel.id)
-            await channel.send(current_status)
+    def reserve(self, channel_id):
+        """
+        Reserves the next send slot for a channel and returns how many seconds to wait for it. Up to `rate` messages can be
+        sent in a burst, after that messages are spaced evenly.
 
-    @tasks.loop(seconds=60)
-    async def check_dclone_status(self):
+        :param channel_id: Discord channel id
+        :return: seconds to wait before sending
+        """
+        now = monotonic()
+        allowed_at = max(self.allowed_at.get(channel_id, now), now)
+        self.allowed_at[channel_id] = allowed_at + self.interval
+        return max(allowed_at - now - (self.rate - 1) * self.interval, 0)
+
+    @staticmethod
+    def retryable(err):
         """
-        Background task that checks dclone status via the diablo2.io dclone public API every 60 seconds.
+        Returns True/False if a failed send should be retried. Rate limits, server errors and connection errors are retried.
 
-        Status changes are compared to the last known status and a message is sent to Discord if the status changed.
+        :param err: exception raised by the transport
+        :return: True/False if the send should be retried
         """
-        # print('>> Checking DClone Status...')
-        status = self.dclone.status(region=DCLONE_REGION, ladder=DCLONE_LADDER, hardcore=DCLONE_HC)
-        if not status:
+        if isinstance(err, LookupError):
+            return False
+
+        status = getattr(err, 'status', None)
+        return status is None or status == 429 or status >= 500
+
+    async def _send(self, channel_id, content):
+        for attempt in range(self.retries + 1):
+            await sleep(self.reserve(channel_id))
+            started = monotonic()
+            try:
+                await self.transport(channel_id, content)
+                return True
+            except Exception as err:
+                if attempt >= self.retries or not Dispatcher.retryable(err):
+                    log_event(
+                        'dispatcher',
+                        f'[Dispatcher] Unable to send message to channel {channel_id}: {err!r}',
+                        level=logging.ERROR,
+                        channel_id=channel_id,
+                        error=repr(err),
+                    )
+                    return False
+
+                # honor the rate limit if there is one, otherwise back off
+                delay = getattr(err, 'retry_after', None) or DCLONE_HTTP_BACKOFF * 2**attempt
+            finally:
+                METRICS.observe('dclone_discord_send_seconds', monotonic() - started)
+
+            await sleep(delay + uniform(0, delay / 2))
+        return False
+
+    async def _worker(self):
+        while True:
+            _, _, queued, channel_id, content = await self.queue.get()
+            try:
+                if await self._send(channel_id, content):
+                    self.sent += 1
+                    self.latencies.append(monotonic() - queued)
+                    METRICS.inc('dclone_messages_total', result='sent')
+                else:
+                    self.failed += 1
+                    METRICS.inc('dclone_messages_total', result='failed')
+            finally:
+                self.queue.task_done()
+
+            if self.queue.empty():
+                stats = self.stats()
+                log_event('dispatcher', f'[Dispatcher] Queue drained: {", ".join(f"{key}={value}" for key, value in stats.items())}',
+                          level=logging.DEBUG, **stats)
+
+
+class AlertBundler:
+    """
+    Collects the alerts for each channel from one poll (or DCLONE_BUNDLE_WINDOW seconds) and queues them as a single
+    message per channel, so modes that move together don't hit Discord's per-channel rate limits. Bundles are only
+    split when they would be longer than Discord's message length limit.
+
+    :param dispatcher: Dispatcher to queue bundled messages with
+    :param window: seconds to collect alerts for, 0 to send when the poll finishes
+    """
+
+    def __init__(self, dispatcher, window=DCLONE_BUNDLE_WINDOW):
+        self.dispatcher = dispatcher
+        self.window = window
+        self.pending = {}  # channel id -> list of (priority, sequence, line, source)
+        self.sequence = count()
+        self.timer = None
+
+    def add(self, channel_id, line, priority=Dispatcher.PROGRESS, source='diablo2.io'):
+        """
+        Adds an alert to the pending bundle for a channel.
+
+        :param channel_id: Discord channel id
+        :param line: alert text, without the data source footer
+        :param priority: Dispatcher.SPAWN, Dispatcher.PROGRESS or Dispatcher.WALK
+        :param source: data source credited in the footer
+        """
+        self.pending.setdefault(channel_id, []).append((priority, next(self.sequence), line, source))
+
+    def poll_finished(self):
+        """
+        Called when a poll (or a reminder timer) has finished adding alerts. Sends the pending bundles now, or starts the
+        bundle window timer.
+        """
+        if not self.pending:
             return
 
-        # loop through each region and check for progress changes
-        for data in status:
-            region = data.get('region')
-            ladder = data.get('ladder')
-            hardcore = data.get('hc')
-            progress = int(data.get('progress'))
-            reporter_id = data.get('reporter_id')
-            timestamped = int(data.get('timestamped'))
-            emoji = Diablo2IOClient.emoji(region=region, ladder=ladder, hardcore=hardcore)
+        if self.window <= 0:
+            self.flush()
+        elif self.timer is None:
+            self.timer = get_running_loop().call_later(self.window, self.flush)
 
-            progress_was = self.dclone.current_progress.get((region, ladder, hardcore))
+    def flush(self):
+        """
+        Queues one message (or more if it's too long) per channel for all pending alerts.
+        """
+        pending, self.pending = self.pending, {}
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
 
-            # add the most recent report
-            self.dclone.report_cache[(region, ladder, hardcore)].append(progress)
+        for channel_id, alerts in pending.items():
+            for priority, message in AlertBundler.render(alerts):
+                self.dispatcher.enqueue(channel_id, message, priority=priority)
 
-            # handle progress changes
-            # TODO: bundle multiple changes into one message?
-            if int(progress) >= int(DCLONE_THRESHOLD) and progress > progress_was and self.dclone.should_update((region, ladder, hardcore)):
-                print(f'{REGION[region]} {LADDER[ladder]} {HC[hardcore]} is now {progress}/6 (was {progress_was}/6) (reporter_id: {reporter_id})')
+    @staticmethod
+    def render(alerts):
+        """
+        Renders alerts into as few messages as possible, most urgent alerts first, each crediting its data sources.
 
-                # post to discord
-                message = f'[{progress}/6] {emoji} **{REGION[region]} {LADDER[ladder]} {HC[hardcore]}** DClone progressed (reporter_id: {reporter_id})'
-                message += '\n> Data courtesy of diablo2.io'
+        :param alerts: list of (priority, sequence, line, source) tuples
+        :return: list of (priority, message) tuples
+        """
+        messages = []
+        bundle = []  # (priority, line, source) of the message being built
 
-                channel = self.get_channel(int(DCLONE_DISCORD_CHANNEL_ID))
-                await channel.send(message)
+        def render_bundle():
+            sources = list(dict.fromkeys(source for _, _, source in bundle))
+            return '\n'.join([line for _, line, _ in bundle] + [f'> Data courtesy of {source}' for source in sources])
 
-                # update current status
-                self.dclone.current_progress[(region, ladder, hardcore)] = progress
-            elif progress < progress_was and self.dclone.should_update((region, ladder, hardcore)):
-                # progress increases are interesting, but we also need to reset to 1 after dclone spawns
-                # and to roll it back if the new confirmed progress is less than the current progress
-                print(f'[RollBack] {REGION[region]} {LADDER[ladder]} {HC[hardcore]} rolling back to {progress} (reporter_id: {reporter_id})')
+        # alerts are sorted by priority so the first alert in each message is the most urgent
+        for priority, _, line, source in sorted(alerts):
+            if bundle and len(render_bundle()) + len(line) + len(f'\n\n> Data courtesy of {source}') > MESSAGE_LIMIT:
+                messages.append((bundle[0][0], render_bundle()))
+                bundle = []
+            bundle.append((priority, line, source))
 
-                # if we believe dclone spawned, post to discord
-                if progress == 1:
-                    message = ':japanese_ogre: :japanese_ogre: :japanese_ogre: '
-                    message += f'[{progress}/6] **{REGION[region]} {LADDER[ladder]} {HC[hardcore]}** DClone may have spawned (reporter_id: {reporter_id})'
-                    message += '\n> Data courtesy of diablo2.io'
+        if bundle:
+            messages.append((bundle[0][0], render_bundle()))
+        return messages
 
-                    channel = self.get_channel(int(DCLONE_DISCORD_CHANNEL_ID))
-                    await channel.send(message)
 
-                # update current status
-                self.dclone.current_progress[(region, ladder, hardcore)] = progress
-            elif progress != progress_was:
-                # track suspicious progress changes, these are not sent to discord
-                report_timestamp = datetime.fromtimestamp(timestamped).strftime('%Y-%m-%d %H:%M:%S')
-                print(
-                    f'[Suspicious] {REGION[region]} {LADDER[ladder]} {HC[hardcore]} reported as {progress}/6 '
-                    + f'(currently {progress_was}/6) (reporter_id: {reporter_id}) at {report_timestamp}'
-                )
+class StatusBoard:
+    """
+    Keeps one pinned message per channel up to date with the current progress by editing it in place. Edits are skipped
+    when the content hasn't changed and are limited to `max_edits` per channel per minute.
 
-        # check for upcoming walks using the D2RuneWizard API
-        if DCLONE_D2RW_TOKEN and DCLONE_D2RW_CONTACT:
-            try:
-                url = 'https://d2runewizard.com/api/diablo-clone-progress/planned-walks'
-                params = {'token': DCLONE_D2RW_TOKEN}
-                headers = {'D2R-Contact': DCLONE_D2RW_CONTACT, 'D2R-Platform': 'Discord', 'D2R-Repo': 'https://github.com/Synse/dclone-discord'}
-                response = get(url, params=params, headers=headers, timeout=10)
-                response.raise_for_status()
-
-                walks = D2RuneWizardClient.filter_walks(response.json().get('walks'))
-                for walk in walks:
-                    walk_id = walk.get('id')
-                    timestamp = int(walk.get('timestamp') / 1000)
-                    walk_in_mins = int(int(timestamp - time()) / 60)
-
-                    # for walks in the next hour, send an alert if we have not already sent one
-                    if walk_in_mins <= 60 and walk_id not in self.dclone.alerted_walks:
-                        region = walk.get('region')
-                        ladder = walk.get('ladder')
-                        hardcore = walk.get('hardcore')
-                        name = walk.get('displayName')
-                        emoji = D2RuneWizardClient.emoji(region=region, ladder=ladder, hardcore=hardcore)
-                        unconfirmed = ' [UNCONFIRMED]' if walk.get('unconfirmed') else ''
-
-                        # post to discord
-                        print(f'[PlannedWalk] {region} {LADDER_RW[ladder]} {HC_RW[hardcore]} reported by {name} in {walk_in_mins}m {unconfirmed}')
-                        message = f'{emoji} Upcoming walk for **{region} {LADDER_RW[ladder]} {HC_RW[hardcore]}** '
-                        message += f'starts at <t:{timestamp}:f> (reported by `{name}`){unconfirmed}'
-                        message += '\n> Data courtesy of d2runewizard.com'
-
-                        channel = self.get_channel(int(DCLONE_DISCORD_CHANNEL_ID))
-                        await channel.send(message)
-
-                        self.dclone.alerted_walks.append(walk_id)
-            except Exception as err:
-                print(f'[PlannedWalk] D2RuneWizard API Error: {err}')
+    :param transport: object with `post_board(channel_id, content)` returning a message id and `edit_board(channel_id, message_id, content)` coroutines
+    :param max_edits: maximum number of edits per channel per minute
+    """
 
-    @check_dclone_status.before_loop
-    async def before_check_dclone_status(self):
+    def __init__(self, transport, max_edits=DCLONE_BOARD_EDITS):
+        self.transport = transport
+        self.max_edits = max(max_edits, 1)
+        self.messages = {}  # channel id -> board message id
+        self.digests = {}  # channel id -> digest of the board content
+        self.edits = {}  # channel id -> times of recent edits
+        self.updated = 0
+        self.skipped = 0
+
+    async def update(self, channel_id, content):
         """
-        Runs before the background task starts. This waits for the bot to connect to Discord and sets the initial dclone status.
+        Updates the board for a channel, posting and pinning it if the channel doesn't have one yet.
+
+        :param channel_id: Discord channel id
+        :param content: board content
+        :return: True/False if the board was updated
         """
-        await self.wait_until_ready()  # wait until the bot logs in
+        digest = blake2b(content.encode(), digest_size=16).digest()
+        if self.digests.get(channel_id) == digest:
+            self.skipped += 1
+            return False
 
-        # get the current progress from the dclone API
-        status = self.dclone.status(region=DCLONE_REGION, ladder=DCLONE_LADDER, hardcore=DCLONE_HC)
+        # over the edit limit, the change will be picked up by a later update
+        edits = self.edits.setdefault(channel_id, deque(maxlen=self.max_edits))
+        if len(edits) == self.max_edits and monotonic() - edits[0] < 60:
+            return False
 
-        if not status:
-            print('Unable to set the current progress at startup')
-            return
+        try:
+            if channel_id in self.messages:
+                await self.transport.edit_board(channel_id, self.messages[channel_id], content)
+            else:
+                self.messages[channel_id] = await self.transport.post_board(channel_id, content)
+        except Exception as err:
+            log_event(
+                'board',
+                f'[StatusBoard] Unable to update status board in channel {channel_id}: {err!r}',
+                level=logging.WARNING,
+                channel_id=channel_id,
+                error=repr(err),
+            )
 
-        # set the current status and populate the report cache with this value
-        # this prevents a duplicate message from being sent when the bot starts
-        # we are assuming the report at startup is correct (not a troll/false report)
-        # but this should be fine most of the time
-        for data in status:
-            region = data.get('region')
-            ladder = data.get('ladder')
-            hardcore = data.get('hc')
-            progress = int(data.get('progress'))
-            reporter_id = data.get('reporter_id')
+            # the board was deleted, post a new one next time
+            if getattr(err, 'status', None) == 404:
+                self.messages.pop(channel_id, None)
+            return False
 
-            # set current progress and report
-            self.dclone.current_progress[(region, ladder, hardcore)] = progress
-            if progress != 1:
-                print(f'Progress for {REGION[region]} {LADDER[ladder]} {HC[hardcore]} starting at {progress}/6 (reporter_id: {reporter_id})')
+        edits.append(monotonic())
+        self.digests[channel_id] = digest
+        self.updated += 1
+        return True
 
-            # populate the report cache with DCLONE_REPORTS number of reports at this progress
-            for _ in range(0, int(DCLONE_REPORTS)):
-                self.dclone.report_cache[(region, ladder, hardcore)].append(progress)
 
+class PollScheduler:
+    """
+    Picks the interval between polls from the highest tracked progress level. Modes close to spawning are polled quickly
+    so alerts go out sooner, and quiet periods are polled slowly to save upstream requests.
 
-if __name__ == '__main__':
-    client = DiscordClient(intents=discord.Intents.default())
-    client.run(DCLONE_DISCORD_TOKEN)
+    :param floor: fastest polling interval in seconds
+    :param ceiling: slowest polling interval in seconds
+    """
+
+    # position between the floor (0.0) and ceiling (1.0) for each progress level
+    LEVELS = {1: 1.0, 2: 1.0, 3: 0.5, 4: 0.0, 5: 0.0, 6: 0.0}
+
+    def __init__(self, floor=DCLONE_POLL_MIN, ceiling=DCLONE_POLL_MAX):
+        self.floor = min(floor, ceiling)
+        self.ceiling = max(floor, ceiling)
+
+    def interval(self, progress, rate_limited_for=0):
+        """
+        Returns the number of seconds to wait before the next poll.
+
+        :param progress: highest tracked progress level across all modes
+        :param rate_limited_for: seconds the upstream asked us to wait, never poll sooner than this
+        :return: polling interval in seconds
+        """
+        position = PollScheduler.LEVELS.get(progress, 1.0)
+        interval = self.floor + (self.ceiling - self.floor) * position
+        return max(round(interval), rate_limited_for)
+
+
+class SnapshotCache:
+    """
+    Caches the latest upstream snapshot (dclone status and planned walks) for the background task and the chatop.
+
+    The background task refreshes the snapshot every time it polls, so the chatop is usually served from memory. Concurrent
+    refreshes share a single in-flight fetch and rendered messages are memoized per snapshot version.
+
+    :param fetch: coroutine function returning a (status, walks) tuple
+    :param ttl: seconds a snapshot is considered fresh
+    """
+
+    def __init__(self, fetch, ttl=DCLONE_CACHE_TTL):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.snapshot = None
+        self.version = 0
+        self.updated = 0
+        self.pending = None
+        self.rendered = {}
+        self.epoch = None
+
+    def put(self, status, walks):
+        """
+        Stores a new snapshot and invalidates memoized messages, unless the snapshot is unchanged.
+
+        :param status: dclone status from the diablo2.io API
+        :param walks: planned walks from the d2runewizard.com API
+        """
+        self.updated = monotonic()
+        if self.snapshot == (status, walks):
+            return
+
+        self.snapshot = (status, walks)
+        self.version += 1
+        self.rendered = {}
+
+    async def _refresh(self):
+        try:
+            status, walks = await self.fetch()
+
+            if status:
+                self.put(status, walks)
+            return status, walks
+        finally:
+            self.pending = None
+
+    async def refresh(self):
+        """
+        Fetches a new snapshot, joining the in-flight fetch if there is one.
+
+        :return: (status, walks) tuple, status is None if the API failed
+        """
+        if self.pending is None:
+            self.pending = create_task(self._refresh())
+        else:
+            METRICS.inc('dclone_cache_requests_total', result='coalesced')
+
+        # shield the shared fetch so one cancelled caller doesn't cancel it for everyone else
+        return await shield(self.pending)
+
+    async def get(self):
+        """
+        Returns the cached snapshot if it is fresh, otherwise fetches a new one.
+
+        :return: (status, walks) tuple, status is None if the API failed and nothing is cached
+        """
+        if self.snapshot is not None and monotonic() - self.updated < self.ttl:
+            METRICS.inc('dclone_cache_requests_total', result='hit')
+            return self.snapshot
+
+        METRICS.inc('dclone_cache_requests_total', result='miss')
+        status, walks = await self.refresh()
+
+        # keep serving the previous snapshot if the status API failed
+        if not status and self.snapshot is not None:
+            return self.snapshot
+        return status, walks
+
+    async def render(self, renderer, key=None, epoch=None):
+        """
+        Renders the current snapshot, reusing the previous result if the snapshot has not changed.
+
+        :param renderer: function taking (status, walks) and returning a message
+        :param key: identifies the renderer, defaults to the renderer itself
+        :param epoch: identifies inputs of the renderer that change without the snapshot changing (such as the current
+                      minute), memoized messages from other epochs are dropped when it changes
+        :return: rendered message
+        """
+        status, walks = await self.get()
+        if status is None:
+            return renderer(status, walks)
+
+        if epoch != self.epoch:
+            self.epoch = epoch
+            self.rendered = {}
+
+        memo_key = (self.version, renderer if key is None else key)
+        if memo_key not in self.rendered:
+            self.rendered[memo_key] = renderer(status, walks)
+        return self.rendered[memo_key]
+
+
+def matches_mode(mode_filter, mode):
+    """
+    Returns True if a game mode matches a (region, ladder, hardcore) filter, blank filter values match anything.
+
+    :param mode_filter: (region, ladder, hardcore) filter
+    :param mode: game mode (region, ladder, hardcore)
+    :return: True/False if the mode matches the filter
+    """
+    return all(value in ('', mode_value) for value, mode_value in zip(mode_filter, mode))
+
+
+class ModeState:
+    """
+    Confirmed progress and recent progress reports for every game mode.
+
+    Modes are stored as integer indexes into MODES and each mode's recent reports are kept in a fixed-size ring buffer.
+    Mode labels and emoji are computed once for every mode, and both the diablo2.io encoding ('1'/'2' strings) and the
+    d2runewizard.com encoding (region names and booleans) of a mode map to the same index.
+
+    The background task records a fingerprint of the last report it processed for each mode and whether the mode is still
+    settling (an unconfirmed report, a subscription waiting out its consensus window or an unresolved reporter claim).
+    Settled modes whose report did not change since the previous poll are skipped.
+
+    :param history: number of recent reports kept for each mode
+    """
+
+    # (region, ladder, hardcore) in either API's encoding -> mode index
+    INDEX = {
+        **{mode: index for index, mode in enumerate(MODES)},
+        **{(REGION[region], ladder == '1', hardcore == '1'): index for index, (region, ladder, hardcore) in enumerate(MODES)},
+    }
+    LABELS = tuple(f'{REGION[region]} {LADDER[ladder]} {HC[hardcore]}' for region, ladder, hardcore in MODES)
+    EMOJI = tuple(f'{REGION_EMOJI[region]} {LADDER_EMOJI[ladder]} {HC_EMOJI[hardcore]}' for region, ladder, hardcore in MODES)
+
+    def __init__(self, history=16):
+        self.progress = [1] * len(MODES)  # confirmed progress for each mode
+        self.reports = [deque([(0, 1, None)], maxlen=history) for _ in MODES]  # recent (observed, progress, reporter id) reports
+        self.fingerprints = [None] * len(MODES)  # fingerprint of the last processed report for each mode
+        self.settling = [True] * len(MODES)  # True if a mode must be processed again even if its report is unchanged
+
+    def changed(self, index, fingerprint):
+        """
+        Records the fingerprint of a mode's latest report and returns True/False if the mode needs to be processed.
+
+        :param index: mode index
+        :param fingerprint: hashable fingerprint of the mode's latest report
+        :return: True if the report changed or the mode is still settling
+        """
+        if fingerprint == self.fingerprints[index] and not self.settling[index]:
+            return False
+
+        self.fingerprints[index] = fingerprint
+        return True
+
+    @staticmethod
+    def index(region, ladder, hardcore):
+        """
+        Returns the index of a game mode in either API's encoding.
+
+        :param region: 1/2/3 or Americas/Europe/Asia
+        :param ladder: 1/2 or True/False
+        :param hardcore: 1/2 or True/False
+        :return: mode index, None for unknown modes
+        """
+        return ModeState.INDEX.get((region, ladder, hardcore))
+
+    def restore(self, index, reports):
+        """
+        Replaces the recent reports of a mode, keeping the newest reports that fit in the ring buffer.
+
+        :param index: mode index
+        :param reports: list of (observed, progress, reporter id) reports, oldest first
+        """
+        self.reports[index].clear()
+        self.reports[index].extend(reports)
+
+
+class Subscription:
+    """
+    A Discord channel subscribed to alerts for a set of modes, with its own alert threshold and consensus window.
+
+    :param channel_id: Discord channel id to send alerts to
+    :param region: 1 for Americas, 2 for Europe, 3 for Asia, blank for all
+    :param ladder: 1 for Ladder, 2 for Non-Ladder, blank for all
+    :param hardcore: 1 for Hardcore, 2 for Softcore, blank for all
+    :param threshold: progress level to alert at (and above)
+    :param window: seconds a progress level must be reported for before alerting
+    :param board: True to keep a pinned status board up to date instead of posting progress alerts
+    :param webhook: Discord webhook url to send alerts to with webhook delivery
+    """
+
+    def __init__(
+        self, channel_id, region='', ladder='', hardcore='', threshold=DCLONE_THRESHOLD, window=DCLONE_CONSENSUS_WINDOW, board=DCLONE_STATUS_BOARD, webhook=''
+    ):
+        if region not in REGION or ladder not in LADDER or hardcore not in HC:
+            raise ValueError(f'Invalid mode filter for channel {channel_id}: region={region!r}, ladder={ladder!r}, hc={hardcore!r}')
+
+        self.channel_id = int(channel_id)
+        self.filter = (region, ladder, hardcore)
+        self.threshold = int(threshold)
+        self.window = float(window)
+        self.board = bool(board)
+        self.webhook = webhook
+        self.modes = [index for index, mode in enumerate(MODES) if matches_mode(self.filter, mode)]
+
+        # Current progress (last alerted) for each subscribed mode index
+        self.current_progress = {index: 1 for index in self.modes}
+
+    @property
+    def key(self):
+        """
+        Identifies the subscription across restarts.
+        """
+        return f'{self.channel_id}:{",".join(self.filter)}'
+
+    def __str__(self):
+        region, ladder, hardcore = self.filter
+        return f'{REGION[region]}, {LADDER[ladder]}, {HC[hardcore]}'
+
+    @staticmethod
+    def webhook_id(url):
+        """
+        Returns the id of a Discord webhook, used as the channel id of subscriptions that only have a webhook url.
+
+        :param url: webhook url (https://discord.com/api/webhooks/<id>/<token>)
+        :return: webhook id
+        :raises ValueError: if the url is not a webhook url
+        """
+        found = match(r'^https?://[^/]+/api(?:/v\d+)?/webhooks/(\d+)/[^/?]+$', url or '')
+        if not found:
+            raise ValueError('Invalid Discord webhook url, expected https://discord.com/api/webhooks/<id>/<token>')
+        return int(found.group(1))
+
+    @staticmethod
+    def from_config():
+        """
+        Returns the list of subscriptions from DCLONE_SUBSCRIPTIONS, or a single subscription from the legacy
+        DCLONE_DISCORD_CHANNEL_ID, DCLONE_REGION, DCLONE_LADDER and DCLONE_HC configuration if it is not set.
+
+        :return: list of subscriptions
+        :raises ValueError: if DCLONE_SUBSCRIPTIONS is not valid
+        """
+        if not DCLONE_SUBSCRIPTIONS:
+            channel_id = DCLONE_DISCORD_CHANNEL_ID or Subscription.webhook_id(DCLONE_DISCORD_WEBHOOK)
+            return [Subscription(channel_id, region=DCLONE_REGION, ladder=DCLONE_LADDER, hardcore=DCLONE_HC, webhook=DCLONE_DISCORD_WEBHOOK)]
+
+        try:
+            if DCLONE_SUBSCRIPTIONS.lstrip().startswith('['):
+                config = loads(DCLONE_SUBSCRIPTIONS)
+            else:
+                with open(DCLONE_SUBSCRIPTIONS, encoding='utf-8') as subscriptions_file:
+                    config = load(subscriptions_file)
+
+            subscriptions = []
+            for entry in config:
+                reports = int(entry.get('reports', DCLONE_REPORTS))
+                webhook = entry.get('webhook', '')
+                subscriptions.append(
+                    Subscription(
+                        entry['channel_id'] if 'channel_id' in entry or not webhook else Subscription.webhook_id(webhook),
+                        region=str(entry.get('region', DCLONE_REGION)),
+                        ladder=str(entry.get('ladder', DCLONE_LADDER)),
+                        hardcore=str(entry.get('hc', DCLONE_HC)),
+                        threshold=entry.get('threshold', DCLONE_THRESHOLD),
+                        window=entry.get('window', max(reports - 1, 0) * 60 if 'reports' in entry else DCLONE_CONSENSUS_WINDOW),
+                        board=entry.get('board', DCLONE_STATUS_BOARD),
+                        webhook=webhook,
+                    )
+                )
+            return subscriptions
+        except (OSError, JSONDecodeError, KeyError, TypeError, AttributeError) as err:
+            raise ValueError(f'Invalid DCLONE_SUBSCRIPTIONS: {err!r}') from err
+
+
+class SubscriptionIndex:
+    """
+    Precomputed lookups from game modes and channels to subscriptions, so dispatching an alert only touches the
+    subscriptions that match it.
+
+    :param subscriptions: list of subscriptions
+    """
+
+    def __init__(self, subscriptions):
+        self.subscriptions = list(subscriptions)
+        self.by_mode = [[] for _ in MODES]  # mode index -> subscriptions
+        self.by_channel = {}
+        self.by_tbd_walk = {}  # (ladder, hardcore) -> subscriptions to any region
+        self.boards = {}  # channel id -> subscription, for channels with a status board
+
+        for subscription in self.subscriptions:
+            self.by_channel.setdefault(subscription.channel_id, subscription)
+            if subscription.board:
+                self.boards.setdefault(subscription.channel_id, subscription)
+            for index in subscription.modes:
+                self.by_mode[index].append(subscription)
+
+        # region TBD walks go to every region
+        for (_, ladder, hardcore), subscriptions in zip(MODES, self.by_mode):
+            tbd = self.by_tbd_walk.setdefault((ladder == '1', hardcore == '1'), [])
+            tbd.extend(subscription for subscription in subscriptions if subscription not in tbd)
+
+    def __len__(self):
+        return len(self.subscriptions)
+
+    def matching(self, index):
+        """
+        Returns the subscriptions for a given game mode.
+
+        :param index: mode index
+        :return: list of subscriptions
+        """
+        return self.by_mode[index]
+
+    def matching_walk(self, walk):
+        """
+        Returns the subscriptions for a given planned walk.
+
+        :param walk: planned walk from the d2runewizard.com API
+        :return: list of subscriptions
+        """
+        ladder, hardcore = bool(walk.get('ladder')), bool(walk.get('hardcore'))
+        if walk.get('region') == 'TBD':
+            return self.by_tbd_walk[(ladder, hardcore)]
+
+        index = ModeState.index(walk.get('region'), ladder, hardcore)
+        return [] if index is None else self.by_mode[index]
+
+    def max_window(self):
+        """
+        Returns the longest consensus window of any subscription.
+        """
+        return max([subscription.window for subscription in self.subscriptions] + [DCLONE_CONSENSUS_WINDOW])
+
+
+class D2RuneWizardClient:
+    """
+    Interacts with the d2runewizard.com API to get planned walks and dclone progress.
+    """
+
+    WALKS_URL = 'https://d2runewizard.com/api/diablo-clone-progress/planned-walks'
+    PROGRESS_URL = 'https://d2runewizard.com/api/diablo-clone-progress/all'
+
+    def __init__(self, http):
+        self.http = http
+
+    @staticmethod
+    def emoji(region='', ladder='', hardcore=''):
+        """
+        Returns a string of Discord emoji for a given mode.
+
+        :param region: region to get emoji for
+        :param ladder: ladder to get emoji for
+        :param hardcore: hardcore to get emoji for
+        :return: string of Discord emoji
+        """
+        region = REGION_EMOJI.get(REGION_RW.get(region, region), region)
+        if isinstance(ladder, bool):
+            ladder = LADDER_EMOJI['1' if ladder else '2']
+        if isinstance(hardcore, bool):
+            hardcore = HC_EMOJI['1' if hardcore else '2']
+
+        return f'{region} {ladder} {hardcore}'
+
+    @staticmethod
+    def filter_walks(walks, region=DCLONE_REGION, ladder=DCLONE_LADDER, hardcore=DCLONE_HC):
+        """
+        Returns a filtered list of walks based on a mode (region, ladder, hardcore). Region TBD walks are always included.
+
+        :param walks: list of walks
+        :param region: 1 for Americas, 2 for Europe, 3 for Asia, blank for all
+        :param ladder: 1 for Ladder, 2 for Non-Ladder, blank for all
+        :param hardcore: 1 for Hardcore, 2 for Softcore, blank for all
+        :return: list of walks filtered to the mode
+        """
+        # skip malformed walks, the walk tracker logs them
+        walks = [walk for walk in walks if isinstance(walk, dict) and isinstance(walk.get('timestamp'), (int, float))]
+
+        # filter walks to region, include any region TBD walks
+        if region in ('1', '2', '3'):
+            walks = [walk for walk in walks if walk.get('region') == REGION[region] or walk.get('region') == 'TBD']
+
+        # filter walks to ladder/non-ladder
+        if ladder == '1':
+            walks = [walk for walk in walks if walk.get('ladder')]
+        elif ladder == '2':
+            walks = [walk for walk in walks if not walk.get('ladder')]
+
+        # filter walks to hardcore/softcore
+        if hardcore == '1':
+            walks = [walk for walk in walks if walk.get('hardcore')]
+        elif hardcore == '2':
+            walks = [walk for walk in walks if not walk.get('hardcore')]
+
+        return walks
+
+    async def planned_walks(self):
+        """
+        Get upcoming planned walks for all modes from the d2runewizard.com API.
+
+        :return: list of planned walks, or None if the API is not configured or returned an error
+        """
+        if not DCLONE_D2RW_TOKEN or not DCLONE_D2RW_CONTACT:
+            return None
+
+        try:
+            params = {'token': DCLONE_D2RW_TOKEN}
+            headers = {'D2R-Contact': DCLONE_D2RW_CONTACT, 'D2R-Platform': 'Discord', 'D2R-Repo': 'https://github.com/Synse/dclone-discord'}
+            response = await self.http.get_json(self.WALKS_URL, params=params, headers=headers)
+
+            return response.get('walks')
+        except Exception as err:
+            log_event('upstream', f'[D2RuneWizardClient.planned_walks] API Error: {err!r}', level=logging.ERROR, source='d2runewizard.com', error=repr(err))
+            METRICS.inc('dclone_upstream_errors_total', source='d2runewizard.com')
+            return None
+
+    async def progress(self):
+        """
+        Get the current dclone progress for all modes from the d2runewizard.com API.
+
+        :return: current dclone status in the diablo2.io API format, or None if the API is not configured or returned an error
+        """
+        if not DCLONE_D2RW_TOKEN or not DCLONE_D2RW_CONTACT:
+            return None
+
+        try:
+            params = {'token': DCLONE_D2RW_TOKEN}
+            headers = {'D2R-Contact': DCLONE_D2RW_CONTACT, 'D2R-Platform': 'Discord', 'D2R-Repo': 'https://github.com/Synse/dclone-discord'}
+            response = await self.http.get_json(self.PROGRESS_URL, params=params, headers=headers)
+
+            return D2RuneWizardClient.normalize_progress(response.get('servers') or [])
+        except Exception as err:
+            log_event('upstream', f'[D2RuneWizardClient.progress] API Error: {err!r}', level=logging.ERROR, source='d2runewizard.com', error=repr(err))
+            METRICS.inc('dclone_upstream_errors_total', source='d2runewizard.com')
+            return None
+
+    @staticmethod
+    def normalize_progress(servers):
+        """
+        Converts progress entries from the d2runewizard.com API to the diablo2.io API format.
+
+        d2runewizard.com names each mode with a server key such as `nonLadderSoftcoreEurope`, entries for unknown servers
+        or without an update time are skipped.
+
+        :param servers: list of progress entries
+        :return: list of progress reports in the diablo2.io API format
+        """
+        status = []
+        for server in servers:
+            name = str(server.get('server', '')).lower()
+            region = next((code for code, label in REGION.items() if code and label.lower() in name), None)
+            if region is None:
+                continue
+
+            # without an update time the report can't be ordered against others, so it's skipped until it has one
+            updated = server.get('lastUpdate') or {}
+            if not updated.get('seconds'):
+                continue
+
+            reporter = server.get('lastReportedBy') or {}
+            status.append(
+                {
+                    'region': region,
+                    'ladder': '2' if 'nonladder' in name else '1',
+                    'hc': '1' if 'hardcore' in name else '2',
+                    'progress': str(int(server.get('progress', 1))),
+                    'reporter_id': reporter.get('uid') or reporter.get('displayName') or 'd2runewizard.com',
+                    'timestamped': str(int(updated.get('seconds'))),
+                }
+            )
+        return status
+
+
+class WalkTracker:
+    """
+    Tracks upcoming planned walks and sends reminders from timers at exactly the configured lead times, instead of
+    whenever the next poll happens to notice.
+
+    Reminders are deduplicated by (walk id, walk timestamp, lead time) so a rescheduled walk gets new reminders, and
+    walks expire once they have started so memory stays bounded.
+
+    :param remind: function taking (walk, lead time in minutes) that sends a reminder
+    :param leads: comma separated minutes before a walk to send reminders at
+    """
+
+    def __init__(self, remind, leads=DCLONE_WALK_REMINDERS):
+        self.remind = remind
+        self.leads = sorted({int(lead) for lead in str(leads).split(',') if lead.strip()}, reverse=True)
+        self.walks = {}  # walk id -> (timestamp, walk)
+        self.timers = {}  # walk id -> pending reminder timer handles
+        self.reminded = set()  # (walk id, timestamp, lead) of reminders already sent
+        self.expiry = []  # heap of (timestamp, walk id)
+
+    def update(self, walks):
+        """
+        Updates the tracked walks from the latest planned walks, scheduling reminders for new and rescheduled walks and
+        cancelling reminders for walks that are no longer planned. This must be called from a running event loop.
+
+        :param walks: planned walks from the d2runewizard.com API
+        """
+        seen = set()
+        for walk in walks:
+            try:
+                walk_id = walk.get('id')
+                timestamp = int(walk.get('timestamp') / 1000)
+            except (AttributeError, TypeError, ValueError) as err:
+                log_event('walk', f'[PlannedWalk] Skipping malformed walk {walk!r}: {err!r}', level=logging.WARNING, error=repr(err))
+                continue
+            seen.add(walk_id)
+
+            known = self.walks.get(walk_id)
+            self.walks[walk_id] = (timestamp, walk)
+            if known and known[0] == timestamp:
+                continue
+
+            if known:
+                was, now = (datetime.fromtimestamp(value).strftime('%Y-%m-%d %H:%M:%S') for value in (known[0], timestamp))
+                log_event('walk', f'[PlannedWalk] Walk {walk_id} rescheduled from {was} to {now}', walk_id=walk_id, timestamp_was=was, timestamp=now)
+                self.cancel(walk_id)
+            heappush(self.expiry, (timestamp, walk_id))
+            self.schedule(walk_id, timestamp)
+
+        for walk_id in [walk_id for walk_id in self.walks if walk_id not in seen]:
+            self.cancel(walk_id)
+            del self.walks[walk_id]
+
+        self.expire()
+
+    def schedule(self, walk_id, timestamp):
+        """
+        Schedules reminders for a walk. Reminders whose lead time has already passed are collapsed into one reminder sent now.
+
+        :param walk_id: walk id
+        :param timestamp: unix timestamp the walk starts at
+        """
+        now = time()
+        loop = get_running_loop()
+        missed = []
+        for lead in self.leads:
+            if (walk_id, timestamp, lead) in self.reminded:
+                continue
+
+            remind_at = timestamp - lead * 60
+            if remind_at <= now:
+                missed.append(lead)
+            else:
+                self.timers.setdefault(walk_id, []).append(loop.call_later(remind_at - now, self.fire, walk_id, timestamp, lead))
+
+        if missed and timestamp > now:
+            self.reminded.update((walk_id, timestamp, lead) for lead in missed[:-1])
+            self.fire(walk_id, timestamp, missed[-1])
+
+    def fire(self, walk_id, timestamp, lead):
+        """
+        Sends a reminder for a walk, unless it was already sent or the walk was rescheduled or cancelled.
+
+        :param walk_id: walk id
+        :param timestamp: unix timestamp the walk starts at
+        :param lead: minutes before the walk the reminder is for
+        """
+        known = self.walks.get(walk_id)
+        if not known or known[0] != timestamp or (walk_id, timestamp, lead) in self.reminded:
+            return
+
+        self.reminded.add((walk_id, timestamp, lead))
+        try:
+            self.remind(known[1], lead)
+        except Exception as err:
+            log_event('walk', f'[PlannedWalk] Unable to send reminder for walk {walk_id}: {err!r}', level=logging.ERROR, walk_id=walk_id, error=repr(err))
+
+    def cancel(self, walk_id):
+        """
+        Cancels the pending reminders for a walk.
+
+        :param walk_id: walk id
+        """
+        for handle in self.timers.pop(walk_id, []):
+            handle.cancel()
+
+    def expire(self):
+        """
+        Forgets walks that have started, along with their sent reminders.
+        """
+        now = time()
+        while self.expiry and self.expiry[0][0] < now:
+            timestamp, walk_id = heappop(self.expiry)
+            self.reminded.difference_update((walk_id, timestamp, lead) for lead in self.leads)
+            if self.walks.get(walk_id, (None,))[0] == timestamp:
+                self.cancel(walk_id)
+                del self.walks[walk_id]
+
+
+class ProgressSource:
+    """
+    A source of dclone progress reports. Sources return reports in the diablo2.io API format (`region`, `ladder`, `hc`,
+    `progress`, `reporter_id` and `timestamped`) so reports from every source are handled the same way.
+    """
+
+    name = ''
+
+    async def fetch(self):
+        """
+        Get the currently reported progress for all modes.
+
+        :return: list of progress reports, or None on errors
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def from_config(http, dclone, names=DCLONE_SOURCES):
+        """
+        Returns the configured progress sources, in order of preference.
+
+        :param http: HTTPClient shared by the sources
+        :param dclone: Diablo2IOClient for the diablo2.io and d2runewizard.com sources
+        :param names: comma separated list of diablo2.io, d2runewizard.com and paths or urls of JSON files
+        :return: list of progress sources
+        """
+        sources = []
+        for name in (name.strip() for name in names.split(',')):
+            if name == 'diablo2.io':
+                sources.append(Diablo2IOSource(dclone))
+            elif name == 'd2runewizard.com':
+                # the d2runewizard.com API needs a token and contact, the startup warning covers this
+                if DCLONE_D2RW_TOKEN and DCLONE_D2RW_CONTACT:
+                    sources.append(D2RuneWizardSource(dclone.d2rw))
+            elif name:
+                sources.append(FileSource(http, name))
+
+        return sources or [Diablo2IOSource(dclone)]
+
+
+class Diablo2IOSource(ProgressSource):
+    """
+    Progress reports from the diablo2.io dclone API.
+
+    :param dclone: Diablo2IOClient to get the status with
+    """
+
+    name = 'diablo2.io'
+
+    def __init__(self, dclone):
+        self.dclone = dclone
+
+    async def fetch(self):
+        return await self.dclone.status()
+
+
+class D2RuneWizardSource(ProgressSource):
+    """
+    Progress reports from the d2runewizard.com dclone progress API.
+
+    :param d2rw: D2RuneWizardClient to get the progress with
+    """
+
+    name = 'd2runewizard.com'
+
+    def __init__(self, d2rw):
+        self.d2rw = d2rw
+
+    async def fetch(self):
+        return await self.d2rw.progress()
+
+
+class FileSource(ProgressSource):
+    """
+    Progress reports from a local JSON file or url in the diablo2.io API format, a stand-in for testing and for
+    self-hosted trackers.
+
+    :param http: HTTPClient used for urls
+    :param location: path or http(s) url of the JSON file
+    """
+
+    def __init__(self, http, location):
+        self.http = http
+        self.location = location
+        self.name = location
+
+    def read(self):
+        with open(self.location, encoding='utf-8') as status_file:
+            return load(status_file)
+
+    async def fetch(self):
+        try:
+            if self.location.startswith(('http://', 'https://')):
+                return await self.http.get_json(self.location)
+
+            # read the file in a worker thread so a slow disk never blocks the event loop
+            return await get_running_loop().run_in_executor(None, self.read)
+        except Exception as err:
+            log_event('upstream', f'[FileSource.fetch] Unable to read {self.location}: {err!r}', level=logging.ERROR, source=self.name, error=repr(err))
+            METRICS.inc('dclone_upstream_errors_total', source=self.name)
+            return None
+
+
+class ProgressAggregator:
+    """
+    Fetches progress reports from every source concurrently and merges them into one report per mode.
+
+    The merged report for a mode comes from the first (most preferred) source that reported it, unless at least `quorum`
+    independent sources agree on a progress level. Agreeing sources are much harder to troll than a single source, so
+    agreed levels are confirmed right away instead of waiting out the consensus window (see Diablo2IOClient.should_update).
+
+    :param sources: list of progress sources, in order of preference
+    :param quorum: number of sources that must agree on a progress level, at least 2
+    """
+
+    def __init__(self, sources, quorum=DCLONE_SOURCE_QUORUM):
+        self.sources = sources
+        self.quorum = max(quorum, 2)
+        self.agreed = {}  # mode index -> progress level the sources agreed on in the latest fetch
+
+    async def fetch(self):
+        """
+        Get the current progress from every source and merge the reports.
+
+        :return: list of merged progress reports in the diablo2.io API format with the reporting `source` added, or None
+                 if every source failed
+        """
+        results = await gather(*(source.fetch() for source in self.sources))
+
+        # mode index -> {source name: report}, keeping each source's first report for a mode
+        reports = {}
+        for source, status in zip(self.sources, results):
+            for data in status or []:
+                index = ModeState.index(data.get('region'), data.get('ladder'), data.get('hc'))
+                if index is not None:
+                    reports.setdefault(index, {}).setdefault(source.name, {**data, 'source': source.name})
+
+        agreed = {}
+        merged = []
+        for index, candidates in reports.items():
+            votes = Counter(int(data.get('progress')) for data in candidates.values())
+            progress, sources = votes.most_common(1)[0]
+            if sources >= self.quorum:
+                agreed[index] = progress
+                merged.append(next(data for data in candidates.values() if int(data.get('progress')) == progress))
+            else:
+                merged.append(next(iter(candidates.values())))
+
+        self.agreed = agreed
+        return merged or None
+
+
+class ReporterReputation:
+    """
+    Bounded table of how many of each reporter's progress reports were confirmed or rolled back, used to weight reports.
+
+    Every report that changes a mode's progress is a claim. A claim is confirmed when the tracked progress reaches (or
+    passes) the claimed level, and rolled back when it is replaced by another report and still unconfirmed `expiry`
+    seconds after it was first seen. A reporter's score is (confirmed + 1) / (confirmed + rolled back + 2), so new
+    reporters start at 0.5. The least recently updated reporters are forgotten first.
+
+    :param size: maximum number of reporters to remember
+    :param trusted: score at or above which a reporter is trusted
+    :param distrusted: score at or below which a reporter is distrusted
+    :param expiry: seconds a replaced claim has to be confirmed before it counts as rolled back
+    """
+
+    MIN_CONFIRMED = 3  # confirmed reports needed before a reporter can be trusted
+    TRUSTED_FACTOR = 0.75  # reports from trusted reporters must still stand for this fraction of the consensus window
+    DISTRUSTED_FACTOR = 3  # reports from distrusted reporters must stand for this many consensus windows
+
+    def __init__(self, size=DCLONE_REPUTATION_SIZE, trusted=DCLONE_TRUST_SCORE, distrusted=DCLONE_DISTRUST_SCORE, expiry=DCLONE_POLL_MAX * 2):
+        self.size = size
+        self.trusted = trusted
+        self.distrusted = distrusted
+        self.expiry = expiry
+        self.reporters = {}  # reporter id -> [confirmed, rolled back], least recently updated first
+        self.claims = {}  # mode index -> {(reporter id, progress): (first observed, tracked progress when first observed)}
+        self.changed = set()  # reporter ids updated since the last save
+        self.evicted = set()  # reporter ids forgotten since the last save
+
+    def score(self, reporter_id):
+        """
+        Returns the reputation of a reporter, from 0 (every report rolled back) to 1 (every report confirmed).
+
+        :param reporter_id: reporter id
+        :return: reputation score
+        """
+        confirmed, rolled_back = self.reporters.get(reporter_id, (0, 0))
+        return (confirmed + 1) / (confirmed + rolled_back + 2)
+
+    def is_trusted(self, reporter_id):
+        """
+        Returns True/False if a reporter has enough confirmed reports and a high enough score for a shorter consensus window.
+        """
+        confirmed, _ = self.reporters.get(reporter_id, (0, 0))
+        return confirmed >= ReporterReputation.MIN_CONFIRMED and self.score(reporter_id) >= self.trusted
+
+    def is_distrusted(self, reporter_id):
+        """
+        Returns True/False if a reporter's reports are mostly rolled back.
+        """
+        return self.score(reporter_id) <= self.distrusted
+
+    def window(self, reporter_id, window):
+        """
+        Returns the number of seconds a report from a given reporter must stand before it is confirmed.
+
+        :param reporter_id: reporter id
+        :param window: consensus window for reporters without a (good or bad) reputation
+        :return: consensus window for the reporter
+        """
+        if self.is_trusted(reporter_id):
+            return window * ReporterReputation.TRUSTED_FACTOR
+        if self.is_distrusted(reporter_id):
+            return window * ReporterReputation.DISTRUSTED_FACTOR
+        return window
+
+    def record(self, reporter_id, confirmed):
+        """
+        Records whether one of a reporter's claims was confirmed or rolled back.
+
+        :param reporter_id: reporter id
+        :param confirmed: True if the claim was confirmed, False if it was rolled back
+        """
+        counts = self.reporters.pop(reporter_id, None) or [0, 0]
+        counts[0 if confirmed else 1] += 1
+        self.reporters[reporter_id] = counts
+        self.changed.add(reporter_id)
+
+        if len(self.reporters) > self.size:
+            oldest = next(iter(self.reporters))
+            del self.reporters[oldest]
+            self.changed.discard(oldest)
+            self.evicted.add(oldest)
+
+    def observe(self, mode, reporter_id, progress, tracked, observed):
+        """
+        Starts tracking a report as a claim if it changes the mode's progress.
+
+        :param mode: mode index
+        :param reporter_id: reporter id
+        :param progress: reported progress level
+        :param tracked: currently tracked (confirmed) progress level
+        :param observed: unix timestamp the report was observed at
+        """
+        if reporter_id is not None and progress != tracked:
+            self.claims.setdefault(mode, {}).setdefault((reporter_id, progress), (observed, tracked))
+
+    def resolve(self, mode, tracked, latest, now):
+        """
+        Credits or penalizes the reporters of claims for a mode that were confirmed or rolled back.
+
+        :param mode: mode index
+        :param tracked: currently tracked (confirmed) progress level
+        :param latest: (reporter id, progress) of the latest report for the mode, this claim is never rolled back
+        :param now: unix timestamp
+        """
+        claims = self.claims.get(mode)
+        if not claims:
+            return
+
+        for claim, (observed, base) in list(claims.items()):
+            reporter_id, progress = claim
+            if progress == tracked or base < progress < tracked:
+                self.record(reporter_id, True)
+                del claims[claim]
+            elif claim != latest and now - observed > self.expiry:
+                self.record(reporter_id, False)
+                del claims[claim]
+
+
+class SpawnEstimator:
+    """
+    Estimates when each mode reaches its next progress level and when dclone spawns, from how long recent levels took.
+
+    The latest `size` confirmed progress changes of every mode are kept in NumPy arrays (modes x changes, oldest first).
+    Every recorded change recomputes the average time spent at each level for all modes in one batched pass. Level k
+    lasts from reaching k until reaching k + 1, and 6/6 lasts until the spawn resets it to 1/6. Levels without recent data
+    for a mode fall back to the average across all modes. Estimates are then a few array operations until the next change.
+
+    :param size: number of progress changes kept for each mode
+    """
+
+    SEED = 7 * 86400  # seconds of history to seed the estimates from on startup
+
+    def __init__(self, size=DCLONE_ETA_TRANSITIONS):
+        global np  # pylint: disable=global-statement
+        import numpy as np  # pylint: disable=import-outside-toplevel,redefined-outer-name
+
+        self.times = np.full((len(MODES), max(size, 2)), np.nan)  # unix timestamp of each progress change
+        self.levels = np.zeros((len(MODES), max(size, 2)), dtype=np.int8)  # progress level reached at each change
+        self.durations = np.full((len(MODES), 7), np.nan)  # average seconds spent at each level (1 to 6) by mode
+        self.version = 0  # incremented whenever the durations change
+
+    def record(self, index, progress, timestamp, update=True):
+        """
+        Records a confirmed progress change and updates the estimates.
+
+        :param index: mode index
+        :param progress: new progress level
+        :param timestamp: unix timestamp of the change
+        :param update: False to skip updating the estimates, when recording several changes at once
+        """
+        # reports can be timestamped before the previous change was confirmed, keep the changes in order
+        timestamp = np.fmax(timestamp, self.times[index, -1])
+        self.times[index, :-1] = self.times[index, 1:]
+        self.levels[index, :-1] = self.levels[index, 1:]
+        self.times[index, -1] = timestamp
+        self.levels[index, -1] = progress
+        if update:
+            self.update()
+
+    def update(self):
+        """
+        Recomputes the average time spent at each level for every mode.
+        """
+        reached, left_for = self.levels[:, :-1], self.levels[:, 1:]
+        spent = np.diff(self.times, axis=1)
+
+        # only count levels that ended by rising one level or by a spawn, rollbacks and skipped levels tell us nothing
+        ended = ((left_for == reached + 1) | ((reached == 6) & (left_for == 1))) & ~np.isnan(spent)
+        by_level = ended[:, :, None] & (reached[:, :, None] == np.arange(7))  # modes x changes x levels
+        totals = np.where(by_level, spent[:, :, None], 0).sum(axis=1)
+        counts = by_level.sum(axis=1)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            pooled = totals.sum(axis=0) / counts.sum(axis=0)
+            self.durations = np.where(counts > 0, totals / counts, pooled)
+        self.version += 1
+
+    def estimates(self, progress, now):
+        """
+        Returns the estimated times of the next level and of the spawn for every mode.
+
+        :param progress: list of the current progress level of each mode
+        :param now: unix timestamp
+        :return: (next level, spawn) arrays of unix timestamps by mode, NaN where there is not enough data
+        """
+        progress = np.asarray(progress, dtype=np.int8)
+        rows = np.arange(len(MODES))
+
+        # when the current level was reached, now if the latest change we know of is not the current level
+        since = np.where(self.levels[:, -1] == progress, self.times[:, -1], now)
+        since = np.where(np.isnan(since), now, since)
+        next_level = since + self.durations[rows, progress]
+
+        # seconds from reaching each level to the spawn, remaining[k] sums the levels k to 6
+        remaining = np.concatenate((np.flip(np.cumsum(np.flip(self.durations, axis=1), axis=1), axis=1), np.zeros((len(MODES), 1))), axis=1)
+        spawn = np.where(progress == 6, next_level, np.maximum(next_level, now) + remaining[rows, np.minimum(progress + 1, 7)])
+        return next_level, spawn
+
+    @staticmethod
+    def describe(next_level, spawn, progress, now):
+        """
+        Returns a short description of the estimates for a mode, with Discord relative timestamps.
+
+        :param next_level: estimated unix timestamp of the next level, NaN if unknown
+        :param spawn: estimated unix timestamp of the spawn, NaN if unknown
+        :param progress: current progress level
+        :param now: unix timestamp
+        :return: description, blank if nothing can be estimated
+        """
+        parts = []
+        if progress < 6 and not np.isnan(next_level):
+            parts.append(f'next level <t:{int(next_level)}:R>' if next_level > now else 'next level any time now')
+        if not np.isnan(spawn):
+            parts.append(f'spawn <t:{int(spawn)}:R>' if spawn > now else 'spawn any time now')
+        return f' (estimated {", ".join(parts)})' if parts else ''
+
+
+class Diablo2IOClient:
+    """
+    Interacts with the diablo2.io dclone API. Tracks the current progress and recent reports for each mode (see ModeState),
+    merged from every configured progress source.
+    """
+
+    API_URL = 'https://diablo2.io/dclone_api.php'
+
+    def __init__(self, http, max_window=DCLONE_CONSENSUS_WINDOW):
+        self.http = http
+        self.d2rw = D2RuneWizardClient(http)
+
+        # longest consensus window any subscription uses, recent reports are kept for this long
+        self.max_window = max_window
+
+        # confirmed progress and recent (observed timestamp, progress, reporter id) reports for each mode. Reports are truncated
+        # to the longest consensus window and alerts are sent if all recent reports for a mode agree on the progress level.
+        # This reduces trolling/false reports but also increases the delay between a report and an alert. The ring buffers
+        # hold enough polls at DCLONE_POLL_MIN to cover the longest window, so they never grow however long a mode is idle.
+        self.modes = ModeState(history=int(max_window * ReporterReputation.DISTRUSTED_FACTOR / max(DCLONE_POLL_MIN, 1)) + 2)
+
+        # how often each reporter's reports were confirmed, used to weight reports with the reputation policy
+        self.policy = DCLONE_CONSENSUS_POLICY
+        self.reputation = ReporterReputation(expiry=max_window + DCLONE_POLL_MAX * 2)
+
+        # progress reports from every configured source, merged into one report per mode
+        self.sources = ProgressAggregator(ProgressSource.from_config(http, self))
+
+        # estimated times of the next level and the spawn, from recent confirmed progress changes
+        self.eta = SpawnEstimator() if DCLONE_ETA_TRANSITIONS else None
+        self.described = (None, None)  # ((estimates version, tracked progress, minute), descriptions by mode index)
+
+        # latest status and planned walks, shared by the background task and the chatop
+        self.cache = SnapshotCache(self.fetch_snapshot)
+
+    async def status(self, region='', ladder='', hardcore=''):
+        """
+        Get the currently reported dclone status from the diablo2.io dclone API.
+
+        API documentation: https://diablo2.io/post2417121.html
+
+        :param region: region to get status for (1 for Americas, 2 for Europe, 3 for Asia, blank for all)
+        :param ladder: ladder or non-ladder (1 for Ladder, 2 for Non-Ladder, blank for all)
+        :param hardcore: hardcore or softcore (1 for Hardcore, 2 for Softcore, blank for all)
+        :return: current dclone status as json
+        """
+        try:
+            params = {'region': region, 'ladder': ladder, 'hc': hardcore}
+            return await self.http.get_json(self.API_URL, params=params)
+        except Exception as err:
+            log_event('upstream', f'[Diablo2IOClient.status] API Error: {err!r}', level=logging.ERROR, source='diablo2.io', error=repr(err))
+            METRICS.inc('dclone_upstream_errors_total', source='diablo2.io')
+            return None
+
+    async def fetch_snapshot(self):
+        """
+        Get the current dclone status from every progress source and planned walks for all modes concurrently.
+
+        :return: (status, walks) tuple, either may be None on API errors
+        """
+        return await gather(self.sources.fetch(), self.d2rw.planned_walks())
+
+    async def progress_message(self, mode_filter=(DCLONE_REGION, DCLONE_LADDER, DCLONE_HC)):
+        """
+        Returns a formatted message of the current dclone status by mode (region, ladder, hardcore).
+
+        :param mode_filter: (region, ladder, hardcore) filter for the modes to include
+        """
+
+        # the estimates are described inside the renderer, so a memoized message doesn't describe them again. They only
+        # change with progress changes, but "any time now" depends on the time so re-render every minute
+        def renderer(status, walks):
+            return Diablo2IOClient.render_progress(status, walks, mode_filter=mode_filter, estimates=self.describe_estimates())
+
+        epoch = (self.eta.version if self.eta else 0, tuple(self.modes.progress), int(time() // 60))
+        return await self.cache.render(renderer, key=mode_filter, epoch=epoch)
+
+    def describe_estimates(self, now=None):
+        """
+        Returns a short description of the estimated next level and spawn times for each mode. The descriptions are reused
+        until the estimates or the tracked progress change, or the minute changes.
+
+        :param now: unix timestamp, defaults to now
+        :return: list of descriptions by mode index, blank if estimates are disabled or there is not enough data
+        """
+        if self.eta is None:
+            return [''] * len(MODES)
+
+        now = time() if now is None else now
+        key = (self.eta.version, tuple(self.modes.progress), int(now // 60))
+        if self.described[0] != key:
+            next_level, spawn = self.eta.estimates(self.modes.progress, now)
+            descriptions = [SpawnEstimator.describe(next_level[index], spawn[index], progress, now) for index, progress in enumerate(self.modes.progress)]
+            self.described = (key, descriptions)
+        return self.described[1]
+
+    @staticmethod
+    def render_progress(status, planned_walks, mode_filter=('', '', ''), estimates=None):
+        """
+        Returns a formatted message of the given dclone status and planned walks.
+
+        :param status: merged dclone status from the progress sources
+        :param planned_walks: planned walks from the d2runewizard.com API
+        :param mode_filter: (region, ladder, hardcore) filter for the modes to include
+        :param estimates: descriptions of the spawn estimates by mode index (see describe_estimates)
+        :return: formatted message
+        """
+        if not status:
+            return '[Diablo2IOClient.progress_message] API error, please try again later.'
+
+        # filter the status and planned walks to the requested modes
+        status = [(ModeState.index(data.get('region'), data.get('ladder'), data.get('hc')), data) for data in status]
+        status = [(index, data) for index, data in status if index is not None and matches_mode(mode_filter, MODES[index])]
+        planned_walks = D2RuneWizardClient.filter_walks(planned_walks or [], *mode_filter)
+
+        # sort the status by mode (hardcore, ladder, region)
+        status = sorted(status, key=lambda row: (MODES[row[0]][2], MODES[row[0]][1], MODES[row[0]][0]))
+
+        # build the message
+        message = 'Current DClone Progress:\n'
+        for index, data in status:
+            progress = int(data.get('progress'))
+            timestamped = int(data.get('timestamped'))
+
+            estimate = estimates[index] if estimates else ''
+
+            message += f'- {ModeState.EMOJI[index]} **{ModeState.LABELS[index]}** is `{progress}/6` <t:{timestamped}:R>{estimate}\n'
+        message += f'> Data courtesy of {", ".join(sorted({data.get("source", "diablo2.io") for _, data in status}))}'
+
+        # add planned walks from d2runewizard.com API
+        if planned_walks:
+            message += '\n\nPlanned Walks:\n'
+            for walk in planned_walks:
+                region = walk.get('region')
+                ladder = walk.get('ladder')
+                hardcore = walk.get('hardcore')
+                timestamp = int(walk.get('timestamp') / 1000)
+                name = walk.get('displayName')
+                emoji = D2RuneWizardClient.emoji(region=region, ladder=ladder, hardcore=hardcore)
+                unconfirmed = ' **[UNCONFIRMED]**' if not walk.get('confirmed') else ''
+
+                message += f'- {emoji} **{region} {LADDER_RW[ladder]} {HC_RW[hardcore]}** <t:{timestamp}:R> reported by `{name}`{unconfirmed}\n'
+            message += '> Data courtesy of d2runewizard.com'
+
+        return message
+
+    def highest_progress(self):
+        """
+        Returns the highest progress level across all modes, including the latest unconfirmed reports.
+        """
+        latest = max(reports[-1][1] for reports in self.modes.reports)
+        return max(latest, *self.modes.progress)
+
+    def add_report(self, index, progress, observed=None, reporter_id=None):
+        """
+        Adds a progress report to the recent reports for a given game mode.
+
+        :param index: mode index
+        :param progress: reported progress level
+        :param observed: unix timestamp the report was observed at, defaults to now
+        :param reporter_id: id of the reporter, if known
+        """
+        observed = time() if observed is None else observed
+        self.modes.reports[index].append((observed, progress, reporter_id))
+        self.reputation.observe(index, reporter_id, progress, self.modes.progress[index], observed)
+
+    def should_update(self, index, window=DCLONE_CONSENSUS_WINDOW):
+        """
+        For a given game mode, returns True/False if we should post an alert to Discord.
+
+        This checks that the latest progress level has been reported for at least `window` seconds, or that enough
+        independent progress sources agree on it right now, which is intended to reduce trolling/false reports. A shorter
+        window will alert sooner (less delay) but is more susceptible to trolling/false reports and a longer window will
+        alert later (more delay) but is less susceptible to trolling/false reports.
+
+        The window is measured in time rather than polls so the polling interval can change without changing how long a
+        troll report has to survive before it is alerted on.
+
+        With the reputation policy, reports from trusted reporters must stand for part of the window (a trusted troll can
+        still only alert after its report survived that long), reports from distrusted reporters must stand for several
+        windows and can't reset the window of other reporters' reports.
+
+        :param index: mode index
+        :param window: seconds the progress level must be reported for, defaults to DCLONE_CONSENSUS_WINDOW
+        :return: True/False if we should post an alert to Discord
+        """
+        _, _, reporter_id = self.modes.reports[index][-1]
+        return self.agreed_for(index, window) >= window * self.window_scale(reporter_id)
+
+    def agreed_for(self, index, window=DCLONE_CONSENSUS_WINDOW):
+        """
+        Returns how many seconds the latest progress level of a mode has been reported for, see should_update.
+
+        :param index: mode index
+        :param window: longest consensus window the result is compared to, defaults to DCLONE_CONSENSUS_WINDOW
+        :return: seconds since the oldest report agreeing with the latest one, inf if independent sources agree on it
+        """
+        reports = self.modes.reports[index]
+        observed, progress, _ = reports[-1]
+        reputation = self.policy == 'reputation'
+
+        # truncate recent reports, keeping the newest report at or before the start of the longest window
+        longest = max(self.max_window, window) * (ReporterReputation.DISTRUSTED_FACTOR if reputation else 1)
+        while len(reports) > 1 and reports[1][0] <= observed - longest + 1:
+            reports.popleft()
+
+        # independent sources agreeing on the latest progress level don't need to wait for the window
+        if self.sources.agreed.get(index) == progress:
+            return inf
+
+        # the reports since the start of the window must all agree on the progress level, allow a second of scheduling
+        # jitter so a report polled exactly one window ago still counts
+        oldest = observed
+        for report_observed, report_progress, report_reporter_id in reversed(reports):
+            if report_progress != progress:
+                # known trolls can't reset the window
+                if reputation and self.reputation.is_distrusted(report_reporter_id):
+                    continue
+                break
+            oldest = report_observed
+
+        return observed - oldest + 1
+
+    def window_scale(self, reporter_id):
+        """
+        Returns how many consensus windows a report from a given reporter must stand for, see ReporterReputation.window.
+
+        :param reporter_id: reporter id
+        :return: ReporterReputation.TRUSTED_FACTOR for trusted reporters, ReporterReputation.DISTRUSTED_FACTOR for distrusted
+                 reporters, otherwise 1
+        """
+        return self.reputation.window(reporter_id, 1) if self.policy == 'reputation' else 1
+
+
+class StateStore:
+    """
+    Durable SQLite store for the tracked progress, subscription progress, recent reports, reporter reputations, walk
+    reminders and status boards, so a restart picks up with the full consensus history and without sending duplicate alerts.
+
+    Only rows that changed since the last save are written, in one transaction per poll. Changes are collected on the
+    event loop and can be written from a worker thread, the database is only used from one thread at a time.
+
+    :param path: path to the SQLite database file
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS progress (scope TEXT, region TEXT, ladder TEXT, hc TEXT, progress INTEGER, PRIMARY KEY (scope, region, ladder, hc));
+        CREATE TABLE IF NOT EXISTS reports (region TEXT, ladder TEXT, hc TEXT, observed REAL, progress INTEGER, reporter_id TEXT,
+                                            PRIMARY KEY (region, ladder, hc, observed));
+        CREATE TABLE IF NOT EXISTS reporters (reporter_id TEXT PRIMARY KEY, confirmed INTEGER, rolled_back INTEGER);
+        CREATE TABLE IF NOT EXISTS walk_reminders (walk_id TEXT, timestamp INTEGER, lead INTEGER, PRIMARY KEY (walk_id, timestamp, lead));
+        CREATE TABLE IF NOT EXISTS boards (channel_id INTEGER PRIMARY KEY, message_id INTEGER);
+    """
+
+    def __init__(self, path=DCLONE_STATE_FILE):
+        self.path = path
+        self.db = connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(StateStore.SCHEMA)
+
+        # what has already been written, so each save only writes changes
+        self.saved_progress = {}
+        self.saved_reports = {}
+        self.saved_reminders = set()
+        self.saved_boards = {}
+
+    def close(self):
+        """
+        Closes the database.
+        """
+        self.db.close()
+
+    def restore(self, dclone, subscriptions, board, walks):
+        """
+        Restores saved state into the dclone client, subscriptions, status board and walk tracker.
+
+        :param dclone: Diablo2IOClient to restore tracked progress, recent reports and reporter reputations into
+        :param subscriptions: SubscriptionIndex to restore subscription progress into
+        :param board: StatusBoard to restore board message ids into
+        :param walks: WalkTracker to restore sent reminders into
+        :return: True/False if there was any saved state
+        """
+        # modes are stored by their diablo2.io encoding so the database doesn't depend on the order of MODES
+        progress = {}
+        for scope, region, ladder, hardcore, level in self.db.execute('SELECT scope, region, ladder, hc, progress FROM progress'):
+            index = ModeState.index(region, ladder, hardcore)
+            if index is not None:
+                progress.setdefault(scope, {})[index] = level
+                self.saved_progress[(scope, index)] = level
+        if not progress.get(''):
+            return False
+
+        for index, level in progress[''].items():
+            dclone.modes.progress[index] = level
+        for subscription in subscriptions.subscriptions:
+            # new subscriptions start at the tracked progress so they don't alert on old changes
+            for index in subscription.modes:
+                subscription.current_progress[index] = progress.get(subscription.key, progress['']).get(index, dclone.modes.progress[index])
+
+        reports = {}
+        query = 'SELECT region, ladder, hc, observed, progress, reporter_id FROM reports ORDER BY observed'
+        for region, ladder, hardcore, observed, level, reporter_id in self.db.execute(query):
+            index = ModeState.index(region, ladder, hardcore)
+            if index is not None:
+                reports.setdefault(index, []).append((observed, level, reporter_id))
+        for index, mode_reports in reports.items():
+            dclone.modes.restore(index, mode_reports)
+            self.saved_reports[index] = mode_reports[-1][0]
+
+        for reporter_id, confirmed, rolled_back in self.db.execute('SELECT reporter_id, confirmed, rolled_back FROM reporters'):
+            dclone.reputation.reporters[reporter_id] = [confirmed, rolled_back]
+
+        self.saved_reminders = set(self.db.execute('SELECT walk_id, timestamp, lead FROM walk_reminders WHERE timestamp >= ?', (time(),)))
+        walks.reminded.update(self.saved_reminders)
+
+        self.saved_boards = dict(self.db.execute('SELECT channel_id, message_id FROM boards'))
+        board.messages.update(self.saved_boards)
+        return True
+
+    def changes(self, dclone, subscriptions, board, walks):
+        """
+        Collects the state that changed since the last save. This runs on the event loop, so the state doesn't change
+        while it's read.
+
+        :param dclone: Diablo2IOClient with the tracked progress, recent reports and reporter reputations
+        :param subscriptions: SubscriptionIndex with the subscription progress
+        :param board: StatusBoard with the board message ids
+        :param walks: WalkTracker with the sent reminders
+        :return: changes to pass to write() and then saved()
+        """
+        progress = [('', index, level) for index, level in enumerate(dclone.modes.progress)]
+        for subscription in subscriptions.subscriptions:
+            progress.extend((subscription.key, index, level) for index, level in subscription.current_progress.items())
+
+        # new reports, and the oldest recent report of each mode (older ones were truncated)
+        reports = []
+        for index, mode_reports in enumerate(dclone.modes.reports):
+            saved = self.saved_reports.get(index)
+            new_reports = [report for report in mode_reports if saved is None or report[0] > saved]
+            if new_reports:
+                reports.append((index, new_reports, mode_reports[0][0]))
+
+        reputation = dclone.reputation
+        reminded = set(walks.reminded)
+        boards = dict(board.messages)
+        return {
+            'progress': [(scope, index, level) for scope, index, level in progress if self.saved_progress.get((scope, index)) != level],
+            'reports': reports,
+            'reporters': [(reporter_id, *reputation.reporters[reporter_id]) for reporter_id in reputation.changed],
+            'evicted': list(reputation.evicted),
+            'reminded': reminded,
+            'reminders_added': reminded - self.saved_reminders,
+            'reminders_removed': self.saved_reminders - reminded,
+            'boards': boards,
+            'boards_changed': [(channel_id, message_id) for channel_id, message_id in boards.items() if self.saved_boards.get(channel_id) != message_id],
+            'boards_removed': [(channel_id,) for channel_id in self.saved_boards if channel_id not in boards],
+        }
+
+    def write(self, changes):
+        """
+        Writes collected changes in one transaction. This only uses the database, so it can run in a worker thread.
+
+        :param changes: changes from changes()
+        """
+        with self.db:
+            progress = [(scope, *MODES[index], level) for scope, index, level in changes['progress']]
+            self.db.executemany('INSERT OR REPLACE INTO progress VALUES (?, ?, ?, ?, ?)', progress)
+
+            # append new reports and drop the ones that were truncated from the recent reports
+            for index, new_reports, oldest in changes['reports']:
+                mode = MODES[index]
+                self.db.executemany(
+                    'INSERT OR REPLACE INTO reports (region, ladder, hc, observed, progress, reporter_id) VALUES (?, ?, ?, ?, ?, ?)',
+                    [(*mode, *report) for report in new_reports],
+                )
+                self.db.execute('DELETE FROM reports WHERE region = ? AND ladder = ? AND hc = ? AND observed < ?', (*mode, oldest))
+
+            self.db.executemany('INSERT OR REPLACE INTO reporters VALUES (?, ?, ?)', changes['reporters'])
+            self.db.executemany('DELETE FROM reporters WHERE reporter_id = ?', [(reporter_id,) for reporter_id in changes['evicted']])
+
+            # sent reminders are forgotten once the walk has started
+            self.db.executemany('INSERT OR REPLACE INTO walk_reminders VALUES (?, ?, ?)', changes['reminders_added'])
+            self.db.executemany('DELETE FROM walk_reminders WHERE walk_id = ? AND timestamp = ? AND lead = ?', changes['reminders_removed'])
+
+            self.db.executemany('INSERT OR REPLACE INTO boards VALUES (?, ?)', changes['boards_changed'])
+            self.db.executemany('DELETE FROM boards WHERE channel_id = ?', changes['boards_removed'])
+
+    def saved(self, changes, dclone):
+        """
+        Records collected changes as written, once write() succeeded. Changes that failed to write are collected again by
+        the next save.
+
+        :param changes: changes from changes()
+        :param dclone: Diablo2IOClient the changes were collected from
+        """
+        for scope, index, level in changes['progress']:
+            self.saved_progress[(scope, index)] = level
+        for index, new_reports, _ in changes['reports']:
+            self.saved_reports[index] = new_reports[-1][0]
+        self.saved_reminders = changes['reminded']
+        self.saved_boards = changes['boards']
+
+        # reporters updated again while the changes were written are saved next time
+        reputation = dclone.reputation
+        for reporter_id, *counts in changes['reporters']:
+            if reputation.reporters.get(reporter_id) == counts:
+                reputation.changed.discard(reporter_id)
+        reputation.evicted.difference_update(changes['evicted'])
+
+    def save(self, dclone, subscriptions, board, walks):
+        """
+        Writes any state that changed since the last save, on the calling thread.
+
+        :param dclone: Diablo2IOClient with the tracked progress, recent reports and reporter reputations
+        :param subscriptions: SubscriptionIndex with the subscription progress
+        :param board: StatusBoard with the board message ids
+        :param walks: WalkTracker with the sent reminders
+        """
+        changes = self.changes(dclone, subscriptions, board, walks)
+        self.write(changes)
+        self.saved(changes, dclone)
+
+
+class HistoryStore:
+    """
+    Append-only on-disk time series of every observed progress report, queried by the `.dclone history` chatop.
+
+    Each mode has a directory of segment files, one for every SEGMENT seconds of observation time. A segment is a sequence
+    of delta-encoded records: the zigzag varint difference from the previous report's timestamp, the progress level, and
+    the reporter as a varint reference to a reporter id written inline the first time it appears in the segment. Every
+    segment starts with each mode's latest report, so a query only reads the segments it covers.
+
+    Segments older than `downsample` seconds are rewritten keeping only the highest and the last report of every
+    `resolution` seconds, and segments older than `retention` seconds are deleted. Queries stream the covered segments
+    into a fixed number of buckets, so query time and memory stay bounded however much history is kept.
+
+    :param path: directory to store the segments in
+    :param retention: seconds of history to keep
+    :param downsample: seconds after which segments are downsampled
+    :param resolution: seconds per sample in downsampled segments
+    """
+
+    SEGMENT = 86400  # seconds of observations per segment file
+    SPARKLINE = '▁▂▃▄▅▆'  # progress levels 1/6 to 6/6
+
+    # chatop words -> (position in the mode, value)
+    ALIASES = {
+        **{word: (0, '1') for word in ('americas', 'america', 'us', 'na')},
+        **{word: (0, '2') for word in ('europe', 'eu')},
+        **{word: (0, '3') for word in ('asia', 'kr')},
+        **{word: (1, '1') for word in ('ladder', 'l')},
+        **{word: (1, '2') for word in ('non-ladder', 'nonladder', 'nl')},
+        **{word: (2, '1') for word in ('hardcore', 'hc')},
+        **{word: (2, '2') for word in ('softcore', 'sc')},
+    }
+
+    def __init__(
+        self,
+        path=DCLONE_HISTORY_DIR,
+        retention=DCLONE_HISTORY_RETENTION * 86400,
+        downsample=DCLONE_HISTORY_DOWNSAMPLE * 86400,
+        resolution=DCLONE_HISTORY_RESOLUTION,
+    ):
+        self.path = path
+        self.retention = retention
+        self.downsample = downsample
+        self.resolution = max(resolution, 1)
+        self.last = [None] * len(MODES)  # latest (timestamp, progress, reporter id) report appended for each mode
+        self.queued = {}  # mode index -> segment start the mode's latest report was queued for
+        self.pending = {}  # (mode index, segment start) -> reports waiting to be written
+        self.writers = {}  # mode index -> (segment start, previous timestamp, {reporter id: reference}) of the open segment, used by write()
+        self.compacted = None  # segment start of the last compaction
+
+    def segment_path(self, index, start, downsampled=False):
+        """
+        Returns the path of a segment file.
+
+        :param index: mode index
+        :param start: unix timestamp the segment starts at
+        :param downsampled: True for the downsampled segment
+        :return: path of the segment file
+        """
+        return join(self.path, ''.join(MODES[index]), f'{int(start):010d}.{"ds" if downsampled else "raw"}')
+
+    def segments(self, index):
+        """
+        Returns the segment files of a mode, oldest first.
+
+        :param index: mode index
+        :return: list of (segment start, path) tuples
+        """
+        directory = join(self.path, ''.join(MODES[index]))
+        if not isdir(directory):
+            return []
+
+        segments = []
+        for name in sorted(listdir(directory)):
+            start, _, kind = name.partition('.')
+            if start.isdigit() and kind in ('raw', 'ds'):
+                segments.append((int(start), join(directory, name)))
+        return segments
+
+    @staticmethod
+    def encode(records, samples, start, reporters):
+        """
+        Appends delta-encoded reports to a segment's records.
+
+        :param records: bytearray to append to
+        :param samples: list of (timestamp, progress, reporter id) reports
+        :param start: timestamp the first delta is relative to
+        :param reporters: reporter id -> reference for the reporter ids already in the segment, updated in place
+        :return: timestamp of the last report
+        """
+
+        def varint(value):
+            while value > 0x7F:
+                records.append(value & 0x7F | 0x80)
+                value >>= 7
+            records.append(value)
+
+        previous = start
+        for timestamp, progress, reporter_id in samples:
+            delta = int(timestamp) - previous
+            varint(delta * 2 if delta >= 0 else -delta * 2 - 1)
+            records.append(max(min(int(progress), 255), 0))
+            previous = int(timestamp)
+
+            if reporter_id is None:
+                varint(0)
+            elif str(reporter_id) in reporters:
+                varint(reporters[str(reporter_id)])
+            else:
+                reporters[str(reporter_id)] = len(reporters) + 1
+                name = str(reporter_id).encode()
+                varint(len(reporters))
+                varint(len(name))
+                records.extend(name)
+        return previous
+
+    @staticmethod
+    def decode(data, start):
+        """
+        Yields the reports in a segment, stopping at a truncated record at the end of the segment.
+
+        :param data: segment bytes
+        :param start: timestamp the first delta is relative to
+        :return: generator of (end offset, timestamp, progress, reporter id) tuples
+        """
+        reporters = []
+        timestamp = start
+        offset = 0
+
+        def varint():
+            nonlocal offset
+            value = shift = 0
+            while True:
+                byte = data[offset]
+                offset += 1
+                value |= (byte & 0x7F) << shift
+                shift += 7
+                if byte < 0x80:
+                    return value
+
+        while offset < len(data):
+            try:
+                delta = varint()
+                progress = data[offset]
+                offset += 1
+                reference = varint()
+                if reference > len(reporters):
+                    length = varint()
+                    end = offset + length
+                    if end > len(data):
+                        return
+                    reporters.append(data[offset:end].decode())
+                    offset = end
+            except (IndexError, UnicodeDecodeError):
+                return
+
+            timestamp += delta // 2 if delta % 2 == 0 else -(delta + 1) // 2
+            yield offset, timestamp, progress, reporters[reference - 1] if reference else None
+
+    def open(self, index, start):
+        """
+        Opens a segment for appending, picking up where a previous run left off and dropping a truncated last record.
+
+        :param index: mode index
+        :param start: unix timestamp the segment starts at
+        :return: (segment start, previous timestamp, {reporter id: reference}) tuple
+        """
+        path = self.segment_path(index, start)
+        previous, reporters = start, {}
+        try:
+            with open(path, 'rb') as segment:
+                data = segment.read()
+        except FileNotFoundError:
+            return start, previous, reporters
+
+        end = 0
+        for end, timestamp, _, reporter_id in HistoryStore.decode(data, start):
+            previous = timestamp
+            if reporter_id is not None:
+                reporters.setdefault(reporter_id, len(reporters) + 1)
+        if end < len(data):
+            with open(path, 'r+b') as segment:
+                segment.truncate(end)
+        return start, previous, reporters
+
+    def append(self, index, progress, timestamp, reporter_id=None, force=False):
+        """
+        Queues an observed report to be written by the next flush. Reports identical to the mode's latest report are skipped.
+
+        :param index: mode index
+        :param progress: reported progress level
+        :param timestamp: unix timestamp of the report
+        :param reporter_id: id of the reporter, if known
+        :param force: write the report even if it is identical to the latest report
+        """
+        sample = (int(timestamp), int(progress), reporter_id)
+        if sample == self.last[index] and not force:
+            return
+        self.last[index] = sample
+
+        start = int(time() // HistoryStore.SEGMENT * HistoryStore.SEGMENT)
+        self.pending.setdefault((index, start), []).append(sample)
+        self.queued[index] = start
+
+    def take(self):
+        """
+        Returns the queued reports and starts a new queue, starting each new segment with every mode's latest report.
+        This runs on the event loop, the reports are written by write().
+
+        :return: (mode index, segment start) -> reports
+        """
+        start = int(time() // HistoryStore.SEGMENT * HistoryStore.SEGMENT)
+        for index, sample in enumerate(self.last):
+            if sample is not None and self.queued.get(index) != start:
+                self.append(index, sample[1], sample[0], sample[2], force=True)
+
+        pending, self.pending = self.pending, {}
+        return pending
+
+    def write(self, pending):
+        """
+        Encodes and writes reports returned by take(), opening segments as needed. This only does file I/O, so it runs in
+        a worker thread, one write at a time.
+
+        :param pending: (mode index, segment start) -> reports
+        """
+        for (index, start), samples in pending.items():
+            path = self.segment_path(index, start)
+            try:
+                writer = self.writers.get(index)
+                if writer is None or writer[0] != start:
+                    writer = self.open(index, start)
+
+                _, previous, reporters = writer
+                records = bytearray()
+                previous = HistoryStore.encode(records, samples, previous, reporters)
+                makedirs(join(self.path, ''.join(MODES[index])), exist_ok=True)
+                with open(path, 'ab') as segment:
+                    segment.write(records)
+                self.writers[index] = (start, previous, reporters)
+            except OSError as err:
+                # reopen the segment on the next write so the reporter references match what was written
+                self.writers.pop(index, None)
+                log_event('history', f'[HistoryStore] Unable to write {path}: {err!r}', level=logging.ERROR, path=path, error=repr(err))
+
+    def flush(self):
+        """
+        Writes the queued reports on the calling thread.
+        """
+        self.write(self.take())
+
+    def due(self):
+        """
+        Returns True once per segment, when older segments should be compacted.
+        """
+        start = int(time() // HistoryStore.SEGMENT * HistoryStore.SEGMENT)
+        if start == self.compacted:
+            return False
+
+        self.compacted = start
+        return True
+
+    def compact(self, now):
+        """
+        Deletes segments older than the retention and downsamples segments older than `downsample` seconds. Segments
+        this old are never appended to, so this can run in a worker thread.
+
+        :param now: unix timestamp
+        """
+        for index in range(len(MODES)):
+            for start, path in self.segments(index):
+                try:
+                    if start + HistoryStore.SEGMENT <= now - self.retention:
+                        remove(path)
+                    elif path.endswith('.raw') and start + HistoryStore.SEGMENT <= now - self.downsample:
+                        self.downsample_segment(index, start, path)
+                except OSError as err:
+                    log_event('history', f'[HistoryStore] Unable to compact {path}: {err!r}', level=logging.ERROR, path=path, error=repr(err))
+
+    def downsample_segment(self, index, start, path):
+        """
+        Rewrites a segment keeping the highest and the last report of every `resolution` seconds.
+
+        :param index: mode index
+        :param start: unix timestamp the segment starts at
+        :param path: path of the raw segment
+        """
+        with open(path, 'rb') as segment:
+            data = segment.read()
+
+        # bucket -> [highest report, last report]
+        buckets = {}
+        for _, timestamp, progress, reporter_id in HistoryStore.decode(data, start):
+            sample = (timestamp, progress, reporter_id)
+            kept = buckets.setdefault(timestamp // self.resolution, [sample, sample])
+            if progress > kept[0][1]:
+                kept[0] = sample
+            kept[1] = sample
+
+        samples = []
+        for highest, last in buckets.values():
+            samples.extend((highest, last) if highest != last else (last,))
+
+        records = bytearray()
+        HistoryStore.encode(records, sorted(samples, key=lambda sample: sample[0]), start, {})
+        downsampled = self.segment_path(index, start, downsampled=True)
+        with open(f'{downsampled}.tmp', 'wb') as segment:
+            segment.write(records)
+        replace_file(f'{downsampled}.tmp', downsampled)
+        remove(path)
+
+    def query(self, index, since, until, buckets=24):
+        """
+        Returns the progress of a mode over time, as the last reported level in each of `buckets` equal time buckets.
+
+        :param index: mode index
+        :param since: unix timestamp of the start of the range
+        :param until: unix timestamp of the end of the range
+        :param buckets: number of buckets
+        :return: list of progress levels, None before the first known report
+        """
+        width = max(until - since, 1) / buckets
+        levels = [None] * buckets
+        carried = (None, None)  # (timestamp, progress) of the latest report before the range
+
+        for start, path in self.segments(index):
+            if start + HistoryStore.SEGMENT <= since or start > until:
+                continue
+            try:
+                with open(path, 'rb') as segment:
+                    data = segment.read()
+            except FileNotFoundError:
+                continue  # compacted while we were reading
+
+            for _, timestamp, progress, _ in HistoryStore.decode(data, start):
+                if timestamp < since:
+                    if carried[0] is None or timestamp >= carried[0]:
+                        carried = (timestamp, progress)
+                elif timestamp < until:
+                    levels[int((timestamp - since) / width)] = progress
+
+        level = carried[1]
+        for bucket, progress in enumerate(levels):
+            level = levels[bucket] = level if progress is None else progress
+        return levels
+
+    def transitions(self, index, since, until, hold):
+        """
+        Returns the progress changes of a mode, ignoring levels that were reported for less than `hold` seconds (trolls).
+
+        :param index: mode index
+        :param since: unix timestamp of the start of the range
+        :param until: unix timestamp of the end of the range
+        :param hold: seconds a level must be reported for to count
+        :return: list of (timestamp, progress) changes, oldest first
+        """
+        samples = []
+        for start, path in self.segments(index):
+            if start + HistoryStore.SEGMENT <= since or start > until:
+                continue
+            try:
+                with open(path, 'rb') as segment:
+                    data = segment.read()
+            except FileNotFoundError:
+                continue
+            samples.extend((timestamp, progress) for _, timestamp, progress, _ in HistoryStore.decode(data, start) if since <= timestamp < until)
+
+        # runs of the same level in the order they were observed, each lasting until the next run starts. A level that
+        # returns after a troll report keeps its earlier timestamp, so the troll's run ends before it starts.
+        runs = []
+        for timestamp, progress in samples:
+            if not runs or runs[-1][1] != progress:
+                runs.append((timestamp, progress))
+
+        changes = []
+        for (timestamp, progress), (ended, _) in zip(runs, runs[1:] + [(until, None)]):
+            if ended - timestamp >= hold and (not changes or changes[-1][1] != progress):
+                changes.append((timestamp, progress))
+
+        # the first level was reached before the range (or before the history started), so it isn't a change
+        return changes[1:]
+
+    @staticmethod
+    def parse_query(words, mode_filter=('', '', '')):
+        """
+        Parses the arguments of the history chatop, for example `eu ladder sc 30d`.
+
+        :param words: chatop arguments
+        :param mode_filter: (region, ladder, hardcore) filter to narrow down
+        :return: ((region, ladder, hardcore) filter, seconds of history) tuple
+        """
+        mode_filter = list(mode_filter)
+        seconds = 7 * 86400
+        for word in words:
+            word = word.lower()
+            if word in HistoryStore.ALIASES:
+                position, value = HistoryStore.ALIASES[word]
+                mode_filter[position] = value
+            elif match(r'^\d+[dh]?$', word):
+                seconds = int(word.rstrip('dh')) * (3600 if word.endswith('h') else 86400)
+        return tuple(mode_filter), seconds
+
+    def render(self, mode_filter, seconds, now, buckets=24):
+        """
+        Returns a formatted message with a progress sparkline for every mode matching a filter.
+
+        :param mode_filter: (region, ladder, hardcore) filter for the modes to include
+        :param seconds: seconds of history to show, limited to the retention
+        :param now: unix timestamp of the end of the history
+        :param buckets: number of characters per sparkline
+        :return: formatted message
+        """
+        seconds = min(max(seconds, 3600), self.retention)
+        hours = seconds / 3600
+        period = f'{hours / 24:g} days' if hours >= 48 else f'{hours:g} hours'
+        modes = sorted((index for index, mode in enumerate(MODES) if matches_mode(mode_filter, mode)), key=lambda index: MODES[index][::-1])
+
+        message = f'DClone Progress History (last {period}):\n'
+        for index in modes:
+            levels = self.query(index, now - seconds, now, buckets)
+            sparkline = ''.join(HistoryStore.SPARKLINE[min(max(level, 1), 6) - 1] if level else ' ' for level in levels)
+            current = f'{levels[-1]}/6' if levels[-1] else 'no data'
+            message += f'- {ModeState.EMOJI[index]} **{ModeState.LABELS[index]}** `{sparkline}` {current}\n'
+        message += f'> Oldest to newest, {seconds / buckets / 3600:.3g} hours per character'
+        return message
+
+
+class Notifier:
+    """
+    Sends alerts and status boards for progress, walk and snapshot events to the subscribed channels. In a standalone bot
+    the DCloneMonitor passes its events straight to a Notifier, in a split deployment an EventMonitor receives them from
+    the poller process.
+
+    Progress events are normalized reports for one mode, published every time the poller processes the mode:
+
+    `{"type": "progress", "mode": ["1", "1", "2"], "progress": 4, "reporter_id": 1, "timestamped": 1700000000,
+    "source": "diablo2.io", "agreed_for": 300.0, "window_scale": 1, "estimate": " (estimated ...)"}`
+
+    `agreed_for` is how many seconds the level has been reported for (null if independent sources agree on it) and
+    `window_scale` is the number of consensus windows the reporter's reports must stand for (see ReporterReputation.window).
+
+    :param transport: object with `deliver(channel_id, message)`, `post_board(channel_id, content)` and
+                      `edit_board(channel_id, message_id, content)` coroutines
+    :param subscriptions: SubscriptionIndex of the channels to send alerts to
+    :param progress_message: coroutine function returning the current progress message for a (region, ladder, hardcore) filter
+    :param history: HistoryStore for the history chatop, None if disabled
+    """
+
+    def __init__(self, transport, subscriptions, progress_message, history=None):
+        self.subscriptions = subscriptions
+        self.progress_message = progress_message
+        self.history = history
+        self.dispatcher = Dispatcher(transport.deliver)
+        self.bundler = AlertBundler(self.dispatcher)
+        self.board = StatusBoard(transport)
+        self.board_task = None
+
+        for subscription in self.subscriptions.subscriptions[:10]:
+            log_event('startup', f'Tracking DClone for {subscription} in channel {subscription.channel_id}', channel_id=subscription.channel_id)
+        if len(self.subscriptions) > 10:
+            log_event('startup', f'Tracking DClone for {len(self.subscriptions) - 10} more subscriptions', subscriptions=len(self.subscriptions))
+
+    async def stop(self):
+        """
+        Sends pending alerts and waits for queued messages to be sent.
+        """
+        self.bundler.flush()
+        await self.dispatcher.stop()
+
+    def restrict(self, channel_ids):
+        """
+        Drops the subscriptions for channels that another notifier process sends alerts to (on other gateway shards).
+
+        :param channel_ids: ids of the channels this notifier can send alerts to
+        """
+        channel_ids = set(channel_ids)
+        self.subscriptions = SubscriptionIndex([subscription for subscription in self.subscriptions.subscriptions if subscription.channel_id in channel_ids])
+
+    def seed(self, progress):
+        """
+        Sets the last alerted progress of every subscription to the confirmed progress, so a notifier that just started
+        doesn't alert on progress reached before it started.
+
+        :param progress: confirmed progress level by mode index
+        """
+        for index, level in enumerate(progress):
+            for subscription in self.subscriptions.matching(index):
+                subscription.current_progress[index] = level
+
+    @staticmethod
+    def confirmed(event, window):
+        """
+        Returns True/False if the level of a progress event has been reported for at least `window` seconds, scaled by
+        the reporter's reputation, or independent sources agree on it.
+
+        :param event: progress event
+        :param window: consensus window in seconds
+        :return: True/False if the level is confirmed for the window
+        """
+        return event['agreed_for'] is None or event['agreed_for'] >= window * event['window_scale']
+
+    def progress(self, event):
+        """
+        Handles progress changes for each subscription to the mode of a progress event. Alerts are bundled until
+        poll_finished is called.
+
+        :param event: progress event
+        :return: True/False if a subscription is still waiting out its consensus window for the reported level
+        """
+        index = ModeState.index(*event['mode'])
+        if index is None:
+            return False
+
+        mode = MODES[index]
+        label = ModeState.LABELS[index]
+        progress = event['progress']
+        reporter_id = event['reporter_id']
+        source = event['source']
+        waiting = False
+        for subscription in self.subscriptions.matching(index):
+            progress_was = subscription.current_progress[index]
+            if progress == progress_was:
+                continue
+            if not Notifier.confirmed(event, subscription.window):
+                waiting = True
+                continue
+
+            if progress >= subscription.threshold and progress > progress_was:
+                log_event(
+                    'alert',
+                    f'{label} is now {progress}/6 (was {progress_was}/6) (reporter_id: {reporter_id})',
+                    level=logging.DEBUG,
+                    mode=mode,
+                    channel_id=subscription.channel_id,
+                    progress=progress,
+                    progress_was=progress_was,
+                )
+
+                # post to discord, channels with a status board see progress changes on the board instead
+                if not subscription.board:
+                    message = f'[{progress}/6] {ModeState.EMOJI[index]} **{label}** DClone progressed (reporter_id: {reporter_id}){event["estimate"]}'
+                    self.bundler.add(subscription.channel_id, message, priority=Dispatcher.PROGRESS, source=source)
+                    METRICS.inc('dclone_alerts_total', kind='progress')
+
+                # update current status
+                subscription.current_progress[index] = progress
+            elif progress < progress_was:
+                # progress increases are interesting, but we also need to reset to 1 after dclone spawns
+                # and to roll it back if the new confirmed progress is less than the current progress
+                log_event(
+                    'alert',
+                    f'[RollBack] {label} rolling back to {progress} (reporter_id: {reporter_id})',
+                    level=logging.DEBUG,
+                    mode=mode,
+                    channel_id=subscription.channel_id,
+                    progress=progress,
+                    progress_was=progress_was,
+                )
+
+                # if we believe dclone spawned, post to discord
+                if progress == 1:
+                    message = ':japanese_ogre: :japanese_ogre: :japanese_ogre: '
+                    message += f'[{progress}/6] **{label}** DClone may have spawned (reporter_id: {reporter_id})'
+                    self.bundler.add(subscription.channel_id, message, priority=Dispatcher.SPAWN, source=source)
+                    METRICS.inc('dclone_alerts_total', kind='spawn')
+
+                # update current status
+                subscription.current_progress[index] = progress
+
+        return waiting
+
+    def walk(self, event):
+        """
+        Sends a planned walk reminder to every subscription matching the walk's mode.
+
+        :param event: walk event, `{"type": "walk", "walk": {...}, "lead": 60}` with the planned walk from the
+                      d2runewizard.com API and the minutes before the walk the reminder is for
+        """
+        walk = event['walk']
+        lead = event['lead']
+        subscriptions = self.subscriptions.matching_walk(walk)
+        if not subscriptions:
+            return
+
+        region = walk.get('region')
+        ladder = walk.get('ladder')
+        hardcore = walk.get('hardcore')
+        timestamp = int(walk.get('timestamp') / 1000)
+        walk_in_mins = int(int(timestamp - time()) / 60)
+        name = walk.get('displayName')
+        emoji = D2RuneWizardClient.emoji(region=region, ladder=ladder, hardcore=hardcore)
+        unconfirmed = ' [UNCONFIRMED]' if walk.get('unconfirmed') else ''
+
+        # post to discord
+        log_event(
+            'walk',
+            f'[PlannedWalk] {region} {LADDER_RW[ladder]} {HC_RW[hardcore]} reported by {name} in {walk_in_mins}m ({lead}m reminder) {unconfirmed}',
+            mode=[region, ladder, hardcore],
+            reporter=name,
+            timestamp=timestamp,
+            lead=lead,
+            unconfirmed=bool(unconfirmed),
+            channels=len(subscriptions),
+        )
+        message = f'{emoji} Upcoming walk for **{region} {LADDER_RW[ladder]} {HC_RW[hardcore]}** '
+        message += f'starts at <t:{timestamp}:f> (reported by `{name}`){unconfirmed}'
+
+        for subscription in subscriptions:
+            self.bundler.add(subscription.channel_id, message, priority=Dispatcher.WALK, source='d2runewizard.com')
+        METRICS.inc('dclone_alerts_total', len(subscriptions), kind='walk')
+        self.bundler.poll_finished()
+
+    def poll_finished(self):
+        """
+        Sends the alerts of a poll as one message per channel and updates the status boards in the background, skipping
+        this poll if the previous update is still running.
+        """
+        self.bundler.poll_finished()
+        if self.subscriptions.boards and (self.board_task is None or self.board_task.done()):
+            self.board_task = create_task(self.update_boards())
+
+    async def update_boards(self):
+        """
+        Updates the status board of every channel that has one. Boards share the rendered progress message per filter.
+        """
+        for channel_id, subscription in self.subscriptions.boards.items():
+            await self.board.update(channel_id, await self.progress_message(subscription.filter))
+
+    async def chatop(self, channel_id, content):
+        """
+        Returns the reply to a dclone chatop (`.dclone` or `.dclone history [mode] [days]`).
+
+        :param channel_id: Discord channel id the chatop was sent in
+        :param content: chatop message
+        :return: reply message
+        """
+        # use the channel's subscription filter, or the default filter in channels without a subscription
+        subscription = self.subscriptions.by_channel.get(channel_id)
+        mode_filter = subscription.filter if subscription else (DCLONE_REGION, DCLONE_LADDER, DCLONE_HC)
+
+        # the history is queried in a worker thread since it reads segments from disk
+        words = content.split()
+        if len(words) > 1 and words[1].lower() == 'history':
+            if not self.history:
+                return 'Progress history is disabled, set DCLONE_HISTORY_DIR to enable it.'
+            mode_filter, seconds = HistoryStore.parse_query(words[2:], mode_filter)
+            return await get_running_loop().run_in_executor(None, self.history.render, mode_filter, seconds, time())
+
+        return await self.progress_message(mode_filter)
+
+
+class DCloneMonitor:
+    """
+    Runs a background task that checks the dclone progress sources every DCLONE_POLL_MIN to DCLONE_POLL_MAX seconds. All
+    modes are polled once and alerts are sent to every subscribed channel whose filter matches the mode, when a progress
+    change occurs that is greater than or equal to the subscription's threshold and is reported for at least the
+    subscription's consensus window.
+
+    Every processed mode, planned walk reminder and poll is turned into an event for the Notifier that sends the alerts,
+    and published to notifier processes if an EventPublisher is given (see Poller).
+
+    Messages are sent through a transport, the gateway DiscordClient or the headless WebhookClient.
+
+    :param transport: object with `wait_until_ready()`, `deliver(channel_id, message)`, `post_board(channel_id, content)` and
+                      `edit_board(channel_id, message_id, content)` coroutines
+    :param subscriptions: list of subscriptions, defaults to the configured subscriptions
+    :param events: EventPublisher to publish events on, None to only send alerts to the subscriptions
+    """
+
+    def __init__(self, transport, subscriptions=None, events=None):
+        self.transport = transport
+        self.events = events
+        subscriptions = SubscriptionIndex(Subscription.from_config() if subscriptions is None else subscriptions)
+        self.api = HTTPClient()
+        self.dclone = Diablo2IOClient(self.api, max_window=subscriptions.max_window())
+        self.history = HistoryStore() if DCLONE_HISTORY_DIR else None
+        self.history_task = None
+        self.notifier = Notifier(transport, subscriptions, self.dclone.progress_message, history=self.history)
+        self.dispatcher = self.notifier.dispatcher
+        self.bundler = self.notifier.bundler
+        self.board = self.notifier.board
+        self.walks = WalkTracker(self.remind_walk)
+        self.store = StateStore() if DCLONE_STATE_FILE else None
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dclone-writer')  # state and history writes, one at a time and in order
+        self.scheduler = PollScheduler()
+        self.interval = DCLONE_POLL_MAX  # seconds between the starts of two polls, set by schedule_next_poll
+        self.polls = 0  # completed polls
+        self.task = None
+        self.suspicious = LogSampler()
+        self.metrics = MetricsServer() if DCLONE_METRICS_PORT else None
+        METRICS.collect(self.collect_metrics)
+
+        # DCLONE_D2RW_TOKEN and DCLONE_D2RW_CONTACT are required for planned walk notifications
+        if not DCLONE_D2RW_TOKEN or not DCLONE_D2RW_CONTACT:
+            log_event(
+                'startup',
+                'DCLONE_D2RW_TOKEN or DCLONE_D2RW_CONTACT are not set (or are incorrect), you will not receive planned walk notifications.',
+                level=logging.WARNING,
+            )
+
+    @property
+    def subscriptions(self):
+        """
+        SubscriptionIndex of the channels alerts are sent to.
+        """
+        return self.notifier.subscriptions
+
+    async def start(self):
+        """
+        Starts the outbound message dispatcher, the event publisher and the metrics endpoint. The background task is
+        started by the transport with begin().
+        """
+        self.dispatcher.start()
+        if self.events:
+            await self.events.start()
+        if self.metrics:
+            await self.metrics.start()
+
+    def begin(self):
+        """
+        Starts the background task.
+
+        :raises RuntimeError: if the background task is already running
+        """
+        if self.task is not None and not self.task.done():
+            raise RuntimeError('The background task is already running')
+        self.task = create_task(self.poll_forever())
+
+    async def close(self):
+        """
+        Stops the background task, flushes pending and queued messages, saves the state and closes the upstream HTTP
+        connection pool.
+        """
+        if self.task:
+            self.task.cancel()
+            await gather(self.task, return_exceptions=True)
+        await self.notifier.stop()
+        await self.api.close()
+        if self.events:
+            await self.events.stop()
+        if self.metrics:
+            await self.metrics.stop()
+        if self.store:
+            # don't overwrite the saved state if we're closing before it was restored
+            if self.polls > 0:
+                await self.save_state()
+            await get_running_loop().run_in_executor(self.writer, self.store.close)
+        if self.history:
+            await get_running_loop().run_in_executor(self.writer, self.history.write, self.history.take())
+        self.writer.shutdown()
+
+    async def chatop(self, channel_id, content):
+        """
+        Returns the reply to a dclone chatop, see Notifier.chatop.
+        """
+        return await self.notifier.chatop(channel_id, content)
+
+    def collect_metrics(self):
+        """
+        Sets the progress, recent reports and queue depth gauges. This is called by the metrics registry before every scrape.
+        """
+        for index, mode in enumerate(MODES):
+            labels = dict(zip(('region', 'ladder', 'hc'), mode))
+            METRICS.set('dclone_progress', self.dclone.modes.progress[index], **labels)
+            METRICS.set('dclone_report_cache_depth', len(self.dclone.modes.reports[index]), **labels)
+        METRICS.set('dclone_queue_depth', self.dispatcher.queue.qsize())
+        if self.events:
+            METRICS.set('dclone_event_notifiers', len(self.events.writers))
+
+    def publish(self, event):
+        """
+        Publishes an event to the notifier processes, if this is a poller.
+
+        :param event: progress, walk or snapshot event
+        """
+        if self.events:
+            self.events.publish(event)
+
+    def snapshot(self):
+        """
+        Returns a snapshot event, published after every poll. Notifier processes render the progress message and status
+        boards from the latest snapshot and set their subscriptions' progress from the first one.
+
+        :return: `{"type": "snapshot", "status": [...], "walks": [...], "progress": [...], "estimates": [...]}` with the latest
+                 merged status and planned walks, and the confirmed progress and spawn estimate descriptions by mode index
+        """
+        status, walks = self.dclone.cache.snapshot or (None, None)
+        return {'type': 'snapshot', 'status': status, 'walks': walks, 'progress': self.dclone.modes.progress, 'estimates': self.dclone.describe_estimates()}
+
+    async def save_state(self):
+        """
+        Saves the state that changed since the last save. The changes are collected on the event loop and written by the
+        writer thread, so SQLite writes and commits never block the event loop.
+        """
+        changes = self.store.changes(self.dclone, self.subscriptions, self.board, self.walks)
+        await get_running_loop().run_in_executor(self.writer, self.store.write, changes)
+        self.store.saved(changes, self.dclone)
+
+    def remind_walk(self, walk, lead):
+        """
+        Sends a planned walk reminder to every subscription matching the walk's mode. This is called by the WalkTracker.
+
+        :param walk: planned walk from the d2runewizard.com API
+        :param lead: minutes before the walk the reminder is for
+        """
+        event = {'type': 'walk', 'walk': walk, 'lead': lead}
+        self.notifier.walk(event)
+        self.publish(event)
+
+    def schedule_next_poll(self):
+        """
+        Adjusts the background task interval to the highest tracked progress level and any upstream rate limiting.
+        """
+        interval = self.scheduler.interval(self.dclone.highest_progress(), self.api.rate_limited_for(Diablo2IOClient.API_URL))
+        if interval != self.interval:
+            log_event('poll', f'Polling every {interval} seconds', interval=interval)
+            self.interval = interval
+
+    async def poll_forever(self):
+        """
+        Background task that sets the initial progress and then polls until cancelled, waiting `interval` seconds from the
+        start of one poll to the start of the next. A poll that fails is logged and the next one runs on schedule.
+        """
+        loop = get_running_loop()
+        try:
+            await self.before_check_dclone_status()
+        except Exception as err:
+            # like a failed startup status request, polling starts without the initial progress
+            log_event('startup', f'Unable to set the current progress at startup: {err!r}', level=logging.ERROR, error=repr(err))
+
+        while True:
+            started = loop.time()
+            try:
+                await self.check_dclone_status()
+            except Exception as err:
+                log_event('poll', f'Background Task Error: {err!r}', level=logging.ERROR, error=repr(err))
+            self.polls += 1
+            await sleep(max(started + self.interval - loop.time(), 0))
+
+    async def check_dclone_status(self):
+        """
+        Checks dclone status via the progress sources, once per poll of the background task (see poll_forever). The
+        interval between checks is adjusted by the PollScheduler after every check.
+
+        Status changes are compared to the last known status of each matching subscription and a message is sent to
+        Discord if the status changed.
+        """
+        # print('>> Checking DClone Status...')
+        # this also refreshes the snapshot served by the chatop
+        status, walks = await self.dclone.cache.refresh()
+        if not status:
+            self.schedule_next_poll()
+            return
+        started = monotonic()
+
+        # loop through each region and check for progress changes
+        for data in status:
+            region = data.get('region')
+            ladder = data.get('ladder')
+            hardcore = data.get('hc')
+            progress = int(data.get('progress'))
+            reporter_id = data.get('reporter_id')
+            timestamped = int(data.get('timestamped'))
+            source = data.get('source', 'diablo2.io')
+            mode = (region, ladder, hardcore)
+            index = ModeState.index(region, ladder, hardcore)
+            if index is None:
+                continue
+
+            # skip modes with the same report as the last poll unless time can still confirm something
+            if not self.dclone.modes.changed(index, (progress, reporter_id, timestamped, source, self.dclone.sources.agreed.get(index))):
+                METRICS.inc('dclone_poll_modes_total', result='skipped')
+                continue
+            METRICS.inc('dclone_poll_modes_total', result='processed')
+            label = ModeState.LABELS[index]
+
+            # keep every observed report for the history chatop
+            if self.history:
+                self.history.append(index, progress, timestamped, reporter_id)
+
+            # add the most recent report
+            self.dclone.add_report(index, progress, reporter_id=reporter_id)
+
+            # track confirmed progress changes and suspicious progress changes, these are not sent to discord
+            tracked_was = self.dclone.modes.progress[index]
+            if progress != tracked_was and self.dclone.should_update(index):
+                self.dclone.modes.progress[index] = progress
+                if self.dclone.eta:
+                    self.dclone.eta.record(index, progress, timestamped)
+                if progress < tracked_was:
+                    METRICS.inc('dclone_rollbacks_total', region=region, ladder=ladder, hc=hardcore)
+                log_event(
+                    'progress' if progress > tracked_was else 'rollback',
+                    f'{label} confirmed at {progress}/6 (was {tracked_was}/6) (reporter_id: {reporter_id})',
+                    mode=mode,
+                    reporter_id=reporter_id,
+                    progress=progress,
+                    progress_was=tracked_was,
+                    timestamped=timestamped,
+                    source=source,
+                )
+            elif progress != tracked_was:
+                METRICS.inc('dclone_suspicious_reports_total', region=region, ladder=ladder, hc=hardcore)
+
+                # trolls repeat the same report every poll, only log a reporter once per DCLONE_LOG_SAMPLE seconds
+                suppressed = self.suspicious.allow(reporter_id)
+                if suppressed is not None:
+                    report_timestamp = datetime.fromtimestamp(timestamped).strftime('%Y-%m-%d %H:%M:%S')
+                    log_event(
+                        'suspicious',
+                        f'[Suspicious] {label} reported as {progress}/6 ' + f'(currently {tracked_was}/6) (reporter_id: {reporter_id}) at {report_timestamp}',
+                        level=logging.WARNING,
+                        mode=mode,
+                        reporter_id=reporter_id,
+                        progress=progress,
+                        progress_was=tracked_was,
+                        timestamped=timestamped,
+                        source=source,
+                        suppressed=suppressed,
+                    )
+
+            # credit or penalize reporters whose earlier reports for this mode were confirmed or rolled back
+            self.dclone.reputation.resolve(index, self.dclone.modes.progress[index], (reporter_id, progress), time())
+
+            # the mode settles once the report is confirmed, every subscription is up to date and no claim is waiting to expire
+            settling = progress != self.dclone.modes.progress[index] or bool(self.dclone.reputation.claims.get(index))
+
+            # handle progress changes for each subscription to this mode, on this process and on the notifier processes
+            agreed_for = self.dclone.agreed_for(index)
+            event = {
+                'type': 'progress',
+                'mode': MODES[index],
+                'progress': progress,
+                'reporter_id': reporter_id,
+                'timestamped': timestamped,
+                'source': source,
+                'agreed_for': None if agreed_for == inf else agreed_for,
+                'window_scale': self.dclone.window_scale(reporter_id),
+                'estimate': self.dclone.describe_estimates()[index],
+            }
+            if self.notifier.progress(event):
+                settling = True
+
+            # notifiers can use any consensus window up to ours, keep processing the mode until it's confirmed for all of them
+            if self.events:
+                self.events.publish(event)
+                if not Notifier.confirmed(event, self.dclone.max_window):
+                    settling = True
+
+            self.dclone.modes.settling[index] = settling
+
+        # track upcoming walks using the D2RuneWizard API, reminders are sent by the walk tracker's timers
+        # the stages below are guarded so a failing stage is retried next poll instead of stopping the background task
+        if walks is not None:
+            try:
+                self.walks.update(walks)
+            except Exception as err:
+                log_event('poll', f'[PlannedWalk] Unable to track planned walks: {err!r}', level=logging.ERROR, stage='walks', error=repr(err))
+
+        # send all alerts from this poll as one message per channel and update status boards
+        self.notifier.poll_finished()
+        self.publish(self.snapshot())
+
+        if self.store:
+            try:
+                await self.save_state()
+            except Exception as err:
+                log_event('poll', f'[StateStore] Unable to save state to {self.store.path}: {err!r}', level=logging.ERROR, stage='store', error=repr(err))
+
+        # new history is written by the writer thread, downsampling and deleting old history reads and writes whole
+        # segments, so it runs in a worker thread once a day
+        if self.history:
+            try:
+                await get_running_loop().run_in_executor(self.writer, self.history.write, self.history.take())
+                if self.history.due() and (self.history_task is None or self.history_task.done()):
+                    self.history_task = get_running_loop().run_in_executor(None, self.history.compact, time())
+            except Exception as err:
+                log_event(
+                    'poll', f'[HistoryStore] Unable to write history to {self.history.path}: {err!r}', level=logging.ERROR, stage='history', error=repr(err)
+                )
+
+        METRICS.observe('dclone_poll_duration_seconds', monotonic() - started)
+        self.schedule_next_poll()
+
+    async def seed_estimates(self):
+        """
+        Seeds the spawn estimates with the progress changes recorded in the history, read in a worker thread.
+        """
+        if not self.history or not self.dclone.eta:
+            return
+
+        now = time()
+        hold = max(self.subscriptions.max_window(), DCLONE_POLL_MAX)  # shorter levels are most likely trolls
+        seeded = 0
+        for index in range(len(MODES)):
+            changes = await get_running_loop().run_in_executor(None, self.history.transitions, index, now - SpawnEstimator.SEED, now, hold)
+            for timestamp, progress in changes:
+                self.dclone.eta.record(index, progress, timestamp, update=False)
+            seeded += len(changes)
+
+        self.dclone.eta.update()
+        log_event('startup', f'Seeded spawn estimates with {seeded} progress changes from {self.history.path}', changes=seeded)
+
+    async def before_check_dclone_status(self):
+        """
+        Runs before the background task starts. This waits for the bot to connect to Discord and sets the initial dclone status.
+        """
+        await self.transport.wait_until_ready()  # wait until the bot logs in
+        await self.seed_estimates()
+
+        # restore the state saved before the last shutdown, this keeps the consensus history and alerted walks
+        if self.store and self.store.restore(self.dclone, self.subscriptions, self.board, self.walks):
+            log_event('startup', f'Restored state from {self.store.path}', path=self.store.path)
+            self.publish(self.snapshot())
+            self.schedule_next_poll()
+            return
+
+        # get the current progress from the dclone API
+        status, _ = await self.dclone.cache.refresh()
+
+        if not status:
+            log_event('startup', 'Unable to set the current progress at startup', level=logging.ERROR)
+            return
+
+        # set the current status and populate the report cache with this value
+        # this prevents a duplicate message from being sent when the bot starts
+        # we are assuming the report at startup is correct (not a troll/false report)
+        # but this should be fine most of the time
+        for data in status:
+            region = data.get('region')
+            ladder = data.get('ladder')
+            hardcore = data.get('hc')
+            progress = int(data.get('progress'))
+            reporter_id = data.get('reporter_id')
+            mode = (region, ladder, hardcore)
+            index = ModeState.index(region, ladder, hardcore)
+            if index is None:
+                continue
+
+            # set current progress and report
+            self.dclone.modes.progress[index] = progress
+            for subscription in self.subscriptions.matching(index):
+                subscription.current_progress[index] = progress
+            if progress != 1:
+                log_event(
+                    'startup',
+                    f'Progress for {ModeState.LABELS[index]} starting at {progress}/6 (reporter_id: {reporter_id})',
+                    mode=mode,
+                    reporter_id=reporter_id,
+                    progress=progress,
+                )
+
+            # populate the recent reports with a report at this progress that already covers every consensus window
+            self.dclone.add_report(index, progress, observed=time() - self.dclone.max_window)
+
+        self.publish(self.snapshot())
+        self.schedule_next_poll()
+
+
+class EventPublisher:
+    """
+    Publishes events from the poller to notifier processes on a Unix socket, one JSON object per line. Each event is encoded
+    once and written to every connected notifier. New notifiers are sent the latest snapshot and the latest progress event
+    of every mode when they connect, so they catch up on what they missed while disconnected.
+
+    Writes never block the poller, a notifier that falls more than `buffer` bytes behind is disconnected (it catches up
+    when it reconnects).
+
+    :param path: path of the Unix socket
+    :param buffer: maximum bytes waiting to be sent to a notifier
+    """
+
+    def __init__(self, path=DCLONE_EVENTS_SOCKET, buffer=1 << 20):
+        self.path = path
+        self.buffer = buffer
+        self.server = None
+        self.writers = set()
+        self.connections = set()  # tasks handling notifier connections
+        self.snapshot = None  # encoded latest snapshot event
+        self.latest = {}  # mode -> encoded latest progress event
+
+    async def start(self):
+        """
+        Starts listening on the socket, replacing the socket file left by a previous poller unless that poller is still
+        listening on it. This must be called from a running event loop.
+
+        :raises RuntimeError: if another poller is publishing events on the socket
+        """
+        try:
+            _, writer = await open_unix_connection(self.path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            pass  # no poller is listening, the socket file (if any) is stale
+        else:
+            writer.close()
+            log_event('events', f'[EventPublisher] Another poller is publishing events on {self.path}', level=logging.ERROR, path=self.path)
+            raise RuntimeError(f'Another poller is publishing events on {self.path}')
+
+        try:
+            remove(self.path)
+        except FileNotFoundError:
+            pass
+
+        # only processes running as our user can subscribe, the socket is restricted before it starts listening
+        sock = socket(AF_UNIX, SOCK_STREAM)
+        try:
+            sock.bind(self.path)
+            chmod(self.path, 0o600)
+        except OSError:
+            sock.close()
+            raise
+        self.server = await start_unix_server(self.subscribe, sock=sock)
+        log_event('events', f'[EventPublisher] Publishing events on {self.path}', path=self.path)
+
+    async def stop(self):
+        """
+        Disconnects every notifier and stops listening.
+        """
+        if self.server:
+            self.server.close()
+            for writer in self.writers:
+                writer.close()
+            self.writers.clear()
+            await gather(*self.connections, return_exceptions=True)
+            await self.server.wait_closed()
+            self.server = None
+
+    async def subscribe(self, reader, writer):
+        """
+        Handles a notifier connection, it stays subscribed until it disconnects.
+        """
+        connection = current_task()
+        self.connections.add(connection)
+        for line in [self.snapshot, *self.latest.values()]:
+            if line:
+                writer.write(line)
+        self.writers.add(writer)
+        log_event('events', f'[EventPublisher] Notifier connected ({len(self.writers)} connected)', notifiers=len(self.writers))
+
+        try:
+            while await reader.read(4096):
+                pass  # notifiers don't send anything, wait for them to disconnect
+        except ConnectionError:
+            pass
+        finally:
+            self.connections.discard(connection)
+            if writer in self.writers:
+                self.writers.discard(writer)
+                writer.close()
+                log_event('events', f'[EventPublisher] Notifier disconnected ({len(self.writers)} connected)', notifiers=len(self.writers))
+
+    def publish(self, event):
+        """
+        Sends an event to every connected notifier.
+
+        :param event: progress, walk or snapshot event
+        """
+        line = (dumps(event, separators=(',', ':')) + '\n').encode()
+        if event['type'] == 'snapshot':
+            self.snapshot = line
+        elif event['type'] == 'progress':
+            self.latest[tuple(event['mode'])] = line
+
+        for writer in list(self.writers):
+            if writer.transport.get_write_buffer_size() > self.buffer:
+                log_event('events', '[EventPublisher] Disconnecting a notifier that is too far behind', level=logging.WARNING)
+                self.writers.discard(writer)
+                writer.close()
+                continue
+            writer.write(line)
+        METRICS.inc('dclone_events_total', type=event['type'])
+
+
+class EventMonitor:
+    """
+    Notifier half of a split deployment (DCLONE_ROLE=notifier). Receives progress, walk and snapshot events from the poller
+    process on DCLONE_EVENTS_SOCKET and sends alerts and status boards to its own subscriptions with a Notifier, instead of
+    polling the upstream APIs itself. Reconnects with backoff when the poller restarts.
+
+    Offers transports the same interface as DCloneMonitor. The chatop is answered from the latest snapshot, and the history
+    chatop reads the poller's DCLONE_HISTORY_DIR if it is on the same host.
+
+    :param transport: object with `wait_until_ready()`, `deliver(channel_id, message)`, `post_board(channel_id, content)` and
+                      `edit_board(channel_id, message_id, content)` coroutines
+    :param subscriptions: list of subscriptions, defaults to the configured subscriptions
+    :param path: path of the poller's Unix socket
+    """
+
+    def __init__(self, transport, subscriptions=None, path=DCLONE_EVENTS_SOCKET):
+        self.transport = transport
+        self.path = path
+        self.api = HTTPClient()
+        self.cache = SnapshotCache(self.latest, ttl=inf)  # only updated by snapshot events
+        self.snapshot = (None, None)  # status and planned walks of the latest snapshot event
+        self.estimates = [''] * len(MODES)
+        self.seeded = False
+        self.task = None
+        self.history = HistoryStore() if DCLONE_HISTORY_DIR else None  # read only, the poller writes it
+        self.notifier = Notifier(
+            transport, SubscriptionIndex(Subscription.from_config() if subscriptions is None else subscriptions), self.progress_message, history=self.history
+        )
+        self.dispatcher = self.notifier.dispatcher
+        self.metrics = MetricsServer() if DCLONE_METRICS_PORT else None
+        METRICS.collect(self.collect_metrics)
+
+    @property
+    def subscriptions(self):
+        """
+        SubscriptionIndex of the channels alerts are sent to.
+        """
+        return self.notifier.subscriptions
+
+    async def start(self):
+        """
+        Starts the outbound message dispatcher and the metrics endpoint. Events are received once the transport calls begin().
+        """
+        self.dispatcher.start()
+        if self.metrics:
+            await self.metrics.start()
+
+    def begin(self):
+        """
+        Starts receiving events from the poller.
+
+        :raises RuntimeError: if events are already being received
+        """
+        if self.task is not None and not self.task.done():
+            raise RuntimeError('Already receiving events from the poller')
+        self.task = create_task(self.receive())
+
+    async def close(self):
+        """
+        Stops receiving events, flushes pending and queued messages and closes the HTTP connection pool.
+        """
+        if self.task:
+            self.task.cancel()
+            await gather(self.task, return_exceptions=True)
+        await self.notifier.stop()
+        await self.api.close()
+        if self.metrics:
+            await self.metrics.stop()
+
+    async def chatop(self, channel_id, content):
+        """
+        Returns the reply to a dclone chatop, see Notifier.chatop.
+        """
+        return await self.notifier.chatop(channel_id, content)
+
+    def collect_metrics(self):
+        """
+        Sets the queue depth gauge. This is called by the metrics registry before every scrape.
+        """
+        METRICS.set('dclone_queue_depth', self.dispatcher.queue.qsize())
+
+    async def latest(self):
+        """
+        Returns the status and planned walks of the latest snapshot event, (None, None) before the first one.
+        """
+        return self.snapshot
+
+    async def progress_message(self, mode_filter=(DCLONE_REGION, DCLONE_LADDER, DCLONE_HC)):
+        """
+        Returns a formatted message of the latest dclone status by mode (region, ladder, hardcore).
+
+        :param mode_filter: (region, ladder, hardcore) filter for the modes to include
+        """
+        renderer = partial(Diablo2IOClient.render_progress, mode_filter=mode_filter, estimates=self.estimates)
+        return await self.cache.render(renderer, key=mode_filter, epoch=tuple(self.estimates))
+
+    def handle(self, event):
+        """
+        Handles an event from the poller.
+
+        :param event: progress, walk or snapshot event
+        """
+        if event['type'] == 'snapshot':
+            if event['status']:
+                self.snapshot = (event['status'], event['walks'])
+                self.cache.put(*self.snapshot)
+            self.estimates = event['estimates']
+
+            # progress reached before this notifier started was alerted by the standalone bot or another notifier
+            if not self.seeded:
+                self.notifier.seed(event['progress'])
+                self.seeded = True
+            self.notifier.poll_finished()
+        elif not self.seeded:
+            return  # wait for the first snapshot
+        elif event['type'] == 'progress':
+            self.notifier.progress(event)
+        elif event['type'] == 'walk':
+            self.notifier.walk(event)
+
+    async def receive(self):
+        """
+        Receives events from the poller until cancelled, reconnecting with exponential backoff.
+        """
+        attempt = 0
+        while True:
+            try:
+                reader, writer = await open_unix_connection(self.path, limit=1 << 20)
+            except OSError as err:
+                delay = min(DCLONE_HTTP_BACKOFF * 2**attempt, 30)
+                attempt += 1
+                log_event('events', f'[EventMonitor] Unable to connect to the poller on {self.path}: {err!r}', level=logging.WARNING, error=repr(err))
+                await sleep(delay + uniform(0, delay / 2))
+                continue
+
+            attempt = 0
+            log_event('events', f'[EventMonitor] Receiving events from the poller on {self.path}', path=self.path)
+            try:
+                while line := await reader.readline():
+                    try:
+                        self.handle(loads(line))
+                    except (JSONDecodeError, KeyError, TypeError) as err:
+                        log_event('events', f'[EventMonitor] Invalid event from the poller: {err!r}', level=logging.ERROR, error=repr(err))
+            except (OSError, ValueError) as err:
+                log_event('events', f'[EventMonitor] Lost connection to the poller: {err!r}', level=logging.WARNING, error=repr(err))
+            else:
+                log_event('events', '[EventMonitor] Poller disconnected', level=logging.WARNING)
+            finally:
+                writer.close()
+
+            # the poller sends every mode's latest event when we reconnect, alerts missed in between are sent then
+            await sleep(DCLONE_HTTP_BACKOFF)
+
+
+class Poller:
+    """
+    Poller half of a split deployment (DCLONE_ROLE=poller). Polls the upstream APIs with a DCloneMonitor and publishes its
+    events on DCLONE_EVENTS_SOCKET for notifier processes instead of sending alerts itself, so upstream load stays the
+    same however many notifiers there are.
+
+    Notifier subscriptions can use consensus windows up to the poller's DCLONE_CONSENSUS_WINDOW, reports are only kept
+    (and modes only kept settling) for that long.
+
+    :param path: path of the Unix socket to publish events on
+    """
+
+    def __init__(self, path=DCLONE_EVENTS_SOCKET):
+        self.monitor = DCloneMonitor(self, subscriptions=[], events=EventPublisher(path))
+
+    async def wait_until_ready(self):
+        """
+        The poller doesn't connect to Discord, so the background task can start right away.
+        """
+
+    async def deliver(self, channel_id, message):
+        """
+        The poller has no subscriptions, notifiers send the alerts.
+
+        :raises LookupError: always
+        """
+        raise LookupError(f'The poller does not send messages (channel {channel_id})')
+
+    async def post_board(self, channel_id, content):
+        """
+        The poller has no subscriptions, notifiers update the status boards.
+
+        :raises LookupError: always
+        """
+        raise LookupError(f'The poller does not send messages (channel {channel_id})')
+
+    async def edit_board(self, channel_id, message_id, content):
+        """
+        The poller has no subscriptions, notifiers update the status boards.
+
+        :raises LookupError: always
+        """
+        raise LookupError(f'The poller does not send messages (channel {channel_id})')
+
+    async def start(self):
+        """
+        Starts publishing events and the background task.
+        """
+        await self.monitor.start()
+        self.monitor.begin()
+
+    async def close(self):
+        """
+        Stops the background task and publishing events, and saves the state.
+        """
+        await self.monitor.close()
+
+    def run(self):
+        """
+        Runs until interrupted (SIGINT or SIGTERM).
+        """
+        run_until_stopped(self)
+
+
+@cache
+def gateway_clients():
+    """
+    Returns the gateway client classes. discord.py is imported and the classes are defined the first time this is called,
+    so headless processes (webhook delivery, pollers) never load discord.py.
+
+    :return: (DiscordClient, ShardedDiscordClient) tuple
+    """
+    import discord  # pylint: disable=import-outside-toplevel
+
+    class DiscordClient(discord.Client):
+        """
+        Logs into Discord as a bot, sends alerts and status boards to subscribed channels over the gateway connection and
+        answers the dclone chatop. Polling and alerting are done by a DCloneMonitor, or by a poller process with DCLONE_ROLE=notifier.
+
+        :param subscriptions: list of subscriptions, defaults to the configured subscriptions
+        """
+
+        def __init__(self, *args, subscriptions=None, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.monitor = (EventMonitor if DCLONE_ROLE == 'notifier' else DCloneMonitor)(self, subscriptions)
+            self.restricted = False  # True once the subscriptions are restricted to the channels on our shards
+
+        async def setup_hook(self):
+            """
+            Runs once before connecting to Discord. This starts the outbound message dispatcher and the metrics endpoint.
+            """
+            await self.monitor.start()
+
+        async def close(self):
+            """
+            Flushes pending and queued messages and closes the upstream HTTP connection pool along with the Discord connection.
+            """
+            await self.monitor.close()
+            await super().close()
+
+        async def on_ready(self):
+            """
+            Runs when the bot is connected to Discord and ready to receive messages. This starts our background task.
+            """
+            # pylint: disable=no-member
+            log_event('startup', f'Bot logged into Discord as "{self.user}"', user=str(self.user))
+            servers = sorted([g.name for g in self.guilds])
+            log_event('startup', f'Connected to {len(servers)} servers: {", ".join(servers)}', servers=len(servers))
+
+            # with a subset of the shards, channels on the other shards are handled by other processes
+            shard_ids = getattr(self, 'shard_ids', None)
+            if shard_ids is not None and not self.restricted:
+                channel_ids = [channel_id for channel_id in self.monitor.subscriptions.by_channel if self.get_channel(channel_id)]
+                self.monitor.notifier.restrict(channel_ids)
+                self.restricted = True
+                log_event('startup', f'Sending alerts to {len(channel_ids)} channels on shards {shard_ids}', channels=len(channel_ids), shards=shard_ids)
+
+            # channel details, we can keep running as long as at least one subscribed channel is accessible
+            accessible = 0
+            for channel_id in self.monitor.subscriptions.by_channel:
+                channel = self.get_channel(channel_id)
+                if not channel:
+                    log_event(
+                        'startup',
+                        f'Unable to access channel {channel_id}, please check DCLONE_DISCORD_CHANNEL_ID or DCLONE_SUBSCRIPTIONS',
+                        level=logging.ERROR,
+                        channel_id=channel_id,
+                    )
+                    continue
+                accessible += 1
+                if accessible <= 10:
+                    log_event('startup', f'Messages will be sent to #{channel.name} on the {channel.guild.name} server', channel_id=channel_id)
+
+            if not accessible:
+                await self.close()
+                return
+
+            # start the background task to monitor dclone status (or receive events from the poller)
+            try:
+                self.monitor.begin()
+            except RuntimeError as err:
+                log_event('startup', f'Background Task Error: {err}', level=logging.ERROR, error=repr(err))
+
+        async def on_message(self, message):
+            """
+            This is called any time the bot receives a message. It implements the dclone chatop.
+            """
+            if message.content.startswith('.dclone') or message.content.startswith('!dclone'):
+                log_event('chatop', f'Responding to dclone chatop from {message.author}', author=str(message.author), channel_id=message.channel.id)
+
+                current_status = await self.monitor.chatop(message.channel.id, message.content)
+                channel = self.get_channel(message.channel.id)
+                await channel.send(current_status)
+
+        async def deliver(self, channel_id, message):
+            """
+            Sends a message to a subscribed channel. This is the Dispatcher transport, use self.monitor.dispatcher.enqueue to send alerts.
+
+            :param channel_id: Discord channel id
+            :param message: message to send
+            :raises LookupError: if the channel is not accessible
+            :raises discord.HTTPException: if sending the message failed
+            """
+            channel = self.get_channel(channel_id)
+            if not channel:
+                raise LookupError(f'Unable to access channel {channel_id}')
+
+            await channel.send(message)
+
+        async def post_board(self, channel_id, content):
+            """
+            Posts and pins a status board message, reusing the board pinned before a restart if there is one.
+
+            :param channel_id: Discord channel id
+            :param content: board content
+            :return: board message id
+            :raises LookupError: if the channel is not accessible
+            :raises discord.HTTPException: if posting the message failed
+            """
+            channel = self.get_channel(channel_id)
+            if not channel:
+                raise LookupError(f'Unable to access channel {channel_id}')
+
+            for message in await channel.pins():
+                if message.author == self.user and message.content.startswith('Current DClone Progress'):
+                    await message.edit(content=content)
+                    return message.id
+
+            message = await channel.send(content)
+            try:
+                await message.pin()
+            except discord.HTTPException as err:
+                log_event(
+                    'board',
+                    f'[StatusBoard] Unable to pin status board in channel {channel_id}, is the Manage Messages permission missing? {err}',
+                    level=logging.WARNING,
+                    channel_id=channel_id,
+                )
+            return message.id
+
+        async def edit_board(self, channel_id, message_id, content):
+            """
+            Edits a status board message.
+
+            :param channel_id: Discord channel id
+            :param message_id: board message id
+            :param content: board content
+            :raises LookupError: if the channel is not accessible
+            :raises discord.HTTPException: if editing the message failed
+            """
+            channel = self.get_channel(channel_id)
+            if not channel:
+                raise LookupError(f'Unable to access channel {channel_id}')
+
+            await channel.get_partial_message(message_id).edit(content=content)
+
+    class ShardedDiscordClient(DiscordClient, discord.AutoShardedClient):
+        """
+        DiscordClient with several gateway shards in one process (DCLONE_SHARDS). Run notifiers with different DCLONE_SHARD_IDS
+        to spread delivery across processes, each sends alerts to the subscribed channels on its own shards.
+
+        :param subscriptions: list of subscriptions, defaults to the configured subscriptions
+        """
+
+        @staticmethod
+        def from_config(**kwargs):
+            """
+            Returns a client with the shards from DCLONE_SHARDS and DCLONE_SHARD_IDS.
+
+            :return: ShardedDiscordClient
+            :raises ValueError: if DCLONE_SHARDS or DCLONE_SHARD_IDS are not valid
+            """
+            shard_count = None if DCLONE_SHARDS == 'auto' else int(DCLONE_SHARDS)
+            shard_ids = [int(shard_id) for shard_id in DCLONE_SHARD_IDS.split(',')] if DCLONE_SHARD_IDS else None
+            if shard_ids is not None and (shard_count is None or not all(0 <= shard_id < shard_count for shard_id in shard_ids)):
+                raise ValueError('DCLONE_SHARD_IDS must be shards from 0 to DCLONE_SHARDS - 1')
+            return ShardedDiscordClient(shard_count=shard_count, shard_ids=shard_ids, **kwargs)
+
+    return DiscordClient, ShardedDiscordClient
+
+
+def __getattr__(name):
+    """
+    Returns the gateway client classes as module attributes, see gateway_clients.
+    """
+    if name in ('DiscordClient', 'ShardedDiscordClient'):
+        return dict(zip(('DiscordClient', 'ShardedDiscordClient'), gateway_clients()))[name]
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+class WebhookError(Exception):
+    """
+    A Discord webhook request failed. Like discord.HTTPException it has the response `status` and the `retry_after` of
+    rate limited requests, but it never includes the webhook url since that contains the webhook's token.
+
+    :param status: HTTP status of the response
+    :param retry_after: seconds Discord asked us to wait before retrying, if rate limited
+    """
+
+    def __init__(self, status, retry_after=None):
+        super().__init__(f'Discord webhook request failed with status {status}')
+        self.status = status
+        self.retry_after = retry_after
+
+
+class WebhookClient:
+    """
+    Headless alternative to DiscordClient that posts alerts and status boards through Discord webhook urls over the pooled
+    HTTPClient. There is no gateway connection, guild cache or chatop, so it starts right away and uses less memory.
+    Polling and alerting are done by a DCloneMonitor, or by a poller process with DCLONE_ROLE=notifier.
+
+    :param subscriptions: list of subscriptions with webhook urls, defaults to the configured subscriptions
+    """
+
+    def __init__(self, subscriptions=None):
+        self.monitor = (EventMonitor if DCLONE_ROLE == 'notifier' else DCloneMonitor)(self, subscriptions)
+        self.webhooks = {subscription.channel_id: subscription.webhook for subscription in self.monitor.subscriptions.subscriptions if subscription.webhook}
+        for channel_id in self.monitor.subscriptions.by_channel:
+            if channel_id not in self.webhooks:
+                log_event(
+                    'startup',
+                    f'No webhook url for channel {channel_id}, please check DCLONE_DISCORD_WEBHOOK or DCLONE_SUBSCRIPTIONS',
+                    level=logging.ERROR,
+                    channel_id=channel_id,
+                )
+
+    async def wait_until_ready(self):
+        """
+        Webhooks don't need a connection to Discord, so the background task can start right away.
+        """
+
+    async def request(self, method, channel_id, path='', payload=None, params=None):
+        """
+        Sends a request to the webhook of a channel.
+
+        :param method: HTTP method
+        :param channel_id: Discord channel id (or webhook id)
+        :param path: path relative to the webhook url
+        :param payload: json payload
+        :param params: query string parameters
+        :return: decoded json response, None if there is no content
+        :raises LookupError: if the channel has no webhook url
+        :raises WebhookError: if Discord returned an error
+        """
+        webhook = self.webhooks.get(channel_id)
+        if not webhook:
+            raise LookupError(f'No webhook url for channel {channel_id}')
+
+        try:
+            return await self.monitor.api.send_json(method, f'{webhook}{path}', payload, params=params)
+        except aiohttp.ClientResponseError as err:
+            retry_after = err.headers.get('Retry-After') if err.headers else None
+            raise WebhookError(err.status, float(retry_after) if retry_after else None) from None
+
+    async def deliver(self, channel_id, message):
+        """
+        Sends a message to a subscribed channel's webhook. This is the Dispatcher transport, use self.monitor.dispatcher.enqueue to send alerts.
+
+        :param channel_id: Discord channel id (or webhook id)
+        :param message: message to send
+        :raises LookupError: if the channel has no webhook url
+        :raises WebhookError: if sending the message failed
+        """
+        await self.request('POST', channel_id, payload={'content': message, 'allowed_mentions': {'parse': []}})
+
+    async def post_board(self, channel_id, content):
+        """
+        Posts a status board message. Webhooks can't pin messages, the board is the newest message until alerts are posted.
+
+        :param channel_id: Discord channel id (or webhook id)
+        :param content: board content
+        :return: board message id
+        :raises LookupError: if the channel has no webhook url
+        :raises WebhookError: if posting the message failed
+        """
+        message = await self.request('POST', channel_id, payload={'content': content, 'allowed_mentions': {'parse': []}}, params={'wait': 'true'})
+        return int(message['id'])
+
+    async def edit_board(self, channel_id, message_id, content):
+        """
+        Edits a status board message posted by the webhook.
+
+        :param channel_id: Discord channel id (or webhook id)
+        :param message_id: board message id
+        :param content: board content
+        :raises LookupError: if the channel has no webhook url
+        :raises WebhookError: if editing the message failed
+        """
+        await self.request('PATCH', channel_id, path=f'/messages/{message_id}', payload={'content': content})
+
+    async def start(self):
+        """
+        Starts the monitor and its background task.
+        """
+        await self.monitor.start()
+        self.monitor.begin()
+
+    async def close(self):
+        """
+        Stops the background task, flushes pending and queued messages and saves the state.
+        """
+        await self.monitor.close()
+
+    def run(self):
+        """
+        Runs until interrupted (SIGINT or SIGTERM).
+        """
+        run_until_stopped(self)
+
+
+def run_until_stopped(service):
+    """
+    Runs a headless service (WebhookClient or Poller) until interrupted (SIGINT or SIGTERM).
+
+    :param service: object with `start()` and `close()` coroutines
+    """
+
+    async def runner():
+        stopping = Event()
+        for signal in (SIGINT, SIGTERM):
+            try:
+                get_running_loop().add_signal_handler(signal, stopping.set)
+            except NotImplementedError:
+                pass  # signal handlers are not supported on Windows, KeyboardInterrupt still stops us
+
+        await service.start()
+        try:
+            await stopping.wait()
+        finally:
+            await service.close()
+
+    try:
+        asyncio_run(runner())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    listener = setup_logging()
+    try:
+        if DCLONE_ROLE == 'poller':
+            Poller().run()
+        elif DCLONE_DELIVERY == 'webhook':
+            WebhookClient().run()
+        else:
+            import discord  # pylint: disable=import-outside-toplevel
+
+            DiscordClient, ShardedDiscordClient = gateway_clients()
+            if DCLONE_SHARDS:
+                client = ShardedDiscordClient.from_config(intents=discord.Intents.default())
+            else:
+                client = DiscordClient(intents=discord.Intents.default())
+            client.run(DCLONE_DISCORD_TOKEN)
+    finally:
+        listener.stop()